@@ -0,0 +1,252 @@
+"""
+SalesForge Agent — Analytics Runner
+Runs a set of ES|QL queries concurrently, with a result cache that is only
+invalidated when the data changes.
+
+Each result is cached under the query text plus a data generation of every
+index the query reads. The generation is built from index stats: the
+searchable doc and deleted-doc counts, which move when a refresh exposes new
+writes, and the primary indexing/delete operation totals, which move on
+every write. A repeat run over unchanged data costs one stats call and no
+ES|QL at all. The cache lives in memory and in a small JSON file, so it
+carries over between runs.
+
+Usage:
+  python analytics_runner.py                        # the esql/queries.md set
+  python analytics_runner.py --file other.md --workers 8
+  python analytics_runner.py --no-cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+
+QUERIES_MD = os.path.join(os.path.dirname(__file__), "..", "esql", "queries.md")
+CACHE_PATH = os.path.join(os.path.dirname(__file__), ".analytics_cache.json")
+CACHE_MAX_ENTRIES = 500
+ANALYTICS_WORKERS = 8
+
+FROM_PATTERN = re.compile(r"^\s*FROM\s+([^|]+?)(?:\s+METADATA\b[^|]*)?\s*(?:\||$)", re.IGNORECASE)
+
+
+# --- Query Sets ---
+
+def load_queries_md(path: str = QUERIES_MD) -> list[tuple[str, str]]:
+    """(label, query) for every ```esql block, labelled by the heading above it."""
+    with open(path) as f:
+        text = f.read()
+    queries = []
+    label = None
+    for heading, block in re.findall(r"^###[ \t]+([^\n]+)$|```esql\n(.*?)```", text, re.MULTILINE | re.DOTALL):
+        if heading:
+            label = heading.strip()
+        elif block.strip():
+            queries.append((label or f"Query {len(queries) + 1}", " ".join(block.split())))
+    return queries
+
+
+def query_indices(query: str) -> list[str]:
+    """Index names (or patterns) a query reads, from its FROM command."""
+    match = FROM_PATTERN.match(query)
+    if not match:
+        return []
+    return sorted(name.strip() for name in match.group(1).split(",") if name.strip())
+
+
+# --- Data Generation ---
+
+def data_generation(es: Elasticsearch, indices: list[str]) -> dict[str, str]:
+    """A token per index that changes whenever the data a query can see may have changed."""
+    if not indices:
+        return {}
+    stats = es.indices.stats(index=",".join(indices), metric=["docs", "indexing"],
+                             ignore_unavailable=True)
+    tokens = {}
+    for name, index in stats.get("indices", {}).items():
+        primaries = index["primaries"]
+        tokens[name] = ":".join(str(value) for value in (
+            index.get("uuid", ""),
+            primaries["docs"]["count"],
+            primaries["docs"].get("deleted", 0),
+            primaries["indexing"]["index_total"],
+            primaries["indexing"].get("delete_total", 0),
+        ))
+    return tokens
+
+
+def generation_for(query: str, generations: dict[str, str]) -> str:
+    """The generation of the concrete indices behind a query's FROM (patterns included)."""
+    patterns = [re.compile(re.escape(p).replace(r"\*", ".*") + "$") for p in query_indices(query)]
+    parts = sorted(f"{name}={token}" for name, token in generations.items()
+                   if any(pattern.match(name) for pattern in patterns))
+    return "|".join(parts)
+
+
+# --- Cache ---
+
+class ResultCache:
+    """ES|QL results keyed by query text + data generation, persisted as JSON."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    @staticmethod
+    def key(query: str, generation: str) -> str:
+        return hashlib.sha256(f"{query}\x00{generation}".encode()).hexdigest()
+
+    def get(self, query: str, generation: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(self.key(query, generation))
+            if entry:
+                entry["used"] = time.time()
+                return entry["result"]
+        return None
+
+    def put(self, query: str, generation: str, result: dict):
+        with self._lock:
+            self._entries[self.key(query, generation)] = {"result": result, "used": time.time()}
+            # Entries for old generations are never read again; drop the least recently used
+            if len(self._entries) > self.max_entries:
+                for key, _ in sorted(self._entries.items(), key=lambda item: item[1]["used"])[
+                        :len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self._entries, f)
+
+
+# --- Runner ---
+
+def execute(es: Elasticsearch, query: str) -> dict:
+    response = es.esql.query(body={"query": query})
+    return {"columns": response.get("columns", []), "values": response.get("values", [])}
+
+
+def run_queries(es: Elasticsearch, queries: list[tuple[str, str]], cache: ResultCache = None,
+                workers: int = ANALYTICS_WORKERS) -> list[dict]:
+    """
+    Run (label, query) pairs concurrently, serving unchanged data from the cache.
+    Returns one dict per query, in order: label, query, result or error, ms, cached.
+    """
+    indices = sorted({index for _, query in queries for index in query_indices(query)})
+    generations = data_generation(es, indices) if cache else {}
+
+    def run(item: tuple[str, str]) -> dict:
+        label, query = item
+        outcome = {"label": label, "query": query, "cached": False}
+        generation = generation_for(query, generations)
+        start = time.perf_counter()
+        # A query whose indices report no stats has no generation — never cache it
+        result = cache.get(query, generation) if cache and generation else None
+        if result is not None:
+            outcome["cached"] = True
+        else:
+            try:
+                result = execute(es, query)
+            except Exception as e:
+                outcome["error"] = str(e)
+            else:
+                if cache and generation:
+                    cache.put(query, generation, result)
+        outcome["result"] = result
+        outcome["ms"] = (time.perf_counter() - start) * 1000
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="esql") as pool:
+        outcomes = list(pool.map(run, queries))
+    if cache:
+        cache.save()
+    return outcomes
+
+
+# --- Output ---
+
+def print_result(outcome: dict):
+    """Display one query's result as a table."""
+    print(f"\n{'─' * 60}")
+    print(f"  {outcome['label']}")
+    print(f"  Query: {outcome['query']}")
+    print(f"{'─' * 60}")
+
+    if "error" in outcome:
+        print(f"  Error: {outcome['error']}")
+        return
+    columns = outcome["result"]["columns"]
+    values = outcome["result"]["values"]
+    if not values:
+        print("  (no results)")
+        return
+
+    col_names = [c["name"] for c in columns]
+    widths = [max(len(str(name)), max(len(str(row[i])) for row in values)) for i, name in enumerate(col_names)]
+    header = " | ".join(f"{name:{widths[i]}}" for i, name in enumerate(col_names))
+    print(f"  {header}")
+    print(f"  {'─' * len(header)}")
+    for row in values:
+        line = " | ".join(f"{str(val):{widths[i]}}" for i, val in enumerate(row))
+        print(f"  {line}")
+    print(f"\n  ({len(values)} rows)")
+
+
+def print_latency(outcomes: list[dict], wall: float):
+    """Per-query latency plus how much running concurrently saved."""
+    print(f"\n{'─' * 60}")
+    print("  QUERY LATENCY")
+    print(f"{'─' * 60}")
+    for outcome in outcomes:
+        source = "cache" if outcome["cached"] else ("error" if "error" in outcome else outcome.get("source", "esql"))
+        print(f"  {outcome['ms']:8.1f} ms  {source:5s}  {outcome['label']}")
+    total = sum(outcome["ms"] for outcome in outcomes)
+    hits = sum(outcome["cached"] for outcome in outcomes)
+    print(f"\n  Wall time {wall * 1000:.0f} ms for {total:.0f} ms of queries "
+          f"({hits}/{len(outcomes)} served from cache)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an ES|QL query set concurrently with a data-aware cache")
+    parser.add_argument("--file", default=QUERIES_MD, help="Markdown file with ```esql blocks")
+    parser.add_argument("--workers", type=int, default=ANALYTICS_WORKERS)
+    parser.add_argument("--no-cache", action="store_true", help="Always query the cluster")
+    args = parser.parse_args()
+
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    queries = load_queries_md(args.file)
+    cache = None if args.no_cache else ResultCache()
+
+    start = time.perf_counter()
+    outcomes = run_queries(es, queries, cache, args.workers)
+    wall = time.perf_counter() - start
+
+    for outcome in outcomes:
+        print_result(outcome)
+    print_latency(outcomes, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,158 +17,64 @@ Tiers:
   - Cold (0-44):   Archive — low fit, revisit quarterly
 """
 
+import argparse
+import atexit
 import os
 import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch, helpers
 
+from columnar_scoring import score_leads
+from lead_rollup import RollupDeltas, apply_deltas, rebuild_rollup, rollup_key
+from lead_reader import (
+    PAGE_SIZE,
+    PitExpired,
+    clear_checkpoint,
+    close_pit,
+    load_checkpoint,
+    open_pit,
+    projection,
+    save_checkpoint,
+    stream_leads,
+)
+# The rubric lives in rubric.py; the score_* functions are re-exported here for existing callers
+from rubric import (
+    RUBRIC_VERSION,
+    render_reasoning,
+    score_description_quality,
+    score_employee_count,
+    score_funding_stage,
+    score_industry_fit,
+    score_lead,
+    scoring_fingerprint,
+)
+from server_scoring import (
+    check_equivalence,
+    install_reasoning_field,
+    start_server_side_scoring,
+    store_scoring_script,
+    wait_for_task,
+)
+
 load_dotenv()
 
 ES_URL = os.getenv("ELASTICSEARCH_URL")
 ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
 INDEX_NAME = "leads-raw"
 ACTIONS_INDEX = "agent-actions-log"
-
-
-# --- Scoring Functions ---
-
-def score_employee_count(count: int) -> tuple[int, str]:
-    """Score based on employee count (proxy for market reach and deal size)."""
-    if count >= 1000:
-        return 25, f"Enterprise ({count} employees) — large deal potential"
-    elif count >= 250:
-        return 22, f"Mid-market ({count} employees) — strong deal potential"
-    elif count >= 100:
-        return 18, f"Growth-stage ({count} employees) — good opportunity"
-    elif count >= 50:
-        return 14, f"Small-mid ({count} employees) — moderate opportunity"
-    elif count >= 25:
-        return 10, f"Small business ({count} employees) — standard opportunity"
-    elif count >= 10:
-        return 6, f"Startup ({count} employees) — early stage"
-    else:
-        return 3, f"Micro ({count} employees) — very early stage"
-
-
-def score_funding_stage(stage: str) -> tuple[int, str]:
-    """Score based on funding stage (proxy for budget availability)."""
-    scores = {
-        "Series C": (25, "Series C — significant budget, actively scaling"),
-        "Public": (25, "Public company — enterprise budgets available"),
-        "Growth": (22, "Growth stage — investing in tools and automation"),
-        "Series B": (20, "Series B — funded, building go-to-market"),
-        "Series A": (15, "Series A — funded but selective spending"),
-        "Seed": (10, "Seed — limited budget, early decisions"),
-        "Pre-Seed": (5, "Pre-Seed — minimal budget, founder-led"),
-        "Bootstrapped": (8, "Bootstrapped — profitable but cost-conscious"),
-    }
-    return scores.get(stage, (5, f"{stage} — unknown funding stage"))
-
-
-def score_industry_fit(industry: str) -> tuple[int, str]:
-    """Score based on industry alignment with AI automation services."""
-    high_fit = {"SaaS": 25, "FinTech": 25, "Cybersecurity": 23, "MarTech": 22}
-    medium_fit = {"HealthTech": 18, "EdTech": 17, "E-Commerce": 17, "HRTech": 16, "InsurTech": 16}
-    lower_fit = {"PropTech": 12, "LegalTech": 12, "LogTech": 11, "FoodTech": 10, "AgriTech": 8, "CleanTech": 8}
-
-    if industry in high_fit:
-        return high_fit[industry], f"{industry} — high alignment with AI/automation services"
-    elif industry in medium_fit:
-        return medium_fit[industry], f"{industry} — moderate alignment, automation opportunities exist"
-    elif industry in lower_fit:
-        return lower_fit[industry], f"{industry} — niche fit, specific use cases only"
-    else:
-        return 8, f"{industry} — unknown industry alignment"
-
-
-def score_description_quality(description: str, keywords: str) -> tuple[int, str]:
-    """Score based on company description sophistication and keyword signals."""
-    score = 0
-    reasons = []
-
-    # Length indicates sophistication
-    if len(description) > 80:
-        score += 8
-        reasons.append("detailed positioning")
-    elif len(description) > 40:
-        score += 5
-        reasons.append("adequate positioning")
-    else:
-        score += 2
-        reasons.append("minimal positioning")
-
-    # AI/automation keywords signal readiness
-    ai_keywords = ["AI", "automation", "machine learning", "analytics", "data", "platform"]
-    keyword_matches = [kw for kw in ai_keywords if kw.lower() in (description + " " + keywords).lower()]
-    if len(keyword_matches) >= 3:
-        score += 10
-        reasons.append(f"strong tech signals ({', '.join(keyword_matches[:3])})")
-    elif len(keyword_matches) >= 1:
-        score += 6
-        reasons.append(f"some tech signals ({', '.join(keyword_matches)})")
-    else:
-        score += 2
-        reasons.append("no tech signals")
-
-    # Enterprise/B2B signals
-    enterprise_signals = ["enterprise", "B2B", "scale", "compliance", "security"]
-    enterprise_matches = [s for s in enterprise_signals if s.lower() in (description + " " + keywords).lower()]
-    if enterprise_matches:
-        score += 7
-        reasons.append(f"enterprise signals ({', '.join(enterprise_matches[:2])})")
-    else:
-        score += 2
-        reasons.append("no enterprise signals")
-
-    return min(score, 25), "; ".join(reasons)
-
-
-def score_lead(lead: dict) -> dict:
-    """Apply full scoring rubric to a lead. Returns score details."""
-    emp_score, emp_reason = score_employee_count(lead.get("employee_count", 0))
-    fund_score, fund_reason = score_funding_stage(lead.get("funding_stage", "Unknown"))
-    ind_score, ind_reason = score_industry_fit(lead.get("industry", ""))
-    desc_score, desc_reason = score_description_quality(
-        lead.get("company_description", ""),
-        lead.get("keywords", "")
-    )
-
-    total_score = emp_score + fund_score + ind_score + desc_score
-
-    if total_score >= 75:
-        tier = "Hot"
-    elif total_score >= 45:
-        tier = "Warm"
-    else:
-        tier = "Cold"
-
-    reasoning = (
-        f"Score: {total_score}/100 → {tier}\n"
-        f"  Employee ({emp_score}/25): {emp_reason}\n"
-        f"  Funding ({fund_score}/25): {fund_reason}\n"
-        f"  Industry ({ind_score}/25): {ind_reason}\n"
-        f"  Description ({desc_score}/25): {desc_reason}"
-    )
-
-    return {
-        "score": total_score,
-        "score_tier": tier,
-        "score_reasoning": reasoning,
-        "score_breakdown": {
-            "employee": {"score": emp_score, "max": 25, "reason": emp_reason},
-            "funding": {"score": fund_score, "max": 25, "reason": fund_reason},
-            "industry": {"score": ind_score, "max": 25, "reason": ind_reason},
-            "description": {"score": desc_score, "max": 25, "reason": desc_reason},
-        },
-    }
+CHECKPOINT_PATH = ".batch_score_checkpoint.json"
+STATE_PATH = ".batch_score_state.json"
 
 
 # --- Action Logging ---
 
-def create_actions_index(es: Elasticsearch):
-    """Create the agent-actions-log index for audit trail."""
+def create_actions_index(es: Elasticsearch, reset: bool = True):
+    """Create the agent-actions-log index for audit trail. Without `reset` an existing log is kept."""
     mapping = {
         "mappings": {
             "properties": {
@@ -185,16 +91,105 @@ def create_actions_index(es: Elasticsearch):
     }
 
     if es.indices.exists(index=ACTIONS_INDEX):
+        if not reset:
+            return
         es.indices.delete(index=ACTIONS_INDEX)
 
     es.indices.create(index=ACTIONS_INDEX, body=mapping)
     print(f"Created index '{ACTIONS_INDEX}'")
 
 
+class ActionLogWriter:
+    """
+    Buffers audit-log documents and ships them to the actions index through the
+    bulk API from a background thread. A flush happens whenever `max_docs` are
+    waiting or `flush_interval` seconds have passed, whichever comes first.
+
+    Anything still buffered is flushed on close(), on leaving a `with` block and
+    at interpreter exit. `failed` counts items the bulk API rejected.
+    """
+
+    def __init__(self, es: Elasticsearch, index: str = ACTIONS_INDEX,
+                 max_docs: int = 500, flush_interval: float = 2.0):
+        self.es = es
+        self.index = index
+        self.max_docs = max_docs
+        self.flush_interval = flush_interval
+        self.sent = 0
+        self.failed = 0
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="action-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, doc: dict):
+        """Queue one action document for the next bulk flush."""
+        with self._buffer_lock:
+            self._buffer.append(doc)
+            pending = len(self._buffer)
+
+        if pending >= self.max_docs * 4:
+            # Background thread is falling behind — apply backpressure
+            self.flush()
+        elif pending >= self.max_docs:
+            self._wake.set()
+
+    def flush(self):
+        """Send everything buffered so far in one bulk request."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+
+            actions = ({"_index": self.index, "_source": doc} for doc in batch)
+            try:
+                success, failed = helpers.bulk(self.es, actions, raise_on_error=False, stats_only=True)
+            except Exception as e:
+                print(f"  Warning: audit log flush failed ({e})")
+                success, failed = 0, len(batch)
+
+            self.sent += success
+            self.failed += failed
+
+    def close(self):
+        """Stop the background thread and flush whatever is left."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def log_action(es: Elasticsearch, lead_id: str, company_name: str,
                action_type: str, details: str, score: float = None,
-               score_tier: str = None, session_id: str = None):
-    """Log an agent action to the audit trail."""
+               score_tier: str = None, session_id: str = None,
+               writer: ActionLogWriter = None):
+    """
+    Log an agent action to the audit trail.
+
+    With a `writer` the document is buffered for a bulk flush; without one it is
+    indexed immediately.
+    """
     doc = {
         "lead_id": lead_id,
         "company_name": company_name,
@@ -205,108 +200,610 @@ def log_action(es: Elasticsearch, lead_id: str, company_name: str,
         "agent_session": session_id or "batch-scoring",
         "timestamp": datetime.utcnow().isoformat(),
     }
-    es.index(index=ACTIONS_INDEX, body=doc)
+    if writer:
+        writer.add(doc)
+    else:
+        es.index(index=ACTIONS_INDEX, body=doc)
 
 
-# --- Main Pipeline ---
+# --- Incremental Scoring ---
 
-def main():
-    print("=" * 60)
-    print("  SalesForge Agent — Batch Scoring Pipeline")
-    print("=" * 60)
-    print()
-
-    # Connect
-    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
-    info = es.info()
-    print(f"Connected to Elasticsearch {info['version']['number']}")
+def incremental_query(watermark: str) -> dict:
+    """
+    Leads touched since the watermark, never fingerprinted, or scored by an older
+    rubric. Score writes stamp scored_at rather than updated_at, so a run's own
+    writes do not select those leads again next time.
+    """
+    return {
+        "bool": {
+            "should": [
+                {"range": {"updated_at": {"gt": watermark}}},
+                {"bool": {"must_not": {"exists": {"field": "score_fingerprint"}}}},
+                {"bool": {"must_not": {"term": {"score_rubric_version": RUBRIC_VERSION}}}},
+            ],
+            "minimum_should_match": 1,
+        }
+    }
 
-    # Create actions index
-    create_actions_index(es)
 
-    # Fetch ALL leads
-    print(f"\nFetching all leads from '{INDEX_NAME}'...")
-    result = es.search(
-        index=INDEX_NAME,
-        body={"query": {"match_all": {}}, "size": 1000},
+def is_unchanged(lead: dict, fingerprint: str) -> bool:
+    """
+    True if the lead was already scored from these exact inputs by this rubric
+    and is counted in the rollup under that score. Leads scored by a workflow
+    are fingerprinted but not yet moved in the rollup.
+    """
+    return (
+        lead.get("score_fingerprint") == fingerprint
+        and lead.get("score_rubric_version") == RUBRIC_VERSION
+        and lead.get("score_rollup") == rollup_key(lead, lead)
     )
-    leads = result["hits"]["hits"]
-    print(f"Found {len(leads)} leads to score\n")
-
-    # Score each lead
-    session_id = f"batch-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
-    hot_count = 0
-    warm_count = 0
-    cold_count = 0
+
+
+# Verbose score text written by older runs; cleared when a lead is rescored
+LEGACY_SCORE_FIELDS = ("score_reasoning", "score_breakdown")
+
+
+# Write the score fields (None removes a field) and stamp scored_at only if one
+# of them changed, so a lead that raced in with identical scores is a noop
+PAINLESS_SET_SCORES = """
+Map src = ctx._source;
+boolean changed = false;
+for (def field : params.fields.entrySet()) {
+  String key = field.getKey();
+  def value = field.getValue();
+  if (value == null) {
+    if (src.containsKey(key)) { src.remove(key); changed = true; }
+  } else if (!value.equals(src[key])) {
+    src[key] = value;
+    changed = true;
+  }
+}
+if (changed) { src.scored_at = params.now; } else { ctx.op = 'noop'; }
+"""
+
+
+def score_fields(result: dict, fingerprint: str, lead: dict) -> dict:
+    """The fields a scoring run writes back, without the timestamp."""
+    fields = {
+        **result,
+        "score_fingerprint": fingerprint,
+        "score_rubric_version": RUBRIC_VERSION,
+        "score_rollup": rollup_key(lead, result),
+    }
+    for field in LEGACY_SCORE_FIELDS:
+        if lead.get(field) is not None:
+            fields[field] = None
+    return fields
+
+
+def needs_write(lead: dict, fields: dict) -> bool:
+    """True if any score field differs from what the lead already stores."""
+    return any(lead.get(key) != value for key, value in fields.items())
+
+
+def plan_run(state: dict | None, incremental: bool) -> dict | None:
+    """Pick the lead query for this run. None means a full rescore."""
+    if not incremental:
+        return None
+    if not state:
+        print("No previous run recorded — running a full rescore")
+        return None
+    if state.get("rubric_version") != RUBRIC_VERSION:
+        print(f"Rubric changed ({state.get('rubric_version')} → {RUBRIC_VERSION}) — running a full rescore")
+        return None
+    print(f"Incremental run: leads changed since {state['watermark']}")
+    return incremental_query(state["watermark"])
+
+
+# --- Main Pipeline ---
+
+def score_page(es: Elasticsearch, hits: list[dict], session_id: str, counts: dict,
+               writer: ActionLogWriter = None, incremental: bool = False,
+               verbose: bool = True, scored: list = None) -> tuple[int, int, int, int]:
+    """
+    Score one page of leads, write the results back and log each action.
+
+    In incremental mode leads whose scoring inputs and rubric version match the
+    stored fingerprint are skipped. Leads whose new score fields equal the
+    fetched _source are not written at all, and updates that find those values
+    already stored (a concurrent writer got there first) are noops and count as
+    unchanged. Every written lead moves between
+    rollup cells as a delta, applied once its own update succeeded. If
+    `scored` is given, every scored lead's id, company, score and tier is
+    appended to it. Returns (updated, errors, skipped, unchanged).
+    """
     update_actions = []
+    moves = {}
+    fingerprints = [scoring_fingerprint(hit["_source"]) for hit in hits]
+
+    if incremental:
+        changed = [i for i, hit in enumerate(hits) if not is_unchanged(hit["_source"], fingerprints[i])]
+        skipped = len(hits) - len(changed)
+        hits = [hits[i] for i in changed]
+        fingerprints = [fingerprints[i] for i in changed]
+    else:
+        skipped = 0
 
-    print("Scoring leads...")
-    print("-" * 60)
+    if not hits:
+        return 0, 0, skipped, 0
 
-    for hit in leads:
+    # Score the whole page in one vectorized pass
+    scores = score_leads([hit["_source"] for hit in hits])
+    unchanged = 0
+    now = datetime.utcnow().isoformat()
+
+    for i, hit in enumerate(hits):
         lead_id = hit["_id"]
         lead = hit["_source"]
         company = lead.get("company_name", "Unknown")
 
-        # Score the lead
-        result = score_lead(lead)
+        # Compact fields only; reasoning text is rendered for the audit log alone
+        result = scores.compact(i)
 
         # Track counts
-        if result["score_tier"] == "Hot":
-            hot_count += 1
-            marker = "🔥"
-        elif result["score_tier"] == "Warm":
-            warm_count += 1
-            marker = "🟡"
-        else:
-            cold_count += 1
-            marker = "🔵"
-
-        print(f"  {marker} {company:40s} → {result['score']:3d}/100 ({result['score_tier']})")
-
-        # Prepare bulk update
+        counts[result["score_tier"]] += 1
+        if scored is not None:
+            scored.append({"id": lead_id, "company_name": company,
+                           "score": result["score"], "score_tier": result["score_tier"]})
+        marker = {"Hot": "🔥", "Warm": "🟡"}.get(result["score_tier"], "🔵")
+
+        if verbose:
+            print(f"  {marker} {company:40s} → {result['score']:3d}/100 ({result['score_tier']})")
+
+        # Nothing to write (or log) when the stored scores are already current
+        fields = score_fields(result, fingerprints[i], lead)
+        if not needs_write(lead, fields):
+            unchanged += 1
+            continue
+
+        # Prepare bulk update — the script turns anything that raced in identical into a noop
         update_actions.append({
             "_op_type": "update",
             "_index": INDEX_NAME,
             "_id": lead_id,
-            "doc": {
-                "score": result["score"],
-                "score_tier": result["score_tier"],
-                "score_reasoning": result["score_reasoning"],
-                "score_breakdown": result["score_breakdown"],
-                "updated_at": datetime.utcnow().isoformat(),
-            },
+            "script": {"source": PAINLESS_SET_SCORES, "params": {"fields": fields, "now": now}},
         })
+        moves[lead_id] = (lead.get("score_rollup"), fields["score_rollup"])
 
         # Log to audit trail
         log_action(
             es, lead_id, company,
             action_type="scored",
-            details=result["score_reasoning"],
+            details=render_reasoning({**lead, **fields}),
             score=result["score"],
             score_tier=result["score_tier"],
             session_id=session_id,
+            writer=writer,
         )
 
-    # Bulk update all leads
+    if not update_actions:
+        return 0, 0, skipped, unchanged
+    failed, noops = set(), set()
+    for ok, item in helpers.streaming_bulk(es, update_actions, raise_on_error=False):
+        if not ok:
+            failed.add(item["update"]["_id"])
+        elif item["update"].get("result") == "noop":
+            noops.add(item["update"]["_id"])
+
+    # Only leads whose update changed them move in the rollup; a noop means the
+    # same scores (and rollup key) were already written
+    deltas = RollupDeltas()
+    for lead_id, (old, new) in moves.items():
+        if lead_id not in failed and lead_id not in noops:
+            deltas.move(old, new)
+    rollup_errors = apply_deltas(es, deltas)
+    if rollup_errors:
+        print(f"  Warning: {rollup_errors} rollup cells failed to update — run with --rebuild-rollup")
+    updated = len(update_actions) - len(failed) - len(noops)
+    return updated, len(failed), skipped, unchanged + len(noops)
+
+
+def new_progress() -> dict:
+    """Running totals for one partition of a scoring run."""
+    return {
+        "counts": {"Hot": 0, "Warm": 0, "Cold": 0},
+        "leads": 0,
+        "updated": 0,
+        "errors": 0,
+        "skipped": 0,
+        "unchanged": 0,
+        "log_failed": 0,
+        "bytes": 0,
+        "elapsed": 0.0,
+    }
+
+
+def score_partition(es: Elasticsearch, run: dict, progress: dict, progress_path: str,
+                    page_size: int, slice_spec: dict = None, verbose: bool = True) -> dict:
+    """
+    Stream, score and write back every lead in one partition of the run.
+
+    `progress` doubles as the stream checkpoint and is saved to `progress_path`
+    after every page, so the partition resumes where it stopped.
+    """
+    incremental = run["query"] is not None
+    started = time.monotonic()
+    # Checkpoints written before these totals were kept
+    progress.setdefault("unchanged", 0)
+    progress.setdefault("bytes", 0)
+    restarts = progress.get("restarts", 0)
+
+    with ActionLogWriter(es) as writer:
+        # Only the fields the rubric and the write-back comparison need — never the vector
+        for hits in stream_leads(es, INDEX_NAME, query=run["query"], page_size=page_size,
+                                 source=projection("scoring"),
+                                 checkpoint=progress, checkpoint_path=progress_path,
+                                 slice_spec=slice_spec, keep_pit_open=slice_spec is not None,
+                                 stats=progress):
+            if progress.get("restarts", 0) != restarts:
+                # The PIT expired and the stream started over — only count each lead once.
+                # Writes already made stay counted; re-read leads come back unchanged.
+                restarts = progress["restarts"]
+                progress["counts"] = {tier: 0 for tier in progress["counts"]}
+                for key in ("leads", "skipped", "unchanged"):
+                    progress[key] = 0
+            success, errors, skipped, unchanged = score_page(es, hits, run["session_id"], progress["counts"],
+                                                             writer=writer, incremental=incremental, verbose=verbose)
+            progress["leads"] += len(hits)
+            progress["updated"] += success
+            progress["errors"] += errors
+            progress["skipped"] += skipped
+            progress["unchanged"] += unchanged
+            progress["elapsed"] += time.monotonic() - started
+            started = time.monotonic()
+
+    progress["log_failed"] += writer.failed
+    return progress
+
+
+def score_slice(run: dict, slice_id: int, page_size: int, checkpoint_path: str) -> dict:
+    """Process-pool worker: score one PIT slice on its own connection."""
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    progress_path = f"{checkpoint_path}.slice{slice_id}"
+    progress = load_checkpoint(progress_path) or new_progress()
+    progress.setdefault("pit_id", run["pit_id"])
+
+    slice_spec = {"id": slice_id, "max": run["workers"]}
+    score_partition(es, run, progress, progress_path, page_size, slice_spec=slice_spec, verbose=False)
+    return progress
+
+
+def merge_progress(parts: list[dict]) -> dict:
+    """Add up the totals of every partition."""
+    total = new_progress()
+    for part in parts:
+        for tier, count in part["counts"].items():
+            total["counts"][tier] += count
+        for key in ("leads", "updated", "errors", "skipped", "unchanged", "log_failed", "bytes"):
+            total[key] += part[key]
+        total["elapsed"] = max(total["elapsed"], part["elapsed"])
+    return total
+
+
+def score_with_workers(es: Elasticsearch, run: dict, page_size: int, checkpoint_path: str) -> dict:
+    """
+    Fan the run out over sliced PIT partitions, one process per slice. If the
+    shared PIT expires, every slice is restarted on one new PIT so they still
+    read the same snapshot; writes made before the restart stay counted.
+    """
+    if not run.get("pit_id"):
+        run["pit_id"] = open_pit(es, INDEX_NAME)
+        save_checkpoint(checkpoint_path, run)
+
+    workers = run["workers"]
+    carried = new_progress()
+    while True:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(score_slice, run, i, page_size, checkpoint_path) for i in range(workers)]
+            parts, expired = [], False
+            for future in futures:
+                try:
+                    parts.append(future.result())
+                except PitExpired:
+                    expired = True
+        if not expired:
+            break
+
+        print("  Shared point-in-time expired, restarting every slice on a new snapshot...")
+        for i in range(workers):
+            progress_path = f"{checkpoint_path}.slice{i}"
+            part = load_checkpoint(progress_path)
+            if part:
+                for key in ("updated", "errors", "log_failed", "bytes"):
+                    carried[key] += part[key]
+            clear_checkpoint(progress_path)
+        close_pit(es, run["pit_id"])
+        run["pit_id"] = open_pit(es, INDEX_NAME)
+        save_checkpoint(checkpoint_path, run)
+
+    close_pit(es, run["pit_id"])
+
+    print(f"  {'Worker':8s} {'Leads':>10s} {'Leads/s':>10s} {'Errors':>8s}")
+    for i, part in enumerate(parts):
+        rate = part["leads"] / part["elapsed"] if part["elapsed"] else 0.0
+        print(f"  #{i:<7d} {part['leads']:10d} {rate:10.0f} {part['errors'] + part['log_failed']:8d}")
+
+    for i in range(workers):
+        clear_checkpoint(f"{checkpoint_path}.slice{i}")
+    return merge_progress(parts + [carried])
+
+
+# --- Agent Batches ---
+
+AGENT_BATCH_MAX = 500
+AGENT_BATCH_TOP = 5
+NEXT_ACTIONS = {
+    "Hot": "Generate personalized outreach email immediately",
+    "Warm": "Add to nurture sequence, research further",
+    "Cold": "Archive for future review",
+}
+
+
+def fetch_batch(es: Elasticsearch, lead_ids: list[str] = None, query: str = None,
+                max_leads: int = AGENT_BATCH_MAX) -> tuple[list[dict], list[str], list[str], bool]:
+    """
+    The leads of an agent batch in one request: an mget for a list of IDs, or a
+    search for a Lucene query string (OR-ed with any IDs). Returns
+    (hits, ids not found, ids cut off by max_leads, whether more leads matched
+    than were fetched). Only an ID list can name the leads it cut off.
+    """
+    source = projection("scoring")
+    if not query:
+        response = es.mget(index=INDEX_NAME, body={"ids": lead_ids[:max_leads]}, source=source["includes"])
+        docs = response["docs"]
+        hits = [doc for doc in docs if doc.get("found")]
+        missing = [doc["_id"] for doc in docs if not doc.get("found")]
+        return hits, missing, lead_ids[max_leads:], len(lead_ids) > max_leads
+
+    should = [{"query_string": {"query": query}}]
+    if lead_ids:
+        should.append({"ids": {"values": lead_ids}})
+    response = es.search(index=INDEX_NAME, body={
+        "query": {"bool": {"should": should, "minimum_should_match": 1}},
+        "size": max_leads,
+        "_source": source,
+    })
+    hits = response["hits"]["hits"]
+    found = {hit["_id"] for hit in hits}
+    missing = [lead_id for lead_id in lead_ids or [] if lead_id not in found]
+    return hits, missing, [], response["hits"]["total"]["value"] > len(hits)
+
+
+def score_batch(es: Elasticsearch, lead_ids: list[str] = None, query: str = None,
+                max_leads: int = AGENT_BATCH_MAX, session_id: str = None,
+                top: int = AGENT_BATCH_TOP) -> dict:
+    """
+    Score a batch of leads the agent selected — by ID or by query — with the same
+    rubric and write-back as a full run, in a fixed number of requests: one
+    fetch, one bulk update, one rollup bulk and one audit-log bulk. Returns a
+    compact per-tier summary with the top leads of each tier.
+    """
+    if not lead_ids and not query:
+        raise ValueError("Pass lead IDs or a query")
+    hits, missing, dropped, truncated = fetch_batch(es, lead_ids, query, max_leads)
+    session_id = session_id or f"agent-batch-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
+
+    counts = {"Hot": 0, "Warm": 0, "Cold": 0}
+    scored = []
+    with ActionLogWriter(es) as writer:
+        updated, errors, _, unchanged = score_page(es, hits, session_id, counts,
+                                                   writer=writer, verbose=False, scored=scored)
+
+    scored.sort(key=lambda lead: -lead["score"])
+    tiers = {
+        tier: {
+            "count": counts[tier],
+            "next_action": NEXT_ACTIONS[tier],
+            "top": [{key: lead[key] for key in ("id", "company_name", "score")}
+                    for lead in scored if lead["score_tier"] == tier][:top],
+        }
+        for tier in ("Hot", "Warm", "Cold")
+    }
+    return {
+        "session_id": session_id,
+        "scored": len(hits),
+        "updated": updated,
+        "unchanged": unchanged,
+        "errors": errors,
+        "missing": missing,
+        "truncated": truncated,
+        "dropped": dropped,
+        "tiers": tiers,
+    }
+
+
+# --- Server-Side Scoring ---
+
+def tier_counts(es: Elasticsearch) -> dict:
+    """Hot/Warm/Cold totals across the index, from a terms aggregation."""
+    result = es.search(index=INDEX_NAME, body={
+        "size": 0,
+        "aggs": {"tiers": {"terms": {"field": "score_tier", "size": 10}}},
+    })
+    counts = {"Hot": 0, "Warm": 0, "Cold": 0}
+    for bucket in result["aggregations"]["tiers"]["buckets"]:
+        counts[bucket["key"]] = bucket["doc_count"]
+    return counts
+
+
+def score_on_server(es: Elasticsearch, run: dict, requests_per_second: float, verify: bool = False) -> dict:
+    """Score inside the cluster with the stored Painless scorer and _update_by_query."""
+    if verify:
+        sample = [hit["_source"] for hit in es.search(index=INDEX_NAME, body={"size": 50})["hits"]["hits"]]
+        mismatches = check_equivalence(es, sample)
+        print(f"  Painless vs Python (scalar and columnar) on {len(sample)} sampled leads: {mismatches} mismatches")
+        if mismatches:
+            raise SystemExit("Painless scorer disagrees with rubric.py — not scoring server-side")
+
+    store_scoring_script(es)
+    start = time.time()
+    scored_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    task_id = start_server_side_scoring(
+        es, INDEX_NAME, query=run["query"],
+        incremental=run["query"] is not None, requests_per_second=requests_per_second, now=scored_at,
+    )
+    print(f"  Started update_by_query task {task_id}")
+    task = wait_for_task(es, task_id)
+    # update_by_query moves leads without deltas — recompute the rollup from the stored keys
+    es.indices.refresh(index=INDEX_NAME)
+    print(f"  Rebuilt rollup: {rebuild_rollup(es)} cells")
+    log_failed = log_server_side_scores(es, scored_at, run["session_id"])
+
+    status = task["task"]["status"]
+    progress = new_progress()
+    progress["leads"] = status.get("total", 0)
+    progress["updated"] = status.get("updated", 0)
+    progress["skipped"] = status.get("noops", 0)
+    progress["errors"] = len(task.get("response", {}).get("failures", [])) + ("error" in task)
+    progress["log_failed"] = log_failed
+    progress["elapsed"] = time.time() - start
+    return progress
+
+
+def log_server_side_scores(es: Elasticsearch, scored_at: str, session_id: str) -> int:
+    """
+    Write a "scored" audit entry for every lead an update_by_query run rewrote,
+    found by the scored_at stamp it left. Returns the number of entries that failed.
+    """
+    with ActionLogWriter(es) as writer:
+        for page in stream_leads(es, INDEX_NAME, query={"term": {"scored_at": scored_at}},
+                                 source=projection("scoring")):
+            for hit in page:
+                lead = hit["_source"]
+                log_action(
+                    es, hit["_id"], lead.get("company_name", "Unknown"),
+                    action_type="scored",
+                    details=render_reasoning(lead),
+                    score=lead["score"],
+                    score_tier=lead["score_tier"],
+                    session_id=session_id,
+                    writer=writer,
+                )
+    return writer.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every lead in Elasticsearch")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Leads fetched and written per page")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file used to resume a crashed run")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint and score from the start")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rescore leads changed since the last successful run")
+    parser.add_argument("--state", default=STATE_PATH, help="File recording the last successful run's watermark")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Score sliced partitions of the index in N parallel processes")
+    parser.add_argument("--server-side", action="store_true",
+                        help="Score inside Elasticsearch with a stored Painless script and _update_by_query")
+    parser.add_argument("--requests-per-second", type=float, default=-1,
+                        help="Throttle for --server-side scoring (-1 = unthrottled)")
+    parser.add_argument("--verify-server-side", action="store_true",
+                        help="Check the Painless scorer against rubric.py on a sample before scoring")
+    parser.add_argument("--rebuild-rollup", action="store_true",
+                        help="Recompute the pipeline rollup from every scored lead after this run")
+    parser.add_argument("--ids", help="Score only these comma-separated lead IDs and print a tier summary")
+    parser.add_argument("--query", help="Score only leads matching this Lucene query string and print a tier summary")
+    parser.add_argument("--max-leads", type=int, default=AGENT_BATCH_MAX, help="Upper bound for --ids/--query")
+    args = parser.parse_args()
+
+    if args.ids or args.query:
+        es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+        create_actions_index(es, reset=False)
+        lead_ids = [lead_id.strip() for lead_id in (args.ids or "").split(",") if lead_id.strip()]
+        print(json.dumps(score_batch(es, lead_ids, args.query, args.max_leads), indent=2))
+        return
+
+    print("=" * 60)
+    print("  SalesForge Agent — Batch Scoring Pipeline")
+    print("=" * 60)
+    print()
+
+    # Connect
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    info = es.info()
+    print(f"Connected to Elasticsearch {info['version']['number']}")
+    # Leads store compact score codes; score_reasoning is rendered at query time.
+    # The stored scorer the workflows call is refreshed with it, so both follow rubric.py.
+    install_reasoning_field(es, INDEX_NAME)
+    store_scoring_script(es)
+
+    run = None if args.restart else load_checkpoint(args.checkpoint)
+
+    if run:
+        print(f"Resuming session {run['session_id']} from checkpoint '{args.checkpoint}'")
+    else:
+        query = plan_run(load_checkpoint(args.state), args.incremental)
+        # Create actions index — incremental runs append to the existing audit trail
+        create_actions_index(es, reset=query is None)
+        started_at = datetime.utcnow()
+        run = {
+            "session_id": f"batch-{started_at.strftime('%Y%m%d-%H%M%S')}",
+            "started_at": started_at.isoformat(),
+            "query": query,
+            "workers": max(args.workers, 1),
+        }
+        if run["workers"] == 1:
+            run.update(new_progress())
+        save_checkpoint(args.checkpoint, run)
+
+    session_id = run["session_id"]
+    incremental = run["query"] is not None
+
+    # Stream the selected leads, one page at a time
+    if not args.server_side:
+        print(f"\nStreaming leads from '{INDEX_NAME}' in pages of {args.page_size}...")
+    print("Scoring leads...")
+    print("-" * 60)
+
+    if args.server_side:
+        # No lead leaves the cluster — and no per-lead audit actions are written
+        print("  Scoring server-side with _update_by_query...")
+        progress = score_on_server(es, run, args.requests_per_second, verify=args.verify_server_side)
+    elif run["workers"] > 1:
+        print(f"  Fanning out over {run['workers']} sliced workers...")
+        progress = score_with_workers(es, run, args.page_size, args.checkpoint)
+    else:
+        # Single process: the run checkpoint also carries the stream position
+        progress = score_partition(es, run, run, args.checkpoint, args.page_size)
+
+    counts = progress["counts"]
     print(f"\n{'=' * 60}")
-    print("Writing scores back to Elasticsearch...")
-    success, errors = helpers.bulk(es, update_actions)
-    print(f"Updated {success} leads, {len(errors) if isinstance(errors, list) else errors} errors")
+    print(f"Updated {progress['updated']} leads, {progress['errors']} errors")
+    if incremental:
+        print(f"Skipped {progress['skipped']} unchanged leads")
+    if progress["unchanged"]:
+        print(f"Skipped {progress['unchanged']} writes whose scores were already current")
+    print(f"Audit log: {progress['log_failed']} failed actions")
+    if progress["elapsed"]:
+        print(f"Throughput: {progress['leads'] / progress['elapsed']:.0f} leads/s")
+    if progress["bytes"]:
+        print(f"Transferred: {progress['bytes'] / 1024 / 1024:.1f} MB "
+              f"({progress['bytes'] / max(progress['leads'], 1):.0f} bytes/lead)")
 
     # Refresh indices
     es.indices.refresh(index=INDEX_NAME)
     es.indices.refresh(index=ACTIONS_INDEX)
+    if args.rebuild_rollup and not args.server_side:
+        print(f"Rebuilt rollup: {rebuild_rollup(es)} cells")
+
+    # Anything touched after this run started is picked up by the next incremental run
+    if not progress["errors"]:
+        save_checkpoint(args.state, {"rubric_version": RUBRIC_VERSION, "watermark": run["started_at"]})
+    clear_checkpoint(args.checkpoint)
+
+    if args.server_side:
+        counts = tier_counts(es)
 
     # Pipeline summary
+    hot_count, warm_count, cold_count = counts["Hot"], counts["Warm"], counts["Cold"]
     total = hot_count + warm_count + cold_count
+    pct = 100 / max(total, 1)
     print(f"\n{'=' * 60}")
     print("  PIPELINE SUMMARY")
     print(f"{'=' * 60}")
     print(f"  Total Leads:  {total}")
-    print(f"  🔥 Hot:       {hot_count} ({hot_count/total*100:.0f}%) — Ready for outreach")
-    print(f"  🟡 Warm:      {warm_count} ({warm_count/total*100:.0f}%) — Nurture sequence")
-    print(f"  🔵 Cold:      {cold_count} ({cold_count/total*100:.0f}%) — Archive for review")
+    print(f"  🔥 Hot:       {hot_count} ({hot_count * pct:.0f}%) — Ready for outreach")
+    print(f"  🟡 Warm:      {warm_count} ({warm_count * pct:.0f}%) — Nurture sequence")
+    print(f"  🔵 Cold:      {cold_count} ({cold_count * pct:.0f}%) — Archive for review")
     print(f"{'=' * 60}")
     print(f"  Session ID:   {session_id}")
     print(f"  Actions logged to '{ACTIONS_INDEX}'")
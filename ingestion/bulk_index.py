@@ -2,22 +2,43 @@
 SalesForge Agent — Bulk Indexer
 Index any JSON file of leads into Elasticsearch.
 Usage: python bulk_index.py --file data/my_leads.json
+
+Leads get deterministic IDs (email, or domain + name) and a content hash, so
+re-importing a file only writes new or changed leads and only embeds
+descriptions that changed.
+
+Large dumps: --stream (implied for .ndjson/.jsonl) parses the file
+incrementally and pushes bounded chunks through embed → index, with both
+stages running at once, so memory stays flat whatever the file size.
 """
 
 import argparse
 import json
 import os
+import queue
+import threading
 
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 from openai import OpenAI
 
+from bulk_writer import BulkWriter
+from embeddings import API_STATS, embed_matrix, get_cache
+from lead_identity import plan_upserts, upsert_action
+from vector_profile import VECTOR_PROFILE, check_index_profile, vector_encoding
+
 load_dotenv()
 
 ES_URL = os.getenv("ELASTICSEARCH_URL")
 ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INDEX_NAME = "leads-raw"
+STREAM_CHUNK_SIZE = 1000
+# Chunks allowed to wait between stages; bounds memory while stages overlap
+STREAM_QUEUE_DEPTH = 2
+READ_BLOCK_SIZE = 1 << 20
+# No lead comes close; an element still undecodable at this size is malformed
+MAX_ELEMENT_SIZE = 16 * READ_BLOCK_SIZE
 
 
 def load_leads(file_path: str) -> list[dict]:
@@ -31,9 +52,94 @@ def load_leads(file_path: str) -> list[dict]:
     raise ValueError("JSON must be a list of leads or {leads: [...]}")
 
 
-def add_embeddings(leads: list[dict]) -> list[dict]:
+# --- Streaming Readers ---
+
+def iter_ndjson(f):
+    """Yield one lead per non-blank line."""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json_array(f, buffer: str = ""):
+    """Yield the elements of a JSON array one at a time, reading the file in blocks."""
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    eof = False
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError("need more data")
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError as e:
+            if eof:
+                raise ValueError(f"Truncated JSON array: {e}")
+            if len(buffer) - pos > MAX_ELEMENT_SIZE:
+                raise ValueError(f"Malformed JSON array element (nothing decodes within {MAX_ELEMENT_SIZE} bytes): {e}")
+            block = f.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer = buffer[pos:] + block
+            pos = 0
+            continue
+        yield item
+
+
+def iter_leads(file_path: str):
+    """
+    Stream leads from NDJSON, a JSON array or {leads: [...]} without loading
+    the whole file.
+    """
+    with open(file_path) as f:
+        if file_path.endswith((".ndjson", ".jsonl")):
+            yield from iter_ndjson(f)
+            return
+
+        head = f.read(READ_BLOCK_SIZE)
+        start = head.lstrip()[:1]
+        if start == "[":
+            yield from iter_json_array(f, head)
+        elif start == "{":
+            # Either a {"leads": [...]} wrapper or NDJSON without the extension
+            first_line = head.split("\n", 1)[0]
+            try:
+                first = json.loads(first_line)
+            except ValueError:
+                first = None
+            # A wrapper written on one line also parses as a single JSON line
+            if isinstance(first, dict) and not isinstance(first.get("leads"), list):
+                f.seek(0)
+                yield from iter_ndjson(f)
+            else:
+                if '"leads"' not in head:
+                    raise ValueError("JSON must be a list of leads or {leads: [...]}")
+                yield from iter_json_array(f, head[head.index('"leads"'):])
+        elif start:
+            raise ValueError("JSON must be a list of leads or {leads: [...]}")
+
+
+def iter_chunks(items, size: int):
+    """Group an iterator into lists of at most `size` items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Embeddings ---
+
+def add_embeddings(leads: list[dict], verbose: bool = True) -> list[dict]:
     if not OPENAI_API_KEY:
-        print("No OPENAI_API_KEY — skipping embeddings")
+        if verbose:
+            print("No OPENAI_API_KEY — skipping embeddings")
         return leads
 
     client = OpenAI(api_key=OPENAI_API_KEY)
@@ -48,43 +154,111 @@ def add_embeddings(leads: list[dict]) -> list[dict]:
         return leads
 
     texts = [d for _, d in non_empty]
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts,
-    )
+    # Leads keep row views of one float32 matrix; BulkWriter encodes them
+    embeddings = embed_matrix(client, texts)
 
-    for idx, (lead_idx, _) in enumerate(non_empty):
-        leads[lead_idx]["company_description_vector"] = response.data[idx].embedding
+    for (lead_idx, _), embedding in zip(non_empty, embeddings):
+        leads[lead_idx]["company_description_vector"] = embedding
 
-    print(f"Added embeddings for {len(non_empty)} leads")
+    if verbose:
+        cache = get_cache()
+        print(f"Added embeddings for {len(non_empty)} leads ({cache.hits} cached, {cache.misses} from the API)")
+        if API_STATS.requests:
+            print(f"  Embedding API: {API_STATS.summary()}")
     return leads
 
 
-def bulk_index(es: Elasticsearch, leads: list[dict]):
-    actions = [{"_index": INDEX_NAME, "_source": lead} for lead in leads]
-    success, errors = helpers.bulk(es, actions, raise_on_error=False)
-    print(f"Indexed: {success}, Errors: {len(errors)}")
-    if errors:
-        for err in errors[:5]:
-            print(f"  Error: {err}")
+# --- Indexing ---
+
+def bulk_index(es: Elasticsearch, writes: list[tuple]):
+    """Upsert the (doc_id, lead, exists) entries of an upsert plan."""
+    actions = (upsert_action(INDEX_NAME, *write) for write in writes)
+    with BulkWriter(es, vector_encoding=vector_encoding(es)) as writer:
+        writer.add_many(actions)
+    print(f"Indexed: {writer.docs}, Errors: {writer.failed}")
+    for err in writer.errors[:5]:
+        print(f"  Error: {err}")
+    print(f"  Bulk: {writer.summary()}")
+
+
+def stream_index(es: Elasticsearch, file_path: str, embed: bool = True,
+                 chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Read → embed → index in bounded chunks. Reading and embedding run in a
+    background thread feeding a small queue, so the next chunk is embedded
+    while the current one is being indexed.
+    """
+    chunks = queue.Queue(maxsize=STREAM_QUEUE_DEPTH)
+    failure = []
+
+    def produce():
+        try:
+            for chunk in iter_chunks(iter_leads(file_path), chunk_size):
+                plan = plan_upserts(es, INDEX_NAME, chunk)
+                if embed:
+                    add_embeddings(plan["embed"], verbose=False)
+                chunks.put(plan)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            chunks.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    loaded = unchanged = 0
+    # One writer for the whole stream; add() blocks while its requests are backed up
+    with BulkWriter(es, vector_encoding=vector_encoding(es)) as writer:
+        while (plan := chunks.get()) is not None:
+            writer.add_many(upsert_action(INDEX_NAME, *write) for write in plan["write"])
+            loaded += len(plan["write"]) + plan["unchanged"]
+            unchanged += plan["unchanged"]
+            print(f"  ... {loaded} leads read, {unchanged} unchanged, {writer.docs} written")
+
+    producer.join()
+    if failure:
+        raise failure[0]
+
+    print(f"Indexed: {writer.docs}, Unchanged: {unchanged}, Errors: {writer.failed}")
+    for err in writer.errors[:5]:
+        print(f"  Error: {err}")
+    print(f"  Bulk: {writer.summary()}")
+    if embed and API_STATS.requests:
+        print(f"  Embedding API: {API_STATS.summary()}")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Bulk index leads into Elasticsearch")
     parser.add_argument("--file", required=True, help="Path to JSON file with leads")
     parser.add_argument("--no-embeddings", action="store_true", help="Skip embedding generation")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse the file incrementally and embed/index in bounded chunks")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, help="Leads per streamed chunk")
     args = parser.parse_args()
 
     es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
     print(f"Connected to Elasticsearch: {es.info()['version']['number']}")
+    if not args.no_embeddings:
+        check_index_profile(es, INDEX_NAME)
+        print(f"Vector profile: {VECTOR_PROFILE['name']}")
 
-    leads = load_leads(args.file)
-    print(f"Loaded {len(leads)} leads from {args.file}")
+    if args.stream or args.file.endswith((".ndjson", ".jsonl")):
+        print(f"Streaming leads from {args.file} in chunks of {args.chunk_size}...")
+        embed = not args.no_embeddings and bool(OPENAI_API_KEY)
+        if not args.no_embeddings and not OPENAI_API_KEY:
+            print("No OPENAI_API_KEY — skipping embeddings")
+        stream_index(es, args.file, embed=embed, chunk_size=args.chunk_size)
+    else:
+        leads = load_leads(args.file)
+        print(f"Loaded {len(leads)} leads from {args.file}")
 
-    if not args.no_embeddings:
-        leads = add_embeddings(leads)
+        plan = plan_upserts(es, INDEX_NAME, leads)
+        print(f"{len(plan['write'])} new or changed, {plan['unchanged']} unchanged")
+
+        if not args.no_embeddings:
+            add_embeddings(plan["embed"])
 
-    bulk_index(es, leads)
+        bulk_index(es, plan["write"])
 
     es.indices.refresh(index=INDEX_NAME)
     count = es.count(index=INDEX_NAME)["count"]
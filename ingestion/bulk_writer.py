@@ -0,0 +1,189 @@
+"""
+SalesForge Agent — Adaptive Bulk Writer
+Shared bulk-indexing component for seed_data.py and bulk_index.py.
+
+Actions are serialized once and packed into bulk requests by size in bytes.
+Several requests run in parallel; the chunk size grows while the cluster
+answers quickly and shrinks when responses slow down or get rejected. Items
+rejected with 429 are retried on their own with exponential backoff instead
+of resending the whole chunk. Producers block once enough requests are in
+flight, so ingest speed follows what the cluster can absorb.
+
+Documents may carry vectors as NumPy arrays; they are encoded only here, as
+the action is serialized (base64 or a JSON array, see vector_profile.py).
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from elasticsearch import ApiError, Elasticsearch, helpers
+
+from vector_profile import pack_vector
+
+BULK_WORKERS = 4
+CHUNK_BYTES = 5 * 1024 * 1024
+MIN_CHUNK_BYTES = 256 * 1024
+MAX_CHUNK_BYTES = 50 * 1024 * 1024
+# Bulk latency we steer the chunk size towards
+TARGET_LATENCY = 1.0
+MAX_RETRIES = 8
+INITIAL_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+
+def serialize_action(action: dict, vector_encoding: str = "json") -> list[str]:
+    """The NDJSON lines of one bulk action, encoding any NumPy vectors it holds."""
+    def encode(value):
+        if isinstance(value, np.ndarray):
+            return pack_vector(value) if vector_encoding == "base64" else value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    header, body = helpers.expand_action(action)
+    lines = [json.dumps(header)]
+    if body is not None:
+        lines.append(json.dumps(body, default=encode))
+    return lines
+
+
+class BulkWriter:
+    """Parallel, self-tuning bulk writer. Use as a context manager or call close()."""
+
+    def __init__(self, es: Elasticsearch, workers: int = BULK_WORKERS,
+                 chunk_bytes: int = CHUNK_BYTES, target_latency: float = TARGET_LATENCY,
+                 max_retries: int = MAX_RETRIES, refresh: str | bool = False,
+                 vector_encoding: str = "json"):
+        self.es = es
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.refresh = refresh
+        self.vector_encoding = vector_encoding
+
+        self.docs = 0
+        self.bytes = 0
+        self.failed = 0
+        self.retried = 0
+        self.errors = []
+        self.results = {}
+        self.started = time.time()
+
+        self._lines = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        # Caps the requests queued or in flight — add() blocks beyond this
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-writer")
+        self._futures = []
+
+    # --- Producer side ---
+
+    def add(self, action: dict):
+        """Queue one action in helpers.bulk form ({"_index": ..., "_source": ...})."""
+        lines = serialize_action(action, self.vector_encoding)
+        size = sum(len(line.encode()) + 1 for line in lines)
+
+        self._lines.append(lines)
+        self._pending_bytes += size
+        if self._pending_bytes >= self.chunk_bytes:
+            self._submit()
+
+    def add_many(self, actions):
+        for action in actions:
+            self.add(action)
+
+    def flush(self):
+        """Send whatever is buffered and wait for every request to finish."""
+        if self._lines:
+            self._submit()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self) -> "BulkWriter":
+        self.flush()
+        self._pool.shutdown()
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self):
+        chunk, self._lines, self._pending_bytes = self._lines, [], 0
+        self._slots.acquire()
+        future = self._pool.submit(self._send_chunk, chunk)
+        future.add_done_callback(lambda _: self._slots.release())
+        # Finished requests are dropped unless they failed; flush() re-raises those
+        self._futures = [f for f in self._futures if not f.done() or f.exception()] + [future]
+
+    # --- Worker side ---
+
+    def _send_chunk(self, chunk: list[list[str]]):
+        attempt = 0
+        while chunk:
+            body = [line for lines in chunk for line in lines]
+            size = sum(len(line.encode()) + 1 for line in body)
+            start = time.time()
+            try:
+                response = self.es.bulk(operations=body, refresh=self.refresh)
+            except ApiError as e:
+                if e.meta.status != 429 or attempt >= self.max_retries:
+                    raise
+                # The whole request was rejected — back off and shrink
+                self._adapt(None)
+                attempt += 1
+                self._backoff(attempt, len(chunk))
+                continue
+            self._adapt(time.time() - start)
+
+            retry = []
+            for lines, item in zip(chunk, response["items"]):
+                (op, result), = item.items()
+                status = result.get("status", 200)
+                if status == 429 and attempt < self.max_retries:
+                    retry.append(lines)
+                    continue
+                with self._lock:
+                    if status >= 300:
+                        self.failed += 1
+                        if len(self.errors) < 20:
+                            self.errors.append(item)
+                    else:
+                        self.docs += 1
+                        outcome = result.get("result", op)
+                        self.results[outcome] = self.results.get(outcome, 0) + 1
+            with self._lock:
+                self.bytes += size
+
+            chunk = retry
+            if retry:
+                self._adapt(None)
+                attempt += 1
+                self._backoff(attempt, len(retry))
+
+    def _backoff(self, attempt: int, count: int):
+        with self._lock:
+            self.retried += count
+        time.sleep(min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** (attempt - 1)))
+
+    def _adapt(self, latency: float | None):
+        """Grow chunks while requests are fast, shrink when slow or rejected (latency=None)."""
+        with self._lock:
+            if latency is None or latency > self.target_latency:
+                self.chunk_bytes = max(MIN_CHUNK_BYTES, int(self.chunk_bytes * 0.5))
+            elif latency < self.target_latency / 2:
+                self.chunk_bytes = min(MAX_CHUNK_BYTES, int(self.chunk_bytes * 1.5))
+
+    # --- Reporting ---
+
+    def summary(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-9)
+        return (f"{self.docs} docs ok, {self.failed} failed, {self.retried} retried — "
+                f"{self.docs / elapsed:.0f} docs/s, {self.bytes / elapsed / 1024 / 1024:.1f} MB/s "
+                f"(chunk size now {self.chunk_bytes / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,159 @@
+"""
+SalesForge Agent — Columnar Scoring Engine
+Scores a whole page of leads at once with NumPy instead of one lead at a time.
+
+Inputs are columns (employee_count, funding_stage, industry and description
+features). Employee and description bands come from `searchsorted` over the
+rubric thresholds, funding and industry from array-coded lookup tables. Scores
+and tiers are returned as arrays; reasoning text is only rendered for the rows
+a caller asks for, from the compact row by rubric.render_result.
+
+Every score and reason is identical to rubric.score_lead, and every compact
+row to rubric.score_lead_compact.
+"""
+
+import numpy as np
+
+from rubric import (
+    DESCRIPTION_LENGTH_POINTS,
+    DESCRIPTION_LENGTH_THRESHOLDS,
+    DIMENSION_MAX,
+    EMPLOYEE_POINTS,
+    EMPLOYEE_THRESHOLDS,
+    FUNDING_SCORES,
+    FUNDING_STAGES,
+    INDUSTRY_GROUPS,
+    RUBRIC_MATCHER,
+    SIGNAL_BANDS,
+    TIER_THRESHOLDS,
+    TIERS,
+    UNKNOWN_FUNDING,
+    UNKNOWN_INDUSTRY,
+    compact_result,
+    render_result,
+    signal_band,
+)
+
+# --- Lookup Tables ---
+
+# Code 0 is reserved for values outside the rubric; codes match rubric.funding_code
+FUNDING_CODES = {stage: code for code, stage in enumerate(FUNDING_STAGES, start=1)}
+FUNDING_POINTS = np.array([UNKNOWN_FUNDING[0]] + [points for points, _ in FUNDING_SCORES.values()])
+
+INDUSTRY_CODES = {}
+INDUSTRY_GROUP_OF = [None]
+INDUSTRY_POINT_LIST = [UNKNOWN_INDUSTRY[0]]
+for _group, (_scores, _reason) in enumerate(INDUSTRY_GROUPS):
+    for _industry, _points in _scores.items():
+        # Earlier groups win, matching the if/elif order of the scalar scorer
+        if _industry not in INDUSTRY_CODES:
+            INDUSTRY_CODES[_industry] = len(INDUSTRY_POINT_LIST)
+            INDUSTRY_GROUP_OF.append(_group)
+            INDUSTRY_POINT_LIST.append(_points)
+INDUSTRY_POINTS = np.array(INDUSTRY_POINT_LIST)
+
+EMPLOYEE_BAND_THRESHOLDS = np.array(EMPLOYEE_THRESHOLDS)
+EMPLOYEE_BAND_POINTS = np.array(EMPLOYEE_POINTS)
+LENGTH_BAND_THRESHOLDS = np.array(DESCRIPTION_LENGTH_THRESHOLDS)
+LENGTH_BAND_POINTS = np.array(DESCRIPTION_LENGTH_POINTS)
+TIER_BAND_THRESHOLDS = np.array(TIER_THRESHOLDS)
+TIER_NAMES = np.array(TIERS, dtype=object)
+
+# Signal points indexed by match count, capped at the largest count any band distinguishes
+SIGNAL_POINTS = {
+    group: np.array([bands[signal_band(group, n)][1] for n in range(max(b[0] for b in bands) + 1)])
+    for group, bands in SIGNAL_BANDS.items()
+}
+
+
+# --- Column Extraction ---
+
+def lead_columns(leads: list[dict]) -> dict:
+    """Pull the scoring inputs out of lead documents into columns."""
+    return {
+        "employee_count": [lead.get("employee_count", 0) for lead in leads],
+        "funding_stage": [lead.get("funding_stage", "Unknown") for lead in leads],
+        "industry": [lead.get("industry", "") for lead in leads],
+        "company_description": [lead.get("company_description", "") for lead in leads],
+        "keywords": [lead.get("keywords", "") for lead in leads],
+    }
+
+
+def description_features(descriptions: list[str], keywords: list[str]) -> dict:
+    """Length and keyword-match features for each description."""
+    matrix = RUBRIC_MATCHER.match_page(descriptions, keywords)
+    counts = RUBRIC_MATCHER.group_counts(matrix)
+    return {
+        "length": np.fromiter(map(len, descriptions), dtype=np.int64, count=len(descriptions)),
+        "keyword_matrix": matrix,
+        "signal_counts": counts,
+    }
+
+
+# --- Scoring ---
+
+class ColumnarScores:
+    """Score and tier arrays for a page of leads, with reasoning rendered on demand."""
+
+    def __init__(self, employee_count: list, funding_stage: list, industry: list, features: dict):
+        n = len(employee_count)
+        self.employee_count = employee_count
+        self.funding_stage = funding_stage
+        self.industry = industry
+        self.features = features
+
+        # None becomes NaN, which searchsorted would put in the top band
+        employees = np.nan_to_num(np.asarray(employee_count, dtype=np.float64), nan=0.0)
+        self.employee_band = np.searchsorted(EMPLOYEE_BAND_THRESHOLDS, employees, side="right")
+        self.employee_score = EMPLOYEE_BAND_POINTS[self.employee_band]
+
+        self.funding_code = np.fromiter(
+            (FUNDING_CODES.get(stage, 0) for stage in funding_stage), dtype=np.intp, count=n)
+        self.funding_score = FUNDING_POINTS[self.funding_code]
+
+        self.industry_code = np.fromiter(
+            (INDUSTRY_CODES.get(name, 0) for name in industry), dtype=np.intp, count=n)
+        self.industry_score = INDUSTRY_POINTS[self.industry_code]
+
+        self.length_band = np.searchsorted(LENGTH_BAND_THRESHOLDS, features["length"], side="left")
+        description_score = LENGTH_BAND_POINTS[self.length_band]
+        for group, points in SIGNAL_POINTS.items():
+            description_score = description_score + points[np.minimum(features["signal_counts"][group], len(points) - 1)]
+        self.description_score = np.minimum(description_score, DIMENSION_MAX)
+
+        self.score = self.employee_score + self.funding_score + self.industry_score + self.description_score
+        self.tier = TIER_NAMES[np.searchsorted(TIER_BAND_THRESHOLDS, self.score, side="right")]
+
+    def __len__(self):
+        return len(self.score)
+
+    def result(self, i: int) -> dict:
+        """Full score document for row i, identical to rubric.score_lead."""
+        lead = {"employee_count": self.employee_count[i], "funding_stage": self.funding_stage[i],
+                "industry": self.industry[i]}
+        return render_result({**lead, **self.compact(i)})
+
+    def compact(self, i: int) -> dict:
+        """Compact score fields for row i, identical to rubric.score_lead_compact."""
+        group = INDUSTRY_GROUP_OF[self.industry_code[i]]
+        return compact_result(
+            int(self.score[i]), str(self.tier[i]),
+            [int(self.employee_score[i]), int(self.funding_score[i]),
+             int(self.industry_score[i]), int(self.description_score[i])],
+            int(self.employee_band[i]), int(self.funding_code[i]),
+            0 if group is None else group + 1, int(self.length_band[i]),
+            RUBRIC_MATCHER.keyword_ids(self.features["keyword_matrix"][i]),
+        )
+
+
+def score_columns(employee_count: list, funding_stage: list, industry: list,
+                  features: dict) -> ColumnarScores:
+    """Score a page of leads given as columns."""
+    return ColumnarScores(employee_count, funding_stage, industry, features)
+
+
+def score_leads(leads: list[dict]) -> ColumnarScores:
+    """Score a page of lead documents in one vectorized pass."""
+    columns = lead_columns(leads)
+    features = description_features(columns["company_description"], columns["keywords"])
+    return score_columns(columns["employee_count"], columns["funding_stage"], columns["industry"], features)
@@ -0,0 +1,252 @@
+"""
+SalesForge Agent — Embedding Stub Server
+A local stand-in for the OpenAI embeddings endpoint, so the batcher in
+embeddings.py can be exercised without an API key or network access.
+
+The stub answers POST /v1/embeddings with deterministic vectors (seeded from
+the text), honours `dimensions` and both encoding formats, and can be told to
+answer the first N requests with 429 + Retry-After, or to reject any request
+containing a given text with a 400.
+
+Run without arguments to check the batcher against it:
+  - misses are packed into budgeted requests and duplicates are sent once
+  - a 429 is retried after the server's Retry-After, not before
+  - every request's vectors are cached as it lands, so a run that fails
+    part-way keeps the batches that succeeded
+  - the sync entry point works from inside a running event loop
+
+Usage:
+  python embedding_stub.py                  # self-check
+  python embedding_stub.py --serve --port 8080 --rate-limit 2
+  # then: OPENAI_BASE_URL=http://localhost:8080/v1 python seed_data.py
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from openai import BadRequestError, OpenAI
+
+from embeddings import (
+    API_STATS, EMBEDDING_BATCH_SIZE, EmbeddingCache, cache_key, embed_matrix, normalize_text,
+)
+
+STUB_DIMS = 8
+RETRY_AFTER = 0.3
+
+
+# --- Stub Server ---
+
+def stub_vector(text: str, dims: int) -> np.ndarray:
+    """The vector the stub returns for a text: unit length and stable across runs."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dims).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    """Embeddings endpoint on localhost that records every request it answers."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, rate_limit: int = 0, reject: str = None):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.rate_limit = rate_limit
+        self.reject = reject
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def record(self, status: int, inputs: list[str]) -> bool:
+        """Log a request; True if it should be rate limited."""
+        with self._lock:
+            limited = sum(1 for r in self.requests if r["status"] == 429) < self.rate_limit
+            self.requests.append({"status": 429 if limited else status, "inputs": inputs, "at": time.time()})
+            return limited
+
+    def start(self) -> "StubEmbeddingServer":
+        threading.Thread(target=self.serve_forever, name="embedding-stub", daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        rejected = self.server.reject is not None and self.server.reject in inputs
+
+        if self.server.record(400 if rejected else 200, inputs):
+            return self.reply(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                              {"Retry-After": str(RETRY_AFTER)})
+        if rejected:
+            return self.reply(400, {"error": {"message": "Rejected input", "type": "invalid_request_error"}})
+
+        dims = body.get("dimensions") or STUB_DIMS
+        data = []
+        for i, text in enumerate(inputs):
+            vector = stub_vector(text, dims)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        self.reply(200, {"object": "list", "data": data, "model": body["model"],
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def reply(self, status: int, payload: dict, headers: dict = None):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+# --- Self-Check ---
+
+def check(label: str, ok: bool, detail: str = "") -> bool:
+    print(f"  {'PASS' if ok else 'FAIL'}  {label}{f' — {detail}' if detail else ''}")
+    return ok
+
+
+def check_batching(cache_path: str) -> bool:
+    """Misses go out in budgeted requests, duplicates once, cache hits not at all."""
+    server = StubEmbeddingServer().start()
+    client = OpenAI(api_key="stub", base_url=server.base_url)
+    cache = EmbeddingCache(cache_path)
+    texts = [f"Company {i} builds  AI agents" for i in range(EMBEDDING_BATCH_SIZE * 2 + 100)]
+    texts += texts[:50] + [text.replace("  ", " ") for text in texts[50:60]]
+
+    matrix = embed_matrix(client, texts, dims=STUB_DIMS, cache=cache)
+    unique = len({normalize_text(text) for text in texts})
+    sent = [len(r["inputs"]) for r in server.requests]
+    expected = np.stack([stub_vector(normalize_text(text), STUB_DIMS) for text in texts])
+    results = [
+        check("vectors match the stub, row for row", np.array_equal(matrix, expected)),
+        check("duplicates requested once", sum(sent) == unique, f"{sum(sent)} texts sent for {unique} unique"),
+        check("requests stay within the batch budget", max(sent) <= EMBEDDING_BATCH_SIZE,
+              f"request sizes {sorted(sent, reverse=True)}"),
+    ]
+
+    before = len(server.requests)
+    embed_matrix(client, texts[:200], dims=STUB_DIMS, cache=cache)
+    results.append(check("cached texts are not requested again", len(server.requests) == before))
+    server.shutdown()
+    cache.close()
+    return all(results)
+
+
+def check_retry_after(cache_path: str) -> bool:
+    """A 429 is retried once Retry-After has passed."""
+    server = StubEmbeddingServer(rate_limit=1).start()
+    client = OpenAI(api_key="stub", base_url=server.base_url)
+    cache = EmbeddingCache(cache_path)
+    retries = API_STATS.retries
+
+    embed_matrix(client, ["a lead to embed"], dims=STUB_DIMS, cache=cache, concurrency=1)
+    limited, retried = server.requests[0], server.requests[1]
+    waited = retried["at"] - limited["at"]
+    results = [
+        check("429 retried", limited["status"] == 429 and retried["status"] == 200
+              and API_STATS.retries == retries + 1),
+        check("retry waits for Retry-After", waited >= RETRY_AFTER, f"waited {waited:.2f}s for {RETRY_AFTER}s"),
+    ]
+    server.shutdown()
+    cache.close()
+    return all(results)
+
+
+def check_partial_failure(cache_path: str) -> bool:
+    """Requests that succeeded before a failing one are already in the cache."""
+    poison = "this text is rejected"
+    server = StubEmbeddingServer(reject=poison).start()
+    client = OpenAI(api_key="stub", base_url=server.base_url)
+    cache = EmbeddingCache(cache_path)
+    texts = [f"Partial run lead {i}" for i in range(EMBEDDING_BATCH_SIZE * 2)] + [poison]
+
+    try:
+        embed_matrix(client, texts, dims=STUB_DIMS, cache=cache, concurrency=1)
+        failed = False
+    except BadRequestError:
+        failed = True
+    stored = cache.get_many([cache_key(text, dims=STUB_DIMS) for text in texts])
+    results = [
+        check("failing request raises", failed),
+        check("earlier requests were cached as they landed", len(stored) == len(texts) - 1,
+              f"{len(stored)}/{len(texts) - 1} vectors cached"),
+    ]
+    server.shutdown()
+    cache.close()
+    return all(results)
+
+
+def check_running_loop(cache_path: str) -> bool:
+    """The sync entry point can be called from a coroutine."""
+    server = StubEmbeddingServer().start()
+    client = OpenAI(api_key="stub", base_url=server.base_url)
+    cache = EmbeddingCache(cache_path)
+
+    async def handler():
+        return embed_matrix(client, ["called from async code"], dims=STUB_DIMS, cache=cache)
+
+    try:
+        matrix = asyncio.run(handler())
+        ok = np.array_equal(matrix[0], stub_vector("called from async code", STUB_DIMS))
+        detail = ""
+    except RuntimeError as e:
+        ok, detail = False, str(e)
+    server.shutdown()
+    cache.close()
+    return check("embed_matrix inside a running event loop", ok, detail)
+
+
+def self_check() -> bool:
+    print("=== Embedding batcher vs. local stub ===\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [
+            check_batching(os.path.join(tmp, "batching.sqlite")),
+            check_retry_after(os.path.join(tmp, "retry.sqlite")),
+            check_partial_failure(os.path.join(tmp, "partial.sqlite")),
+            check_running_loop(os.path.join(tmp, "loop.sqlite")),
+        ]
+    print(f"\n{'All checks passed' if all(results) else 'Some checks FAILED'} ({API_STATS.summary()})")
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embeddings stub and batcher self-check")
+    parser.add_argument("--serve", action="store_true", help="Run the stub server until interrupted")
+    parser.add_argument("--port", type=int, default=8080, help="Port for --serve")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Answer the first N requests with 429")
+    args = parser.parse_args()
+
+    if not args.serve:
+        raise SystemExit(0 if self_check() else 1)
+
+    server = StubEmbeddingServer(args.port, rate_limit=args.rate_limit)
+    print(f"Stub embeddings endpoint at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+SalesForge Agent — Embedding Cache
+Every embedding the ingestion scripts request goes through here.
+
+Vectors are cached on disk in SQLite, keyed by a hash of (model, dimensions,
+normalized text). Company descriptions come from templates and repeat a lot,
+so re-imports and repeat similarity queries are served locally without an API
+call. Identical texts in one batch are sent to the API only once. The cache is
+capped at a fixed number of entries and evicts the least recently used ones.
+
+Cache misses are packed into requests by item count and estimated tokens and
+sent several at a time on asyncio, backing off on 429s. The sync entry points
+also work from inside a running event loop (an async server, a notebook): the
+batcher then runs on its own loop in a worker thread. embedding_stub.py runs
+the batcher against a local stub server.
+
+Vectors are float32 NumPy arrays end to end: embed_matrix returns one
+contiguous (texts, dims) buffer, and rows are only turned into JSON when a
+bulk request is serialized.
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
+
+from vector_profile import VECTOR_DIMS
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Requested through the API's `dimensions` parameter; set by the vector profile
+EMBEDDING_DIMS = VECTOR_DIMS
+# Per-request budgets; the endpoint allows 2048 inputs and 300k tokens per request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = 6
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(__file__), ".embedding_cache.sqlite"))
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+# --- Keys ---
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a text for cache lookups: NFC with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL, dims: int = EMBEDDING_DIMS) -> str:
+    """Content address of one embedding."""
+    return hashlib.sha256(f"{model}\x00{dims}\x00{normalize_text(text)}".encode()).hexdigest()
+
+
+# --- Cache ---
+
+class EmbeddingCache:
+    """SQLite-backed float32 vector store with a size cap and LRU eviction."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Look up cached vectors, marking every hit as recently used."""
+        found = {}
+        with self._lock:
+            # SQLite limits bound parameters per statement, so look up in chunks
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._db.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        """Store new vectors, then evict the least recently used beyond the cap."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()],
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_cache = None
+
+
+def get_cache() -> EmbeddingCache:
+    """The process-wide cache at CACHE_PATH, opened on first use."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
+
+
+# --- Batching ---
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: list[str], max_items: int = EMBEDDING_BATCH_SIZE,
+                 max_tokens: int = EMBEDDING_BATCH_TOKENS) -> list[list[int]]:
+    """Group text indices into requests that stay within both budgets."""
+    batches, current, tokens = [], [], 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (len(current) >= max_items or tokens + cost > max_tokens):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingStats:
+    """Running totals for the embedding API calls made by this process."""
+
+    def __init__(self):
+        self.texts = 0
+        self.tokens = 0
+        self.requests = 0
+        self.retries = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> str:
+        elapsed = self.elapsed or 1e-9
+        return (f"{self.texts} texts in {self.requests} requests ({self.retries} retries), "
+                f"{self.texts / elapsed:.0f} texts/s, {self.tokens / elapsed:.0f} tokens/s")
+
+
+API_STATS = EmbeddingStats()
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's Retry-After, else jittered exponential backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+async def embed_batch(client: AsyncOpenAI, semaphore: asyncio.Semaphore, texts: list[str],
+                      model: str, dims: int, stats: EmbeddingStats) -> list[list[float]]:
+    """Send one request, retrying rate limits and transient server errors."""
+    for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await client.embeddings.create(model=model, input=texts, dimensions=dims)
+        except (RateLimitError, APIConnectionError, InternalServerError) as e:
+            if attempt == EMBEDDING_MAX_RETRIES:
+                raise
+            stats.retries += 1
+            await asyncio.sleep(retry_delay(e, attempt))
+            continue
+
+        usage = getattr(response, "usage", None)
+        stats.requests += 1
+        stats.texts += len(texts)
+        stats.tokens += usage.total_tokens if usage else sum(map(estimate_tokens, texts))
+        return [item.embedding for item in response.data]
+
+
+async def embed_concurrently(client: AsyncOpenAI, texts: list[str], model: str, dims: int,
+                             concurrency: int, stats: EmbeddingStats, on_batch=None) -> list[list[float]]:
+    """Embed texts with up to `concurrency` packed requests in flight."""
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    vectors = [None] * len(texts)
+
+    async def run(indices: list[int]):
+        batch = [texts[i] for i in indices]
+        embedded = await embed_batch(client, semaphore, batch, model, dims, stats)
+        for i, vector in zip(indices, embedded):
+            vectors[i] = vector
+        if on_batch:
+            on_batch(indices, embedded)
+
+    start = time.time()
+    try:
+        await asyncio.gather(*(run(indices) for indices in pack_batches(texts)))
+    finally:
+        stats.elapsed += time.time() - start
+        await client.close()
+    return vectors
+
+
+def run_coroutine(coro):
+    """Run a coroutine to completion from sync code, in a worker thread if this thread's loop is busy."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+# --- Embedding ---
+
+def async_client(client: OpenAI) -> AsyncOpenAI:
+    """An async twin of a sync client (same key and base URL); retries are handled here."""
+    return AsyncOpenAI(api_key=client.api_key, base_url=client.base_url, max_retries=0)
+
+
+def embed_matrix(client: OpenAI, texts: list[str], model: str = EMBEDDING_MODEL,
+                 dims: int = EMBEDDING_DIMS, cache: EmbeddingCache = None,
+                 concurrency: int = EMBEDDING_CONCURRENCY) -> np.ndarray:
+    """
+    Embed texts into one (len(texts), dims) float32 array, row i for texts[i],
+    calling the API only for texts not already cached. Duplicate texts (after
+    normalization) are requested once.
+    """
+    # An empty cache is falsy (it has __len__), so test for None explicitly
+    cache = cache if cache is not None else get_cache()
+    keys = [cache_key(text, model, dims) for text in texts]
+
+    # First occurrence of each key carries the text we send
+    unique = {}
+    for key, text in zip(keys, texts):
+        unique.setdefault(key, normalize_text(text))
+
+    vectors = cache.get_many(list(unique))
+    missing = [key for key in unique if key not in vectors]
+
+    if missing:
+        def store(indices: list[int], embedded: list[list[float]]):
+            # Round-trip through float32 so fresh and cached vectors are identical,
+            # and cache each request as it lands so a failed run keeps its progress
+            fresh = {missing[i]: np.asarray(vector, dtype=np.float32) for i, vector in zip(indices, embedded)}
+            cache.put_many(fresh)
+            vectors.update(fresh)
+
+        run_coroutine(embed_concurrently(
+            async_client(client), [unique[key] for key in missing], model, dims, concurrency, API_STATS, store,
+        ))
+
+    matrix = np.empty((len(keys), dims), dtype=np.float32)
+    for row, key in enumerate(keys):
+        matrix[row] = vectors[key]
+    return matrix
+
+
+def embed_texts(client: OpenAI, texts: list[str], **kwargs) -> list[list[float]]:
+    """Embed texts in order as plain lists (for query vectors sent as JSON)."""
+    return embed_matrix(client, texts, **kwargs).tolist()
+
+
+def embed_text(client: OpenAI, text: str, **kwargs) -> list[float]:
+    """Embed a single text through the cache."""
+    return embed_texts(client, [text], **kwargs)[0]
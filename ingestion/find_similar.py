@@ -5,83 +5,334 @@ using Elasticsearch kNN vector search on company description embeddings.
 
 This is the WOW FEATURE — "Find me more leads like this one"
 Uses pure vector similarity to discover leads the agent wouldn't find with keywords alone.
+
+Filters (tier, industry, employee range) and the seed exclusion are pushed
+into the kNN filter, so a lookup returns exactly k leads in one search.
+num_candidates grows with k; with --adaptive-candidates it also grows with how
+selective the filter is, at the cost of one size-0 search to count the
+matching leads (the warm server and batch mode pay it once per filter set).
+--hybrid fuses the kNN results with a BM25 match on description and keywords
+through reciprocal rank fusion; results then carry the RRF score, not a
+similarity.
+
+Batch mode takes a file of seeds and streams results as NDJSON. All names are
+resolved in one msearch, missing vectors are embedded in one batched call, and
+all kNN queries run in one more msearch.
 """
 
+import argparse
+import json
+import math
 import os
 import sys
-import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 from openai import OpenAI
 
+from embeddings import embed_text, embed_texts
+from lead_reader import projection
+from rubric import render_reasoning
+from vector_profile import check_index_profile, knn_clause, unpack_vector
+
 load_dotenv()
 
 ES_URL = os.getenv("ELASTICSEARCH_URL")
 ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INDEX_NAME = "leads-raw"
+# Searches per msearch request in batch mode
+MSEARCH_BATCH = 200
+QUERY_PREFIX = "query:"
+
+# kNN candidates per requested result with no filter; divided by sqrt(selectivity)
+CANDIDATE_FACTOR = 10
+MAX_NUM_CANDIDATES = 10000
+# Hits each retriever hands to reciprocal rank fusion
+RRF_WINDOW = 100
+RRF_RANK_CONSTANT = 60
+TEXT_FIELDS = ["company_description", "keywords"]
+# Filter match counts are reused this long before being re-counted
+SELECTIVITY_TTL = 300.0
+SELECTIVITY_CACHE_SIZE = 256
 
 
 def get_embedding(text: str, client: OpenAI) -> list[float]:
-    """Generate embedding for a text query."""
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text,
-    )
-    return response.data[0].embedding
+    """Generate embedding for a text query (served from the embedding cache when seen before)."""
+    return embed_text(client, text)
 
 
-def find_by_company_name(es: Elasticsearch, company_name: str) -> dict | None:
-    """Find a lead by company name."""
-    result = es.search(
-        index=INDEX_NAME,
-        body={
-            "query": {
-                "match": {"company_name": company_name}
-            },
-            "size": 1,
+def company_name_query(company_name: str) -> dict:
+    return {
+        "query": {
+            "match": {"company_name": company_name}
         },
-    )
-    hits = result["hits"]["hits"]
-    return hits[0] if hits else None
+        "size": 1,
+        # The stored vector seeds the similarity search
+        "_source": projection("vector"),
+    }
 
 
-def find_similar_by_vector(es: Elasticsearch, vector: list[float],
-                           exclude_id: str = None, top_k: int = 5) -> list[dict]:
-    """Find similar leads using kNN vector search."""
-    query = {
-        "knn": {
-            "field": "company_description_vector",
-            "query_vector": vector,
-            "k": top_k + (1 if exclude_id else 0),
-            "num_candidates": 50,
-        },
-        "_source": {
-            "excludes": ["company_description_vector"]
+# --- Filters ---
+
+def lead_filters(tiers: list[str] = None, industries: list[str] = None,
+                 min_employees: int = None, max_employees: int = None) -> list[dict]:
+    """Filter clauses restricting which leads may be returned."""
+    filters = []
+    if tiers:
+        filters.append({"terms": {"score_tier": tiers}})
+    if industries:
+        filters.append({"terms": {"industry": industries}})
+    if min_employees is not None or max_employees is not None:
+        bounds = {}
+        if min_employees is not None:
+            bounds["gte"] = min_employees
+        if max_employees is not None:
+            bounds["lte"] = max_employees
+        filters.append({"range": {"employee_count": bounds}})
+    return filters
+
+
+def search_filter(filters: list[dict] = None, exclude_id: str = None) -> dict | None:
+    """The filters plus the seed exclusion as one bool query, or None when unrestricted."""
+    if not filters and not exclude_id:
+        return None
+    query = {"bool": {"filter": list(filters or [])}}
+    if exclude_id:
+        query["bool"]["must_not"] = [{"ids": {"values": [exclude_id]}}]
+    return query
+
+
+_selectivity = OrderedDict()
+_selectivity_lock = threading.Lock()
+
+
+def filter_selectivity(es: Elasticsearch, filters: list[dict] = None) -> tuple[float, int | None]:
+    """
+    (fraction of leads matching, matching count) for a set of filters. Counted
+    with one size-0 search, then cached in-process for SELECTIVITY_TTL (the
+    SELECTIVITY_CACHE_SIZE most recent filter sets), so only a long-lived
+    process gets repeated lookups down to one round-trip.
+    """
+    if not filters:
+        return 1.0, None
+    key = json.dumps(filters, sort_keys=True)
+    with _selectivity_lock:
+        cached = _selectivity.get(key)
+        if cached and cached[0] > time.monotonic():
+            _selectivity.move_to_end(key)
+            return cached[1]
+        _selectivity.pop(key, None)
+
+    response = es.search(index=INDEX_NAME, body={
+        "size": 0,
+        "track_total_hits": True,
+        "aggs": {"matching": {"filter": search_filter(filters)}},
+    })
+    total = response["hits"]["total"]["value"]
+    matching = response["aggregations"]["matching"]["doc_count"]
+    result = (matching / total if total else 1.0, matching)
+    with _selectivity_lock:
+        _selectivity[key] = (time.monotonic() + SELECTIVITY_TTL, result)
+        while len(_selectivity) > SELECTIVITY_CACHE_SIZE:
+            _selectivity.popitem(last=False)
+    return result
+
+
+def num_candidates_for(top_k: int, selectivity: float = 1.0, matching: int = None) -> int:
+    """
+    HNSW candidates to explore: more for larger k and for selective filters,
+    never more than the leads that can match (the search is exact then).
+    """
+    candidates = math.ceil(top_k * CANDIDATE_FACTOR / math.sqrt(max(selectivity, 1e-6)))
+    if matching is not None:
+        candidates = min(candidates, matching)
+    return max(top_k, min(candidates, MAX_NUM_CANDIDATES))
+
+
+# --- Retrieval ---
+
+def similar_query(vector: list[float], top_k: int = 5, exclude_id: str = None,
+                  filters: list[dict] = None, text: str = None, num_candidates: int = None) -> dict:
+    """
+    One search body returning exactly top_k leads: kNN with the filters and
+    exclusion applied inside the graph search, fused with BM25 on `text` when given.
+    """
+    num_candidates = num_candidates or num_candidates_for(top_k)
+    knn = knn_clause(vector, top_k, num_candidates)
+    query_filter = search_filter(filters, exclude_id)
+    if query_filter:
+        knn["filter"] = query_filter
+
+    if not text:
+        return {"knn": knn, "_source": projection("display"), "size": top_k}
+
+    window = max(top_k, min(num_candidates, RRF_WINDOW))
+    knn["k"] = window
+    lexical = {"bool": {"must": [{"multi_match": {"query": text, "fields": TEXT_FIELDS}}]}}
+    if query_filter:
+        lexical["bool"]["filter"] = [query_filter]
+    return {
+        "retriever": {
+            "rrf": {
+                "retrievers": [{"standard": {"query": lexical}}, {"knn": knn}],
+                "rank_window_size": window,
+                "rank_constant": RRF_RANK_CONSTANT,
+            }
         },
-        "size": top_k + (1 if exclude_id else 0),
+        "_source": projection("display"),
+        "size": top_k,
     }
 
-    result = es.search(index=INDEX_NAME, body=query)
+
+def find_by_company_name(es: Elasticsearch, company_name: str) -> dict | None:
+    """Find a lead by company name."""
+    result = es.search(index=INDEX_NAME, body=company_name_query(company_name))
     hits = result["hits"]["hits"]
+    return hits[0] if hits else None
 
-    # Exclude the source lead
-    if exclude_id:
-        hits = [h for h in hits if h["_id"] != exclude_id]
 
-    return hits[:top_k]
+def find_similar_by_vector(es: Elasticsearch, vector: list[float], exclude_id: str = None,
+                           top_k: int = 5, filters: list[dict] = None, text: str = None,
+                           adaptive: bool = False) -> list[dict]:
+    """
+    Find similar leads using kNN vector search (hybrid with BM25 when `text` is
+    given). One search; `adaptive` first counts the filter's matches so
+    num_candidates can scale with its selectivity (a second search unless cached).
+    """
+    if adaptive:
+        num_candidates = num_candidates_for(top_k, *filter_selectivity(es, filters))
+    else:
+        num_candidates = num_candidates_for(top_k)
+    body = similar_query(vector, top_k, exclude_id, filters, text, num_candidates)
+    return es.search(index=INDEX_NAME, body=body)["hits"]["hits"]
 
 
-def find_similar_by_description(es: Elasticsearch, openai_client: OpenAI,
-                                 description: str, top_k: int = 5) -> list[dict]:
+def find_similar_by_description(es: Elasticsearch, openai_client: OpenAI, description: str,
+                                top_k: int = 5, filters: list[dict] = None, hybrid: bool = False,
+                                adaptive: bool = False) -> list[dict]:
     """Find leads similar to a description using embedding search."""
     vector = get_embedding(description, openai_client)
-    return find_similar_by_vector(es, vector, top_k=top_k)
+    return find_similar_by_vector(es, vector, top_k=top_k, filters=filters,
+                                  text=description if hybrid else None, adaptive=adaptive)
+
+
+def hit_summary(hit: dict, hybrid: bool = False) -> dict:
+    """Compact JSON form of one similar lead; hybrid hits carry their RRF score instead of a similarity."""
+    lead = hit["_source"]
+    return {
+        "id": hit["_id"],
+        "company_name": lead.get("company_name"),
+        "rrf_score" if hybrid else "similarity": round(hit.get("_score") or 0, 4),
+        "score": lead.get("score"),
+        "score_tier": lead.get("score_tier"),
+        "industry": lead.get("industry"),
+    }
 
 
-def display_results(source_lead: dict, similar_leads: list[dict]):
+# --- Batch Mode ---
+
+def multi_search(es: Elasticsearch, bodies: list[dict], stats: dict) -> list[dict]:
+    """Run searches through msearch, MSEARCH_BATCH at a time; one response per body, in order."""
+    responses = []
+    for i in range(0, len(bodies), MSEARCH_BATCH):
+        searches = []
+        for body in bodies[i:i + MSEARCH_BATCH]:
+            searches.extend([{"index": INDEX_NAME}, body])
+        responses.extend(es.msearch(body=searches)["responses"])
+        stats["round_trips"] += 1
+    return responses
+
+
+def read_seeds(path: str) -> list[dict]:
+    """One seed per line: a company name, or a description prefixed with 'query:'."""
+    seeds = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.lower().startswith(QUERY_PREFIX):
+                seeds.append({"seed": line, "type": "query", "text": line[len(QUERY_PREFIX):].strip()})
+            else:
+                seeds.append({"seed": line, "type": "company", "text": line})
+    return seeds
+
+
+def batch_similar(es: Elasticsearch, openai_client: OpenAI, seeds: list[dict], top_k: int = 5,
+                  stats: dict = None, filters: list[dict] = None, hybrid: bool = False) -> list[dict]:
+    """
+    Resolve, embed and search every seed in a few round-trips.
+    Returns one result dict per seed, in order.
+    """
+    stats = stats if stats is not None else {"round_trips": 0}
+    stats.setdefault("round_trips", 0)
+    results = [{"seed": seed["seed"], "type": seed["type"]} for seed in seeds]
+
+    # 1. Resolve every company name in one msearch
+    companies = [i for i, seed in enumerate(seeds) if seed["type"] == "company"]
+    responses = multi_search(es, [company_name_query(seeds[i]["text"]) for i in companies], stats)
+    vectors, texts, descriptions = {}, {}, {}
+    for i, response in zip(companies, responses):
+        if "error" in response:
+            results[i]["error"] = str(response["error"])
+            continue
+        hits = response["hits"]["hits"]
+        if not hits:
+            results[i]["error"] = "not found"
+            continue
+        source = hits[0]["_source"]
+        results[i]["source_id"] = hits[0]["_id"]
+        results[i]["company_name"] = source.get("company_name")
+        descriptions[i] = source.get("company_description", "")
+        if source.get("company_description_vector"):
+            vectors[i] = unpack_vector(source["company_description_vector"])
+        else:
+            texts[i] = source.get("company_description", "")
+    for i, seed in enumerate(seeds):
+        if seed["type"] == "query":
+            texts[i] = descriptions[i] = seed["text"]
+
+    # 2. Embed every missing vector in one batched call (cached texts cost nothing)
+    if texts:
+        for i, vector in zip(texts, embed_texts(openai_client, list(texts.values()))):
+            vectors[i] = vector
+        stats["embedded"] = len(texts)
+
+    # 3. Run every kNN query in one msearch (after one count of the filter's matches)
+    num_candidates = num_candidates_for(top_k, *filter_selectivity(es, filters))
+    order = [i for i in range(len(seeds)) if i in vectors]
+    bodies = [
+        similar_query(vectors[i], top_k, results[i].get("source_id"), filters,
+                      descriptions[i] if hybrid else None, num_candidates)
+        for i in order
+    ]
+    for i, response in zip(order, multi_search(es, bodies, stats)):
+        if "error" in response:
+            results[i]["error"] = str(response["error"])
+            continue
+        results[i]["results"] = [hit_summary(hit, hybrid) for hit in response["hits"]["hits"]]
+    return results
+
+
+def run_batch(es: Elasticsearch, openai_client: OpenAI, path: str, top_k: int = 5,
+              filters: list[dict] = None, hybrid: bool = False):
+    """Stream batch results to stdout as NDJSON; the summary goes to stderr."""
+    start = datetime.now()
+    seeds = read_seeds(path)
+    stats = {"round_trips": 0, "embedded": 0}
+    for result in batch_similar(es, openai_client, seeds, top_k, stats, filters, hybrid):
+        print(json.dumps(result))
+    elapsed = (datetime.now() - start).total_seconds()
+    print(f"{len(seeds)} seeds in {stats['round_trips']} search round-trips, "
+          f"{stats['embedded']} texts embedded, {elapsed:.1f}s", file=sys.stderr)
+
+
+def display_results(source_lead: dict, similar_leads: list[dict], hybrid: bool = False):
     """Display similar leads in a formatted table."""
     print(f"\n{'=' * 70}")
     print(f"  SIMILAR LEADS TO: {source_lead.get('company_name', 'Query')}")
@@ -93,34 +344,72 @@ def display_results(source_lead: dict, similar_leads: list[dict]):
 
     for i, hit in enumerate(similar_leads, 1):
         lead = hit["_source"]
-        similarity = hit.get("_score", 0)
+        similarity = hit.get("_score") or 0
         tier = lead.get("score_tier", "Unscored")
         score = lead.get("score", "N/A")
 
         tier_marker = {"Hot": "🔥", "Warm": "🟡", "Cold": "🔵"}.get(tier, "⚪")
 
         print(f"  #{i} {tier_marker} {lead['company_name']}")
-        print(f"     Similarity: {similarity:.4f} | Score: {score}/100 ({tier})")
+        label = "RRF score" if hybrid else "Similarity"
+        print(f"     {label}: {similarity:.4f} | Score: {score}/100 ({tier})")
         print(f"     Industry: {lead.get('industry')} | Employees: {lead.get('employee_count')} | "
               f"Funding: {lead.get('funding_stage')}")
         print(f"     {lead.get('company_description', '')}")
         print(f"     Contact: {lead.get('full_name')} ({lead.get('job_title')}) — {lead.get('email')}")
+        reasoning = render_reasoning(lead)
+        if reasoning:
+            print("     " + reasoning.replace("\n", "\n     "))
         print()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Find leads similar to a company or description")
+    parser.add_argument("company", nargs="*", help="Company name to find lookalikes for")
+    parser.add_argument("--query", nargs="+", help="Find leads like a free-text description")
+    parser.add_argument("--batch", help="File of seeds (company names or 'query: ...' lines); NDJSON out")
+    parser.add_argument("--serve", nargs="?", type=int, const=0, metavar="PORT", help="Run the warm HTTP server")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--tier", action="append", help="Only return leads in this tier (repeatable)")
+    parser.add_argument("--industry", action="append", help="Only return leads in this industry (repeatable)")
+    parser.add_argument("--min-employees", type=int)
+    parser.add_argument("--max-employees", type=int)
+    parser.add_argument("--hybrid", action="store_true", help="Fuse kNN with BM25 on description/keywords (RRF)")
+    parser.add_argument("--adaptive-candidates", action="store_true",
+                        help="Scale num_candidates with filter selectivity (one extra count search)")
+    args = parser.parse_args()
+    filters = lead_filters(args.tier, args.industry, args.min_employees, args.max_employees)
+
+    if args.serve is not None:
+        # Imported here: the server module builds on this one
+        from similar_server import DEFAULT_PORT, serve
+        serve(port=args.serve or DEFAULT_PORT)
+        return
+
+    if args.batch:
+        # NDJSON on stdout — no banner
+        es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+        check_index_profile(es, INDEX_NAME)
+        run_batch(es, OpenAI(api_key=OPENAI_API_KEY), args.batch, args.top_k, filters, args.hybrid)
+        return
+
     print("=" * 60)
     print("  SalesForge Agent — Find Similar Leads")
     print("=" * 60)
 
     es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    # Query embeddings must match the stored vectors' size
+    check_index_profile(es, INDEX_NAME)
     openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
-    # Parse args
-    if len(sys.argv) < 2:
+    if not args.company and not args.query:
         print("\nUsage:")
         print("  python find_similar.py 'Company Name'         # Find leads like this company")
         print("  python find_similar.py --query 'AI SaaS for enterprise'  # Find by description")
+        print("  python find_similar.py --batch seeds.txt [--top-k 10]      # NDJSON for many seeds")
+        print("  python find_similar.py --serve [PORT]                      # Warm local HTTP server")
+        print("  Filters: --tier Hot --industry FinTech --min-employees 50 --max-employees 500 "
+              "[--hybrid] [--adaptive-candidates]")
         print()
         # Default: interactive mode - show all Hot leads and let user pick
         print("No company specified. Showing all Hot leads to choose from:\n")
@@ -131,7 +420,7 @@ def main():
                 "query": {"term": {"score_tier": "Hot"}},
                 "sort": [{"score": "desc"}],
                 "size": 20,
-                "_source": {"excludes": ["company_description_vector"]},
+                "_source": projection("display"),
             },
         )
 
@@ -143,15 +432,16 @@ def main():
         print(f"\nRun: python find_similar.py 'COMPANY_NAME'")
         return
 
-    if sys.argv[1] == "--query":
+    if args.query:
         # Search by description
-        query = " ".join(sys.argv[2:])
+        query = " ".join(args.query)
         print(f"\nSearching for leads similar to: '{query}'")
-        similar = find_similar_by_description(es, openai_client, query, top_k=5)
-        display_results({"company_name": f"Query: {query}", "company_description": query}, similar)
+        similar = find_similar_by_description(es, openai_client, query, args.top_k, filters, args.hybrid,
+                                              args.adaptive_candidates)
+        display_results({"company_name": f"Query: {query}", "company_description": query}, similar, args.hybrid)
     else:
         # Search by company name
-        company_name = " ".join(sys.argv[1:])
+        company_name = " ".join(args.company)
         print(f"\nLooking up: '{company_name}'...")
 
         source = find_by_company_name(es, company_name)
@@ -160,14 +450,16 @@ def main():
             return
 
         source_lead = source["_source"]
-        vector = source_lead.get("company_description_vector")
+        vector = unpack_vector(source_lead.get("company_description_vector"))
 
         if not vector:
             print("This lead has no vector embedding. Generating one...")
             vector = get_embedding(source_lead["company_description"], openai_client)
 
-        similar = find_similar_by_vector(es, vector, exclude_id=source["_id"], top_k=5)
-        display_results(source_lead, similar)
+        text = source_lead.get("company_description") if args.hybrid else None
+        similar = find_similar_by_vector(es, vector, exclude_id=source["_id"], top_k=args.top_k,
+                                         filters=filters, text=text, adaptive=args.adaptive_candidates)
+        display_results(source_lead, similar, args.hybrid)
 
 
 if __name__ == "__main__":
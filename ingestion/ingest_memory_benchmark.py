@@ -0,0 +1,91 @@
+"""
+SalesForge Agent — Ingest Memory Benchmark
+Client-side cost of carrying embeddings through seed_data.py / bulk_index.py.
+
+Compares, for the same synthetic leads and vectors (no API or cluster needed):
+
+  lists    each lead holds its vector as a Python list[float], serialized as a
+           JSON decimal array (the old ingestion path)
+  float32  each lead holds a row view of one contiguous float32 matrix,
+           serialized as a JSON array
+  base64   float32 rows, serialized as base64 big-endian float32 (what
+           BulkWriter sends to clusters that accept it)
+
+and reports peak traced memory while the vectors are attached and the bulk
+actions are serialized, plus the bulk request bytes per lead. "Held" is
+everything the attached vectors keep alive: the list objects, or the float32
+matrix (allocated under tracing, as embed_matrix allocates it) plus the row
+views.
+
+Usage:
+  python ingest_memory_benchmark.py --leads 5000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from bulk_writer import serialize_action
+from lead_identity import lead_id, upsert_action
+from seed_data import INDEX_NAME, generate_lead
+from vector_profile import VECTOR_DIMS, VECTOR_FIELD
+
+MODES = ["lists", "float32", "base64"]
+
+
+def run_mode(mode: str, leads: list[dict], matrix: np.ndarray) -> dict:
+    """Attach vectors and serialize every bulk action, tracing allocations."""
+    tracemalloc.start()
+    start = time.time()
+
+    if mode == "lists":
+        # What embed_texts used to hand back: one list of Python floats per lead
+        for lead, vector in zip(leads, matrix.tolist()):
+            lead[VECTOR_FIELD] = vector
+    else:
+        # What embed_matrix hands back: one contiguous buffer, a row view per lead
+        buffer = matrix.copy()
+        for lead, row in zip(leads, buffer):
+            lead[VECTOR_FIELD] = row
+    held, _ = tracemalloc.get_traced_memory()
+
+    encoding = "base64" if mode == "base64" else "json"
+    bulk_bytes = 0
+    for lead in leads:
+        action = upsert_action(INDEX_NAME, lead_id(lead), lead, False)
+        bulk_bytes += sum(len(line.encode()) + 1 for line in serialize_action(action, encoding))
+
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for lead in leads:
+        lead.pop(VECTOR_FIELD, None)
+    return {"mode": mode, "held": held, "peak": peak, "bulk_bytes": bulk_bytes, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client memory and bulk bytes per vector representation")
+    parser.add_argument("--leads", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=VECTOR_DIMS)
+    args = parser.parse_args()
+
+    print(f"Generating {args.leads} leads with {args.dims}-dim vectors...")
+    leads = [generate_lead() for _ in range(args.leads)]
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(args.leads, args.dims)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    print(f"  Float32 matrix: {matrix.nbytes / 1024 / 1024:.1f} MB ({matrix.nbytes / args.leads / 1024:.1f} KB/lead)\n")
+
+    print(f"  {'Mode':8s} {'Held':>10s} {'Peak':>10s} {'Held/lead':>10s} {'Bulk bytes':>12s} {'Bytes/lead':>11s} {'Time':>7s}")
+    for mode in MODES:
+        r = run_mode(mode, leads, matrix)
+        print(f"  {r['mode']:8s} {r['held'] / 1024 / 1024:7.1f} MB {r['peak'] / 1024 / 1024:7.1f} MB "
+              f"{r['held'] / args.leads / 1024:7.1f} KB {r['bulk_bytes'] / 1024 / 1024:9.1f} MB "
+              f"{r['bulk_bytes'] / args.leads:11.0f} {r['elapsed']:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+SalesForge Agent — Lead Identity
+Deterministic document IDs and content hashes for idempotent imports.
+
+A lead's _id is derived from its normalized email, or from company_domain +
+full_name when there is no email, so importing the same record twice lands
+on the same document. A content hash over the imported fields is stored with
+each lead; a re-import only writes leads whose hash changed and only embeds
+leads whose description changed.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+# Fields the pipeline derives itself — never part of a lead's content
+DERIVED_FIELDS = {
+    "company_description_vector", "content_hash", "created_at", "updated_at",
+    "score", "score_tier", "score_reasoning", "score_breakdown",
+    "score_points", "score_codes", "score_keywords", "score_fingerprint", "score_rubric_version", "score_rollup", "scored_at", "outreach_email", "agent_actions",
+}
+MGET_BATCH = 1000
+
+
+# --- Identity ---
+
+def normalize(value) -> str:
+    return " ".join(str(value or "").split()).lower()
+
+
+def lead_id(lead: dict) -> str | None:
+    """Stable _id for a lead, or None when it has no usable identity."""
+    email = normalize(lead.get("email"))
+    if email:
+        identity = f"email:{email}"
+    else:
+        domain = normalize(lead.get("company_domain"))
+        name = normalize(lead.get("full_name"))
+        if not (domain and name):
+            return None
+        identity = f"person:{domain}:{name}"
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def content_hash(lead: dict) -> str:
+    """Hash of everything the import supplies, ignoring pipeline-derived fields."""
+    content = {key: value for key, value in lead.items() if key not in DERIVED_FIELDS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def description_of(lead: dict) -> str:
+    return lead.get("company_description", lead.get("description", "")) or ""
+
+
+# --- Upsert Planning ---
+
+def plan_upserts(es: Elasticsearch, index: str, leads: list[dict]) -> dict:
+    """
+    Split a batch of leads against what is already indexed.
+
+    Returns {"write": [(doc_id, lead, exists)], "embed": [lead], "unchanged": n}.
+    Every lead gets its content_hash set. Leads in "embed" need a new vector;
+    changed leads whose description is unchanged keep the stored one.
+    """
+    # Last occurrence wins when a batch repeats a lead
+    by_id = {}
+    anonymous = []
+    for lead in leads:
+        lead["content_hash"] = content_hash(lead)
+        doc_id = lead_id(lead)
+        if doc_id:
+            by_id[doc_id] = lead
+        else:
+            anonymous.append(lead)
+
+    existing = {}
+    ids = list(by_id)
+    for i in range(0, len(ids), MGET_BATCH):
+        try:
+            response = es.mget(
+                index=index,
+                body={"ids": ids[i:i + MGET_BATCH]},
+                source=["content_hash", "company_description", "description"],
+            )
+        except NotFoundError:
+            # Index not created yet — everything is new
+            break
+        for doc in response["docs"]:
+            if doc.get("found"):
+                existing[doc["_id"]] = doc["_source"]
+
+    plan = {"write": [], "embed": [], "unchanged": 0}
+    for doc_id, lead in by_id.items():
+        stored = existing.get(doc_id)
+        if stored is not None and stored.get("content_hash") == lead["content_hash"]:
+            plan["unchanged"] += 1
+            continue
+        plan["write"].append((doc_id, lead, stored is not None))
+        if stored is None or description_of(stored) != description_of(lead):
+            plan["embed"].append(lead)
+
+    # No identity — nothing to match against, so always written with an auto id
+    for lead in anonymous:
+        plan["write"].append((None, lead, False))
+        plan["embed"].append(lead)
+    return plan
+
+
+def upsert_action(index: str, doc_id: str | None, lead: dict, exists: bool) -> dict:
+    """Bulk action that creates a new lead or updates only the imported fields of an existing one."""
+    # Stamped on every write so incremental scoring picks the change up
+    doc = {**lead, "updated_at": datetime.utcnow().isoformat()}
+    if doc_id is None:
+        return {"_index": index, "_source": doc}
+    if exists:
+        # Keep the original creation time and the scores the pipeline derived
+        for field in DERIVED_FIELDS - {"content_hash", "company_description_vector", "updated_at"}:
+            doc.pop(field, None)
+    return {"_op_type": "update", "_index": index, "_id": doc_id, "doc": doc, "doc_as_upsert": True}
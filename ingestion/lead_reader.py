@@ -0,0 +1,199 @@
+"""
+SalesForge Agent — Lead Reader
+Streams leads out of Elasticsearch in fixed-size pages using a point-in-time
+(PIT) snapshot and search_after, so memory stays flat however large the index gets.
+
+Progress is checkpointed to a small JSON file after every page (last sort key,
+PIT id and session id). A crashed run picks up from the last completed page
+instead of starting over.
+
+Readers ask for a named projection instead of the full _source. Only the
+"vector" projection includes the 1536-dimension embedding, which is most of a
+lead's bytes.
+"""
+
+import json
+import os
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+from rubric import SCORING_FIELDS
+
+PAGE_SIZE = 500
+PIT_KEEP_ALIVE = "5m"
+# _shard_doc is the cheapest tiebreaker available inside a PIT
+PIT_SORT = [{"_shard_doc": "asc"}]
+
+
+class PitExpired(Exception):
+    """A shared PIT expired under a reader that does not own it."""
+
+
+# --- Projections ---
+
+SCORE_FIELDS = [
+    "score", "score_tier", "score_points", "score_codes", "score_keywords",
+    "score_fingerprint", "score_rubric_version",
+]
+DISPLAY_FIELDS = [
+    "company_name", "industry", "employee_count", "funding_stage", "company_description",
+    "keywords", "full_name", "job_title", "email",
+] + SCORE_FIELDS
+OUTREACH_FIELDS = DISPLAY_FIELDS + [
+    "first_name", "last_name", "company_domain", "location", "annual_revenue",
+    "founded_year", "tech_stack", "outreach_email",
+]
+
+PROJECTIONS = {
+    # Rubric inputs, the stored score to compare against, the rollup cell it
+    # was counted in, and legacy verbose fields so a rescore can clear them
+    "scoring": ["company_name"] + SCORING_FIELDS + SCORE_FIELDS + ["score_rollup", "score_reasoning", "score_breakdown"],
+    "display": DISPLAY_FIELDS,
+    "outreach": OUTREACH_FIELDS,
+    "vector": DISPLAY_FIELDS + ["company_description_vector"],
+    "lookalike": ["company_name", "score_tier", "company_description_vector"],
+}
+
+
+def projection(name: str) -> dict:
+    """_source filter for one use case."""
+    return {"includes": PROJECTIONS[name]}
+
+
+def response_bytes(response) -> int:
+    """Size of a search response body, from Content-Length when the server sent one."""
+    meta = getattr(response, "meta", None)
+    length = meta.headers.get("content-length") if meta is not None else None
+    if length:
+        return int(length)
+    body = getattr(response, "body", response)
+    return len(json.dumps(body, separators=(",", ":")))
+
+
+# --- Checkpoints ---
+
+def load_checkpoint(path: str) -> dict | None:
+    """Load a saved checkpoint, or None if there is nothing to resume."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Atomically write the checkpoint so a crash never leaves half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path: str):
+    """Remove the checkpoint once a run has completed successfully."""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+# --- Streaming ---
+
+def open_pit(es: Elasticsearch, index: str, keep_alive: str = PIT_KEEP_ALIVE) -> str:
+    """Open a point-in-time snapshot over the index."""
+    return es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+
+
+def close_pit(es: Elasticsearch, pit_id: str):
+    """Release a point-in-time snapshot. Already-expired PITs are ignored."""
+    try:
+        es.close_point_in_time(body={"id": pit_id})
+    except NotFoundError:
+        pass
+
+
+def stream_leads(es: Elasticsearch, index: str, query: dict = None,
+                 page_size: int = PAGE_SIZE, source=True,
+                 checkpoint: dict = None, checkpoint_path: str = None,
+                 slice_spec: dict = None, keep_pit_open: bool = False,
+                 stats: dict = None):
+    """
+    Yield pages of hits from the index until it is exhausted.
+
+    `checkpoint` is updated in place after each page is consumed and written to
+    `checkpoint_path` if given. Pass a previously saved checkpoint to resume: its
+    PIT is reused while still alive. A _shard_doc sort key only means something
+    inside the PIT that produced it, so once the PIT has expired a fresh one is
+    opened and read from the beginning; checkpoint["restarts"] counts how often
+    that happened, so callers can reset any per-page totals.
+
+    `slice_spec` ({"id": i, "max": n}) restricts the stream to one partition of
+    the PIT, so n readers can share a snapshot. Set `keep_pit_open` when the PIT
+    is shared and its owner closes it; an expired shared PIT then raises
+    PitExpired instead of being replaced, so the owner can reopen one PIT for
+    every reader rather than each reading its own snapshot.
+
+    The PIT is closed once the stream runs to the end. A consumer that fails
+    or stops early leaves it open, so a resumed run can keep using the same
+    snapshot; one that does not mean to resume closes checkpoint["pit_id"].
+
+    Pass a projection() as `source` to fetch only the fields a use case needs.
+    If `stats` is given, stats["bytes"] accumulates the response bytes read.
+    """
+    checkpoint = checkpoint if checkpoint is not None else {}
+    pit_id = checkpoint.get("pit_id")
+    search_after = checkpoint.get("search_after")
+
+    if not pit_id:
+        pit_id = open_pit(es, index)
+        checkpoint["pit_id"] = pit_id
+
+    while True:
+        body = {
+            "query": query or {"match_all": {}},
+            "size": page_size,
+            "sort": PIT_SORT,
+            "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+            "_source": source,
+            "track_total_hits": False,
+        }
+        if search_after:
+            body["search_after"] = search_after
+        if slice_spec:
+            body["slice"] = slice_spec
+
+        try:
+            result = es.search(body=body)
+        except NotFoundError:
+            if keep_pit_open:
+                raise PitExpired(pit_id) from None
+            # PIT expired while we were down — its sort keys are meaningless in a new one
+            print("  Point-in-time expired, re-reading from the start of a new snapshot...")
+            pit_id = open_pit(es, index)
+            search_after = None
+            checkpoint["pit_id"] = pit_id
+            checkpoint["search_after"] = None
+            checkpoint["restarts"] = checkpoint.get("restarts", 0) + 1
+            continue
+
+        if stats is not None:
+            stats["bytes"] = stats.get("bytes", 0) + response_bytes(result)
+
+        # Every search may hand back a refreshed PIT id
+        pit_id = result.get("pit_id", pit_id)
+        checkpoint["pit_id"] = pit_id
+        hits = result["hits"]["hits"]
+        if not hits:
+            break
+
+        yield hits
+
+        # Only advance once the caller has finished with the page
+        search_after = hits[-1]["sort"]
+        checkpoint["search_after"] = search_after
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        if len(hits) < page_size:
+            break
+
+    # Only a stream read to the end closes its PIT; see the docstring
+    if not keep_pit_open:
+        close_pit(es, pit_id)
@@ -0,0 +1,319 @@
+"""
+SalesForge Agent — Pipeline Rollup
+A small materialized rollup of the scored pipeline, kept current by
+batch_score.py as it writes scores.
+
+The rollup index holds one cell per (industry, funding_stage, score_tier)
+with the lead count, score sum, min/max and a 1-point score histogram. Tier
+funnels, per-industry averages and industry × funding cross-tabs are sums
+over the cells, so they cost O(number of groups) however many leads there are.
+
+Each scored lead stores the key it was counted under in `score_rollup`. When
+a rescore moves a lead, its old cell is decremented and its new cell
+incremented in the same page's bulk request; cells that drop to zero are
+deleted. Leads deleted or re-imported outside scoring are not tracked —
+`python lead_rollup.py --rebuild` (or `batch_score.py --rebuild-rollup`)
+recomputes the rollup from the leads in one pass, overwriting the cells in
+place so readers never see an empty rollup.
+
+Usage:
+  python lead_rollup.py             # print the rollup
+  python lead_rollup.py --rebuild
+"""
+
+import argparse
+import hashlib
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch, helpers
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+INDEX_NAME = "leads-raw"
+ROLLUP_INDEX = "leads-rollup"
+
+ROLLUP_DIMENSIONS = ("industry", "funding_stage", "score_tier")
+UNKNOWN = "Unknown"
+RETRY_ON_CONFLICT = 10
+COMPOSITE_PAGE = 500
+
+ROLLUP_MAPPING = {
+    "mappings": {
+        "properties": {
+            "industry": {"type": "keyword"},
+            "funding_stage": {"type": "keyword"},
+            "score_tier": {"type": "keyword"},
+            "count": {"type": "long"},
+            "score_sum": {"type": "double"},
+            "score_min": {"type": "float"},
+            "score_max": {"type": "float"},
+            # score -> lead count; read by Python, not searchable
+            "score_hist": {"type": "object", "enabled": False},
+            "updated_at": {"type": "date"},
+        }
+    }
+}
+
+# Apply one cell's delta, creating the cell on first use and deleting it once
+# its last lead has moved out. min/max follow from the histogram.
+PAINLESS_DELTA = """
+Map s = ctx._source;
+if (ctx.op == 'create') {
+  s.putAll(params.key);
+  s.count = 0L;
+  s.score_sum = 0.0;
+  s.score_hist = new HashMap();
+}
+s.count += params.count;
+s.score_sum += params.score_sum;
+for (def bin : params.hist.entrySet()) {
+  long n = s.score_hist.containsKey(bin.getKey()) ? ((Number) s.score_hist[bin.getKey()]).longValue() : 0L;
+  n += ((Number) bin.getValue()).longValue();
+  if (n > 0) { s.score_hist[bin.getKey()] = n; } else { s.score_hist.remove(bin.getKey()); }
+}
+if (s.count <= 0) {
+  ctx.op = ctx.op == 'create' ? 'none' : 'delete';
+} else {
+  int lo = Integer.MAX_VALUE;
+  int hi = Integer.MIN_VALUE;
+  for (def bin : s.score_hist.keySet()) {
+    int v = Integer.parseInt(bin);
+    lo = Math.min(lo, v);
+    hi = Math.max(hi, v);
+  }
+  s.score_min = lo;
+  s.score_max = hi;
+  s.updated_at = params.now;
+}
+"""
+
+
+# --- Keys ---
+
+def rollup_key(lead: dict, result: dict) -> dict:
+    """The cell a scored lead counts toward, plus its score — stored on the lead as score_rollup."""
+    return {
+        "industry": lead.get("industry") or UNKNOWN,
+        "funding_stage": lead.get("funding_stage") or UNKNOWN,
+        "score_tier": result["score_tier"],
+        "score": int(result["score"]),
+    }
+
+
+def cell_id(key: dict) -> str:
+    return hashlib.sha1("\x1f".join(str(key[d]) for d in ROLLUP_DIMENSIONS).encode()).hexdigest()
+
+
+# --- Deltas ---
+
+class RollupDeltas:
+    """Net per-cell changes for a batch of rescored leads."""
+
+    def __init__(self):
+        self.cells = {}
+
+    def add(self, key: dict, sign: int, leads: int = 1):
+        cell = self.cells.setdefault(cell_id(key), {
+            "key": {d: key[d] for d in ROLLUP_DIMENSIONS}, "count": 0, "score_sum": 0.0, "hist": {},
+        })
+        score = int(key["score"])
+        cell["count"] += sign * leads
+        cell["score_sum"] += sign * leads * score
+        cell["hist"][str(score)] = cell["hist"].get(str(score), 0) + sign * leads
+
+    def move(self, old: dict | None, new: dict):
+        """A lead counted under `old` (None if never counted) now counts under `new`."""
+        if old == new:
+            return
+        if old:
+            self.add(old, -1)
+        self.add(new, +1)
+
+    def actions(self, index: str = ROLLUP_INDEX) -> list[dict]:
+        """Scripted-upsert bulk actions for every cell with a non-zero delta."""
+        now = datetime.utcnow().isoformat()
+        actions = []
+        for doc_id, cell in self.cells.items():
+            hist = {score: n for score, n in cell["hist"].items() if n}
+            if not cell["count"] and not hist:
+                continue
+            actions.append({
+                "_op_type": "update",
+                "_index": index,
+                "_id": doc_id,
+                "retry_on_conflict": RETRY_ON_CONFLICT,
+                "scripted_upsert": True,
+                "upsert": {},
+                "script": {
+                    "source": PAINLESS_DELTA,
+                    "params": {"key": cell["key"], "count": cell["count"], "score_sum": cell["score_sum"],
+                               "hist": hist, "now": now},
+                },
+            })
+        return actions
+
+
+def apply_deltas(es: Elasticsearch, deltas: RollupDeltas, index: str = ROLLUP_INDEX) -> int:
+    """Write the deltas in one bulk request. Returns the number of cells that failed."""
+    actions = deltas.actions(index)
+    if not actions:
+        return 0
+    ensure_rollup_index(es, index)
+    _, errors = helpers.bulk(es, actions, raise_on_error=False)
+    return len(errors)
+
+
+# --- Index ---
+
+def ensure_rollup_index(es: Elasticsearch, index: str = ROLLUP_INDEX):
+    if not es.indices.exists(index=index):
+        es.indices.create(index=index, body=ROLLUP_MAPPING)
+
+
+def reset_rollup(es: Elasticsearch, index: str = ROLLUP_INDEX):
+    """Start from an empty rollup, e.g. when the leads index is recreated."""
+    if es.indices.exists(index=index):
+        es.indices.delete(index=index)
+    es.indices.create(index=index, body=ROLLUP_MAPPING)
+
+
+def cell_versions(es: Elasticsearch, index: str = ROLLUP_INDEX) -> dict[str, tuple[int, int]]:
+    """cell id -> (seq_no, primary_term) for every cell currently in the rollup."""
+    ensure_rollup_index(es, index)
+    hits = helpers.scan(es, index=index, query={"query": {"match_all": {}}, "_source": False,
+                                                "seq_no_primary_term": True})
+    return {hit["_id"]: (hit["_seq_no"], hit["_primary_term"]) for hit in hits}
+
+
+def rebuild_rollup(es: Elasticsearch, source_index: str = INDEX_NAME, index: str = ROLLUP_INDEX) -> int:
+    """
+    Recompute every cell from the score_rollup keys stored on the leads, with a
+    composite aggregation and a score histogram per cell. Returns the cell count.
+
+    The rollup stays readable throughout: rebuilt cells overwrite the live ones
+    and cells no lead counts toward any more are deleted afterwards. Every write
+    is conditional on the cell's version from before the aggregation, so a cell
+    a concurrent scoring delta touched meanwhile keeps that delta instead.
+    """
+    versions = cell_versions(es, index)
+    # Deltas already applied must be visible to the aggregation
+    es.indices.refresh(index=source_index)
+    sources = [{d: {"terms": {"field": f"score_rollup.{d}"}}} for d in ROLLUP_DIMENSIONS]
+    aggs = {
+        "score_sum": {"sum": {"field": "score_rollup.score"}},
+        "hist": {"histogram": {"field": "score_rollup.score", "interval": 1, "min_doc_count": 1}},
+    }
+    now = datetime.utcnow().isoformat()
+    docs = []
+    after = None
+    while True:
+        composite = {"size": COMPOSITE_PAGE, "sources": sources}
+        if after:
+            composite["after"] = after
+        response = es.search(index=source_index, body={
+            "size": 0, "aggs": {"cells": {"composite": composite, "aggs": aggs}},
+        })
+        cells = response["aggregations"]["cells"]
+        for bucket in cells["buckets"]:
+            hist = {str(int(b["key"])): b["doc_count"] for b in bucket["hist"]["buckets"]}
+            scores = [int(score) for score in hist]
+            doc_id = cell_id(bucket["key"])
+            version = versions.pop(doc_id, None)
+            docs.append({
+                "_index": index,
+                "_id": doc_id,
+                **({"_op_type": "index", "if_seq_no": version[0], "if_primary_term": version[1]}
+                   if version else {"_op_type": "create"}),
+                "_source": {
+                    **bucket["key"],
+                    "count": bucket["doc_count"],
+                    "score_sum": bucket["score_sum"]["value"],
+                    "score_min": min(scores),
+                    "score_max": max(scores),
+                    "score_hist": hist,
+                    "updated_at": now,
+                },
+            })
+        after = cells.get("after_key")
+        if not after or not cells["buckets"]:
+            break
+
+    # Whatever is left in `versions` no longer has any leads
+    stale = [
+        {"_op_type": "delete", "_index": index, "_id": doc_id, "if_seq_no": seq_no, "if_primary_term": term}
+        for doc_id, (seq_no, term) in versions.items()
+    ]
+    _, errors = helpers.bulk(es, docs + stale, refresh=True, raise_on_error=False)
+    failed = [e for e in errors if next(iter(e.values())).get("status") != 409]
+    if failed:
+        raise helpers.BulkIndexError(f"{len(failed)} rollup cell(s) failed to rebuild", failed)
+    return len(docs)
+
+
+# --- Reading ---
+
+def rollup_cells(es: Elasticsearch, index: str = ROLLUP_INDEX) -> list[dict]:
+    """Every cell of the rollup (a few hundred at most)."""
+    return [hit["_source"] for hit in helpers.scan(es, index=index, query={"query": {"match_all": {}}})]
+
+
+def score_histogram(cells: list[dict]) -> dict[int, int]:
+    """score -> lead count over the given cells."""
+    hist = {}
+    for cell in cells:
+        for score, n in cell.get("score_hist", {}).items():
+            hist[int(score)] = hist.get(int(score), 0) + n
+    return dict(sorted(hist.items()))
+
+
+def histogram_stats(hist: dict[int, int]) -> dict | None:
+    """min/max/avg/median score of a histogram, as the STATS over leads-raw would give."""
+    total = sum(hist.values())
+    if not total:
+        return None
+    scores = list(hist)
+    seen, below, above = 0, None, None
+    for score, n in hist.items():
+        if below is None and seen + n > (total - 1) // 2:
+            below = score
+        if above is None and seen + n > total // 2:
+            above = score
+        seen += n
+    return {
+        "min_score": scores[0],
+        "max_score": scores[-1],
+        "avg_score": round(sum(score * n for score, n in hist.items()) / total, 2),
+        "median_score": (below + above) / 2,
+        "count": total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the pipeline rollup")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollup from leads-raw")
+    args = parser.parse_args()
+
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    if args.rebuild:
+        print(f"Rebuilt '{ROLLUP_INDEX}': {rebuild_rollup(es)} cells")
+
+    ensure_rollup_index(es)
+    cells = rollup_cells(es)
+    tiers = {}
+    for cell in cells:
+        tiers[cell["score_tier"]] = tiers.get(cell["score_tier"], 0) + cell["count"]
+    print(f"{len(cells)} cells, {sum(tiers.values())} leads")
+    for tier in ("Hot", "Warm", "Cold"):
+        print(f"  {tier:5s} {tiers.get(tier, 0):8d}")
+    stats = histogram_stats(score_histogram(cells))
+    if stats:
+        print(f"  Score min {stats['min_score']}, max {stats['max_score']}, "
+              f"avg {stats['avg_score']}, median {stats['median_score']}")
+
+
+if __name__ == "__main__":
+    main()
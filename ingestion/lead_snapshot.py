@@ -0,0 +1,419 @@
+"""
+SalesForge Agent — Lead Snapshot
+Columnar offline copy of leads-raw for analysis that should not touch the cluster.
+
+  export  Stream every lead once (PIT + search_after) into a Parquet file, or
+          an Arrow IPC file with --format arrow, written in row groups. The
+          description vectors go into a separate float32 .npy block whose row
+          i belongs to table row i (has_vector marks rows without one), so
+          they can be memory-mapped without loading the table.
+  report  The pipeline_analytics.py funnel, industry, funding and score reports
+          computed locally with vectorized group-bys over dictionary-encoded
+          columns. --rescore also scores the snapshot with the current
+          rubric.py and shows how tiers would move (what-if rubric changes).
+
+Usage:
+  python lead_snapshot.py export
+  python lead_snapshot.py export --format arrow --dir /data/snapshots/2026-10-17
+  python lead_snapshot.py report
+  python lead_snapshot.py report --rescore
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+from analytics_runner import print_latency, print_result
+from lead_reader import close_pit, stream_leads
+from vector_profile import VECTOR_DIMS, VECTOR_FIELD, check_index_profile, unpack_vector
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+INDEX_NAME = "leads-raw"
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), ".snapshot")
+TABLE_FILES = {"parquet": "leads.parquet", "arrow": "leads.arrow"}
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+ROW_GROUP_SIZE = 100_000
+RESCORE_CHUNK = 20_000
+# Rows an ES|QL query returns without an explicit LIMIT
+ESQL_ROW_LIMIT = 1000
+
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("company_name", pa.string()),
+    ("full_name", pa.string()),
+    ("job_title", pa.string()),
+    ("email", pa.string()),
+    ("company_domain", pa.string()),
+    ("industry", pa.string()),
+    ("funding_stage", pa.string()),
+    ("employee_count", pa.int32()),
+    ("annual_revenue", pa.string()),
+    ("founded_year", pa.int32()),
+    ("location", pa.string()),
+    ("tech_stack", pa.list_(pa.string())),
+    ("company_description", pa.string()),
+    ("keywords", pa.string()),
+    ("score", pa.float32()),
+    ("score_tier", pa.string()),
+    ("score_rubric_version", pa.string()),
+    ("has_outreach", pa.bool_()),
+    ("has_vector", pa.bool_()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+])
+SOURCE_FIELDS = [f.name for f in SCHEMA if f.name not in ("id", "has_outreach", "has_vector")] + [
+    "outreach_email", VECTOR_FIELD,
+]
+UNSCORED = "Unscored"
+UNKNOWN = "Unknown"
+
+
+# --- Export ---
+
+def parse_time(value) -> datetime | None:
+    """An ISO date from _source as naive UTC, the way the pipeline writes it."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def snapshot_row(hit: dict) -> dict:
+    """One lead as a table row (the vector is written separately)."""
+    lead = hit["_source"]
+    row = {name: lead.get(name) for name in SCHEMA.names if name in lead}
+    row["id"] = hit["_id"]
+    tech = lead.get("tech_stack")
+    row["tech_stack"] = [tech] if isinstance(tech, str) else tech
+    row["has_outreach"] = bool(lead.get("outreach_email"))
+    row["has_vector"] = lead.get(VECTOR_FIELD) is not None
+    row["created_at"] = parse_time(lead.get("created_at"))
+    row["updated_at"] = parse_time(lead.get("updated_at"))
+    return row
+
+
+class TableWriter:
+    """Parquet or Arrow IPC file written one row group at a time."""
+
+    def __init__(self, path: str, fmt: str):
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, SCHEMA, compression="zstd")
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, SCHEMA)
+        self.fmt = fmt
+
+    def write(self, rows: list[dict]):
+        batch = pa.RecordBatch.from_pylist(rows, schema=SCHEMA)
+        if self.fmt == "parquet":
+            self._writer.write_batch(batch, row_group_size=len(rows))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        if self.fmt == "arrow":
+            self._sink.close()
+
+
+def export_snapshot(es: Elasticsearch, directory: str = SNAPSHOT_DIR, fmt: str = "parquet",
+                    row_group_size: int = ROW_GROUP_SIZE) -> dict:
+    """Write the table, vector block and manifest. Returns the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    check_index_profile(es, INDEX_NAME)
+    total = es.count(index=INDEX_NAME)["count"]
+    vectors = np.lib.format.open_memmap(os.path.join(directory, VECTORS_FILE), mode="w+",
+                                        dtype=np.float32, shape=(total, VECTOR_DIMS))
+    writer = TableWriter(os.path.join(directory, TABLE_FILES[fmt]), fmt)
+    stats = {"bytes": 0}
+    reader = {}
+    rows, row = [], 0
+    started = time.time()
+
+    try:
+        for hits in stream_leads(es, INDEX_NAME, source={"includes": SOURCE_FIELDS},
+                                 checkpoint=reader, stats=stats):
+            # Leads indexed after the count was taken are left for the next export
+            for hit in hits[:total - row]:
+                rows.append(snapshot_row(hit))
+                vector = unpack_vector(hit["_source"].get(VECTOR_FIELD))
+                if vector is not None:
+                    vectors[row] = vector
+                row += 1
+            if len(rows) >= row_group_size:
+                writer.write(rows)
+                rows = []
+            if row >= total:
+                # Stopping early: only a stream read to the end closes its PIT
+                close_pit(es, reader["pit_id"])
+                break
+        if rows:
+            writer.write(rows)
+    finally:
+        writer.close()
+        vectors.flush()
+
+    manifest = {
+        "index": INDEX_NAME,
+        "exported_at": datetime.utcnow().isoformat(),
+        "format": fmt,
+        "table": TABLE_FILES[fmt],
+        "rows": row,
+        "vectors": VECTORS_FILE,
+        "vector_dims": VECTOR_DIMS,
+        "bytes_read": stats["bytes"],
+        "seconds": round(time.time() - started, 1),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# --- Loading ---
+
+def load_manifest(directory: str = SNAPSHOT_DIR) -> dict:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise SystemExit(f"No snapshot in {directory} — run `python lead_snapshot.py export` first")
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_table(directory: str = SNAPSHOT_DIR, columns: list[str] = None) -> pa.Table:
+    """The snapshot table (only `columns` if given), memory-mapped where the format allows."""
+    manifest = load_manifest(directory)
+    path = os.path.join(directory, manifest["table"])
+    if manifest["format"] == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.select(columns) if columns else table
+
+
+def load_vectors(directory: str = SNAPSHOT_DIR) -> np.ndarray:
+    """Read-only float32 memmap, row-aligned with the table."""
+    manifest = load_manifest(directory)
+    vectors = np.load(os.path.join(directory, manifest["vectors"]), mmap_mode="r")
+    return vectors[:manifest["rows"]]
+
+
+# --- Group-Bys ---
+
+def codes(column: pa.ChunkedArray, missing: str = UNKNOWN) -> tuple[list[str], np.ndarray]:
+    """Dictionary-encode a string column: (labels, int code per row), nulls as `missing`."""
+    encoded = pc.fill_null(column, missing).combine_chunks().dictionary_encode()
+    return encoded.dictionary.to_pylist(), encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+
+
+def group_by(table: pa.Table, keys: list[str], mask: np.ndarray = None) -> tuple[list[tuple], np.ndarray]:
+    """
+    Group rows by the string columns `keys`: (group key tuples, group number
+    per row). Rows outside `mask` get group -1.
+    """
+    labels, combined = [], np.zeros(table.num_rows, dtype=np.int64)
+    for key in keys:
+        names, code = codes(table[key], UNSCORED if key == "score_tier" else UNKNOWN)
+        labels.append(names)
+        combined = combined * max(len(names), 1) + code
+    if mask is not None:
+        combined = combined[mask]
+    unique, inverse = np.unique(combined, return_inverse=True)
+
+    groups = []
+    for value in unique.tolist():
+        parts = []
+        for names in reversed(labels):
+            value, code = divmod(value, max(len(names), 1))
+            parts.append(names[code])
+        groups.append(tuple(reversed(parts)))
+
+    if mask is not None:
+        full = np.full(table.num_rows, -1, dtype=np.int64)
+        full[mask] = inverse
+        inverse = full
+    return groups, inverse
+
+
+def group_stats(groups: list[tuple], inverse: np.ndarray, values: np.ndarray) -> list[dict]:
+    """count, and sum/avg/min/max of the non-NaN values, per group."""
+    n = len(groups)
+    member = inverse >= 0
+    valid = member & ~np.isnan(values)
+    count = np.bincount(inverse[member], minlength=n)
+    scored = np.bincount(inverse[valid], minlength=n)
+    total = np.bincount(inverse[valid], weights=values[valid], minlength=n)
+
+    low, high = np.full(n, np.nan), np.full(n, np.nan)
+    if valid.any():
+        order = np.argsort(inverse[valid], kind="stable")
+        sorted_groups = inverse[valid][order]
+        sorted_values = values[valid][order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        present = sorted_groups[starts]
+        low[present] = np.minimum.reduceat(sorted_values, starts)
+        high[present] = np.maximum.reduceat(sorted_values, starts)
+
+    return [
+        {
+            "key": key,
+            "count": int(count[g]),
+            "sum": float(total[g]),
+            "avg": round(float(total[g] / scored[g]), 2) if scored[g] else None,
+            "min": None if np.isnan(low[g]) else float(low[g]),
+            "max": None if np.isnan(high[g]) else float(high[g]),
+        }
+        for g, key in enumerate(groups)
+    ]
+
+
+# --- Reports ---
+
+def report(label: str, description: str, compute) -> dict:
+    """Run one local report into the outcome shape analytics_runner prints."""
+    start = time.perf_counter()
+    columns, values = compute()
+    return {"label": label, "query": f"snapshot: {description}", "cached": False, "source": "local",
+            "ms": (time.perf_counter() - start) * 1000,
+            "result": {"columns": [{"name": c} for c in columns], "values": values}}
+
+
+def pipeline_reports(table: pa.Table) -> list[dict]:
+    """The pipeline_analytics.py reports over a snapshot table."""
+    score = table["score"].to_numpy().astype(np.float64)
+    tier = table["score_tier"]
+    hot = pc.fill_null(pc.equal(tier, "Hot"), False).to_numpy(zero_copy_only=False)
+
+    def funnel():
+        rows = group_stats(*group_by(table, ["score_tier"]), score)
+        return ["count", "score_tier"], [[r["count"], r["key"][0]] for r in sorted(rows, key=lambda r: -r["count"])]
+
+    def industries():
+        rows = group_stats(*group_by(table, ["industry"]), score)
+        rows.sort(key=lambda r: -1 if r["avg"] is None else r["avg"], reverse=True)
+        return (["avg_score", "count", "min_score", "max_score", "industry"],
+                [[r["avg"], r["count"], r["min"], r["max"], r["key"][0]] for r in rows])
+
+    def hot_by(keys: list[str]):
+        def compute():
+            rows = group_stats(*group_by(table, keys, mask=hot), score)
+            rows.sort(key=lambda r: -r["count"])
+            return ["count"] + keys, [[r["count"], *r["key"]] for r in rows]
+        return compute
+
+    def top_leads():
+        order = np.argsort(-np.nan_to_num(score, nan=-np.inf), kind="stable")[:10]
+        columns = ["company_name", "industry", "score", "score_tier", "employee_count", "funding_stage"]
+        picked = table.select(columns).take(pa.array(order))
+        return columns, [list(row.values()) for row in picked.to_pylist()]
+
+    def statistics():
+        scored = score[~np.isnan(score)]
+        if not scored.size:
+            return ["min_score", "max_score", "avg_score", "median_score"], []
+        return (["min_score", "max_score", "avg_score", "median_score"],
+                [[float(scored.min()), float(scored.max()), round(float(scored.mean()), 2), float(np.median(scored))]])
+
+    def outreach_queue():
+        rows = np.flatnonzero(hot)
+        rows = rows[np.argsort(-score[rows], kind="stable")][:ESQL_ROW_LIMIT]
+        columns = ["company_name", "full_name", "job_title", "email", "score", "industry"]
+        return columns, [list(row.values()) for row in table.select(columns).take(pa.array(rows)).to_pylist()]
+
+    return [
+        report("📊 PIPELINE FUNNEL — Lead Distribution by Tier", "group by score_tier", funnel),
+        report("🏢 INDUSTRY INTELLIGENCE — Average Score by Industry", "group by industry", industries),
+        report("🔥 HOT LEADS — Distribution by Funding Stage", "Hot, group by funding_stage", hot_by(["funding_stage"])),
+        report("🏆 TOP 10 — Highest Scoring Leads", "top 10 by score", top_leads),
+        report("📈 SCORE DISTRIBUTION — Statistical Summary", "score statistics", statistics),
+        report("📧 OUTREACH QUEUE — Hot Leads Ready for Contact", "Hot, by score", outreach_queue),
+        report("🔀 CROSS-TAB — Hot Leads by Industry × Funding", "Hot, group by industry, funding_stage",
+               hot_by(["industry", "funding_stage"])),
+    ]
+
+
+def rescore_report(table: pa.Table) -> dict:
+    """Score the snapshot with the current rubric.py: stored tier × new tier counts."""
+    from columnar_scoring import description_features, score_columns
+
+    def compute():
+        stored_names, stored = codes(table["score_tier"], UNSCORED)
+        new = np.empty(table.num_rows, dtype=object)
+        for start in range(0, table.num_rows, RESCORE_CHUNK):
+            chunk = table.slice(start, RESCORE_CHUNK)
+            column = {name: chunk[name].to_pylist() for name in
+                      ("employee_count", "funding_stage", "industry", "company_description", "keywords")}
+            features = description_features([d or "" for d in column["company_description"]],
+                                            [k or "" for k in column["keywords"]])
+            scores = score_columns([c or 0 for c in column["employee_count"]],
+                                   [f or "Unknown" for f in column["funding_stage"]],
+                                   [i or "" for i in column["industry"]], features)
+            new[start:start + chunk.num_rows] = scores.tier
+        transitions = {}
+        for old_code, new_tier in zip(stored.tolist(), new.tolist()):
+            key = (stored_names[old_code], new_tier)
+            transitions[key] = transitions.get(key, 0) + 1
+        values = [[old, new_tier, n, "" if old == new_tier else "moved"]
+                  for (old, new_tier), n in sorted(transitions.items(), key=lambda item: -item[1])]
+        return ["stored_tier", "rubric_tier", "count", "change"], values
+
+    return report("🔁 WHAT-IF — Stored Tier vs Current rubric.py", "rescore with rubric.py", compute)
+
+
+REPORT_COLUMNS = [
+    "company_name", "full_name", "job_title", "email", "industry", "funding_stage",
+    "employee_count", "score", "score_tier",
+]
+RESCORE_COLUMNS = ["company_description", "keywords"]
+
+
+def run_reports(directory: str = SNAPSHOT_DIR, rescore: bool = False) -> tuple[dict, list[dict], float]:
+    """(manifest, report outcomes, wall seconds including the table load)."""
+    manifest = load_manifest(directory)
+    start = time.perf_counter()
+    table = load_table(directory, REPORT_COLUMNS + (RESCORE_COLUMNS if rescore else []))
+    outcomes = pipeline_reports(table)
+    if rescore:
+        outcomes.append(rescore_report(table))
+    return manifest, outcomes, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar lead snapshot for offline analytics")
+    parser.add_argument("command", choices=["export", "report"])
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot directory")
+    parser.add_argument("--format", choices=list(TABLE_FILES), default="parquet", help="Table format (export)")
+    parser.add_argument("--row-group", type=int, default=ROW_GROUP_SIZE, help="Rows per row group (export)")
+    parser.add_argument("--rescore", action="store_true", help="Also rescore with the current rubric (report)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+        manifest = export_snapshot(es, args.dir, args.format, args.row_group)
+        print(f"Exported {manifest['rows']} leads to {os.path.join(args.dir, manifest['table'])} "
+              f"+ {manifest['vectors']} ({manifest['vector_dims']} dims) in {manifest['seconds']}s")
+        return
+
+    manifest, outcomes, wall = run_reports(args.dir, args.rescore)
+    print(f"Snapshot of '{manifest['index']}' from {manifest['exported_at']} — {manifest['rows']} leads")
+    for outcome in outcomes:
+        print_result(outcome)
+    print_latency(outcomes, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+SalesForge Agent — Lookalike Index
+Offline batch lookalike search without one Elasticsearch round-trip per seed.
+
+  export  Stream every description vector into a memory-mapped float32 matrix
+          (rows L2-normalized, so a dot product is cosine similarity) with an
+          ID table of lead id, company name and tier.
+  build   Build an IVF index over the matrix: k-means centroids plus one
+          inverted list of row numbers per centroid.
+  query   Top-k lookalikes for a file of seeds (lead ids or company names),
+          answered with vectorized NumPy, excluding the seed itself and
+          optionally restricted to some tiers. Results stream out as NDJSON.
+  bench   Recall@k and latency of the IVF index against exact brute force.
+
+Usage:
+  python lookalike_index.py export
+  python lookalike_index.py build --nlist 256
+  python lookalike_index.py query --seeds seeds.txt --k 10 --tier Hot --tier Warm
+  python lookalike_index.py bench --queries 1000 --k 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+from lead_reader import close_pit, projection, stream_leads
+from vector_profile import unpack_vector
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+INDEX_NAME = "leads-raw"
+VECTOR_FIELD = "company_description_vector"
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), ".lookalike")
+VECTORS_FILE = "vectors.npy"
+TABLE_FILE = "table.json"
+IVF_FILE = "ivf.npz"
+
+# Rows scored per block in brute-force search; bounds the (queries x rows) matrix
+QUERY_BLOCK = 256
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE = 100_000
+
+
+# --- Export ---
+
+def export_vectors(es: Elasticsearch, directory: str = INDEX_DIR) -> int:
+    """Write every lead vector to a float32 memmap plus an ID table. Returns the row count."""
+    os.makedirs(directory, exist_ok=True)
+    query = {"exists": {"field": VECTOR_FIELD}}
+    total = es.count(index=INDEX_NAME, body={"query": query})["count"]
+
+    vectors = None
+    table = {"ids": [], "names": [], "tiers": []}
+    reader = {}
+    row = 0
+
+    for hits in stream_leads(es, INDEX_NAME, query=query, source=projection("lookalike"), checkpoint=reader):
+        # Leads indexed after the count was taken are left for the next export
+        for hit in hits[:total - row]:
+            lead = hit["_source"]
+            vector = np.asarray(unpack_vector(lead[VECTOR_FIELD]), dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(directory, VECTORS_FILE), mode="w+",
+                    dtype=np.float32, shape=(total, vector.shape[0]))
+            norm = np.linalg.norm(vector)
+            vectors[row] = vector / norm if norm else vector
+            table["ids"].append(hit["_id"])
+            table["names"].append(lead.get("company_name", ""))
+            table["tiers"].append(lead.get("score_tier") or "Unscored")
+            row += 1
+        if row >= total:
+            # Stopping early: only a stream read to the end closes its PIT
+            close_pit(es, reader["pit_id"])
+            break
+
+    if vectors is None:
+        return 0
+    vectors.flush()
+    table["rows"] = row
+    with open(os.path.join(directory, TABLE_FILE), "w") as f:
+        json.dump(table, f)
+    return row
+
+
+def load_vectors(directory: str = INDEX_DIR) -> tuple[np.ndarray, dict]:
+    """Open the exported matrix read-only (memory-mapped) with its ID table."""
+    with open(os.path.join(directory, TABLE_FILE)) as f:
+        table = json.load(f)
+    vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+    return vectors[:table["rows"]], table
+
+
+# --- Exact Search ---
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Best k columns per row of a score matrix, sorted by descending score."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def brute_force_search(vectors: np.ndarray, queries: np.ndarray, k: int,
+                       allowed: np.ndarray = None, exclude: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k by cosine similarity.
+
+    `allowed` is a boolean row mask (tier filter); `exclude` gives one row per
+    query to drop (the seed itself), or -1. Like IVFIndex.search, slots with no
+    eligible row (fewer than k) are padded with id -1 and similarity -inf.
+    """
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    for start in range(0, len(queries), QUERY_BLOCK):
+        block = queries[start:start + QUERY_BLOCK]
+        scores = block @ vectors.T
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        if exclude is not None:
+            rows = np.arange(len(block))
+            seeds = exclude[start:start + QUERY_BLOCK]
+            scores[rows[seeds >= 0], seeds[seeds >= 0]] = -np.inf
+        block_ids, block_sims = top_k(scores, k)
+        block_ids[np.isneginf(block_sims)] = -1
+        width = block_ids.shape[1]
+        ids[start:start + len(block), :width] = block_ids
+        sims[start:start + len(block), :width] = block_sims
+    return ids, sims
+
+
+# --- IVF Index ---
+
+class IVFIndex:
+    """Inverted-file ANN index: search only the lists of the nprobe nearest centroids."""
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        self.centroids = centroids
+        # Rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS,
+              seed: int = 0) -> "IVFIndex":
+        """Spherical k-means on a sample, then assign every row to its nearest centroid."""
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist, len(vectors))
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = cls._nearest(sample, centroids)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+
+        assign = cls._nearest(vectors, centroids)
+        list_rows = np.argsort(assign, kind="stable")
+        list_offsets = np.searchsorted(assign[list_rows], np.arange(nlist + 1))
+        return cls(centroids, list_offsets, list_rows)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 4096):
+            assign[start:start + 4096] = np.argmax(vectors[start:start + 4096] @ centroids.T, axis=1)
+        return assign
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path)
+        return cls(data["centroids"], data["list_offsets"], data["list_rows"])
+
+    def search(self, vectors: np.ndarray, queries: np.ndarray, k: int, nprobe: int = 8,
+               allowed: np.ndarray = None, exclude: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k. Work is grouped by inverted list: every list is scored
+        once against all the queries that probe it, as one matrix product.
+        """
+        n = len(queries)
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        best_ids = np.full((n, k), -1, dtype=np.int64)
+        best_sims = np.full((n, k), -np.inf, dtype=np.float32)
+
+        for lst in np.unique(probes):
+            rows = self.list_rows[self.list_offsets[lst]:self.list_offsets[lst + 1]]
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if not len(rows):
+                continue
+            q = np.nonzero((probes == lst).any(axis=1))[0]
+            scores = queries[q] @ vectors[rows].T
+            if exclude is not None:
+                hit = rows[None, :] == exclude[q][:, None]
+                scores[hit] = -np.inf
+
+            # Merge this list's candidates into the running top-k of each query
+            cand_ids = np.concatenate([best_ids[q], np.broadcast_to(rows, (len(q), len(rows)))], axis=1)
+            cand_sims = np.concatenate([best_sims[q], scores], axis=1)
+            order, sims = top_k(cand_sims, k)
+            best_ids[q] = np.take_along_axis(cand_ids, order, axis=1)
+            best_sims[q] = sims
+
+        return best_ids, best_sims
+
+
+# --- Seeds & Filters ---
+
+def resolve_seeds(table: dict, seeds: list[str]) -> list[int]:
+    """Rows for seeds given as lead ids or (case-insensitive) company names; -1 if unknown."""
+    by_id = {doc_id: row for row, doc_id in enumerate(table["ids"])}
+    by_name = {}
+    for row, name in enumerate(table["names"]):
+        by_name.setdefault(name.lower(), row)
+    return [by_id.get(seed, by_name.get(seed.lower(), -1)) for seed in seeds]
+
+
+def tier_mask(table: dict, tiers: list[str] | None) -> np.ndarray | None:
+    if not tiers:
+        return None
+    return np.isin(np.array(table["tiers"]), tiers)
+
+
+# --- Commands ---
+
+def run_query(args):
+    vectors, table = load_vectors(args.dir)
+    index = IVFIndex.load(os.path.join(args.dir, IVF_FILE))
+    with open(args.seeds) as f:
+        seeds = [line.strip() for line in f if line.strip()]
+
+    rows = np.array(resolve_seeds(table, seeds), dtype=np.int64)
+    known = rows >= 0
+    for seed in np.array(seeds, dtype=object)[~known]:
+        print(json.dumps({"seed": seed, "error": "not found"}))
+
+    start = time.time()
+    ids, sims = index.search(vectors, np.asarray(vectors[rows[known]]), args.k, nprobe=args.nprobe,
+                             allowed=tier_mask(table, args.tier), exclude=rows[known])
+    elapsed = time.time() - start
+
+    for seed, seed_row, result_rows, result_sims in zip(np.array(seeds, dtype=object)[known], rows[known], ids, sims):
+        results = [
+            {"id": table["ids"][r], "company_name": table["names"][r], "tier": table["tiers"][r],
+             "similarity": round(float(s), 4)}
+            for r, s in zip(result_rows, result_sims) if r >= 0
+        ]
+        print(json.dumps({"seed": seed, "seed_id": table["ids"][seed_row], "results": results}))
+
+    print(f"Answered {int(known.sum())} seeds in {elapsed:.2f}s", file=sys.stderr)
+
+
+def run_bench(args):
+    vectors, table = load_vectors(args.dir)
+    index = IVFIndex.load(os.path.join(args.dir, IVF_FILE))
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = np.asarray(vectors[rows])
+    allowed = tier_mask(table, args.tier)
+
+    start = time.time()
+    exact, _ = brute_force_search(vectors, queries, args.k, allowed=allowed, exclude=rows)
+    exact_time = time.time() - start
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(index.centroids)} lists, "
+          f"{len(queries)} queries, k={args.k}")
+    print(f"  {'Method':14s} {'Recall@k':>9s} {'Total':>9s} {'Per query':>10s}")
+    print(f"  {'brute force':14s} {1.0:9.3f} {exact_time:8.2f}s {exact_time / len(queries) * 1000:8.2f}ms")
+
+    for nprobe in args.nprobe_sweep:
+        start = time.time()
+        approx, _ = index.search(vectors, queries, args.k, nprobe=nprobe, allowed=allowed, exclude=rows)
+        elapsed = time.time() - start
+        found = sum(len(set(a[a >= 0]) & set(e[e >= 0])) for a, e in zip(approx, exact))
+        recall = found / max(int((exact >= 0).sum()), 1)
+        print(f"  {f'ivf nprobe={nprobe}':14s} {recall:9.3f} {elapsed:8.2f}s {elapsed / len(queries) * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch lookalike search")
+    parser.add_argument("--dir", default=INDEX_DIR, help="Directory holding the exported vectors and index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("export", help="Export all description vectors from Elasticsearch")
+
+    build = commands.add_parser("build", help="Build the IVF index over the exported vectors")
+    build.add_argument("--nlist", type=int, default=0, help="Number of inverted lists (default: ~4*sqrt(rows))")
+
+    query = commands.add_parser("query", help="Top-k lookalikes for a file of seeds, as NDJSON")
+    query.add_argument("--seeds", required=True, help="File with one lead id or company name per line")
+    query.add_argument("--k", type=int, default=10)
+    query.add_argument("--nprobe", type=int, default=8, help="Inverted lists searched per seed")
+    query.add_argument("--tier", action="append", help="Only return leads in this tier (repeatable)")
+
+    bench = commands.add_parser("bench", help="Recall@k and latency against exact search")
+    bench.add_argument("--queries", type=int, default=1000)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--tier", action="append", help="Benchmark with a tier filter (repeatable)")
+    bench.add_argument("--nprobe-sweep", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+        start = time.time()
+        rows = export_vectors(es, args.dir)
+        print(f"Exported {rows} vectors to {args.dir} in {time.time() - start:.1f}s")
+    elif args.command == "build":
+        vectors, _ = load_vectors(args.dir)
+        nlist = args.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+        start = time.time()
+        IVFIndex.build(vectors, nlist).save(os.path.join(args.dir, IVF_FILE))
+        print(f"Built IVF index with {nlist} lists over {len(vectors)} vectors in {time.time() - start:.1f}s")
+    elif args.command == "query":
+        run_query(args)
+    else:
+        run_bench(args)
+
+
+if __name__ == "__main__":
+    main()
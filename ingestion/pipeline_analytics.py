@@ -2,105 +2,134 @@
 SalesForge Agent — Pipeline Analytics
 Runs ES|QL queries to show the full sales pipeline after batch scoring.
 Demonstrates the analytics power of ES|QL with scored lead data.
+
+All queries run at once through analytics_runner.py; results are cached until
+the underlying indices change, and each query's latency is reported.
+
+With --rollup the funnel, industry, funding and score statistics are read from
+the leads-rollup index batch_score.py maintains, so they cost O(groups)
+instead of a scan over every lead. With --snapshot the same reports run
+locally over a lead_snapshot.py export, with no cluster load at all.
 """
 
+import argparse
 import os
+import time
+
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 
+from analytics_runner import ANALYTICS_WORKERS, ResultCache, print_latency, print_result, run_queries
+from lead_rollup import histogram_stats, rollup_cells, score_histogram
+
 load_dotenv()
 
 ES_URL = os.getenv("ELASTICSEARCH_URL")
 ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
 
+PIPELINE_QUERIES = [
+    ("📊 PIPELINE FUNNEL — Lead Distribution by Tier",
+     'FROM leads-raw | STATS count = COUNT(*) BY score_tier | SORT count DESC'),
+    ("🏢 INDUSTRY INTELLIGENCE — Average Score by Industry",
+     'FROM leads-raw | STATS avg_score = AVG(score), count = COUNT(*) BY industry | SORT avg_score DESC'),
+    ("🔥 HOT LEADS — Distribution by Funding Stage",
+     'FROM leads-raw | WHERE score_tier == "Hot" | STATS count = COUNT(*) BY funding_stage | SORT count DESC'),
+    ("🏆 TOP 10 — Highest Scoring Leads",
+     'FROM leads-raw | SORT score DESC | LIMIT 10 | KEEP company_name, industry, score, score_tier, employee_count, funding_stage'),
+    ("📈 SCORE DISTRIBUTION — Statistical Summary",
+     'FROM leads-raw | STATS min_score = MIN(score), max_score = MAX(score), avg_score = AVG(score), median_score = MEDIAN(score)'),
+    # Hot leads ready for outreach (no email generated yet)
+    ("📧 OUTREACH QUEUE — Hot Leads Ready for Contact",
+     'FROM leads-raw | WHERE score_tier == "Hot" | SORT score DESC | KEEP company_name, full_name, job_title, email, score, industry'),
+    ("🔀 CROSS-TAB — Hot Leads by Industry × Funding",
+     'FROM leads-raw | WHERE score_tier == "Hot" | STATS count = COUNT(*) BY industry, funding_stage | SORT count DESC'),
+    ("📋 AUDIT TRAIL — Actions Logged",
+     'FROM agent-actions-log | STATS count = COUNT(*) BY action_type | SORT count DESC'),
+]
+
+
+# The same questions answered from the rollup cells
+ROLLUP_QUERIES = [
+    ("📊 PIPELINE FUNNEL — Lead Distribution by Tier",
+     'FROM leads-rollup | STATS count = SUM(count) BY score_tier | SORT count DESC'),
+    ("🏢 INDUSTRY INTELLIGENCE — Average Score by Industry",
+     'FROM leads-rollup | STATS score_sum = SUM(score_sum), count = SUM(count), min_score = MIN(score_min), '
+     'max_score = MAX(score_max) BY industry | EVAL avg_score = ROUND(score_sum / count, 2) '
+     '| KEEP industry, avg_score, count, min_score, max_score | SORT avg_score DESC'),
+    ("🔥 HOT LEADS — Distribution by Funding Stage",
+     'FROM leads-rollup | WHERE score_tier == "Hot" | STATS count = SUM(count) BY funding_stage | SORT count DESC'),
+    PIPELINE_QUERIES[3],
+    PIPELINE_QUERIES[5],
+    ("🔀 CROSS-TAB — Hot Leads by Industry × Funding",
+     'FROM leads-rollup | WHERE score_tier == "Hot" | STATS count = SUM(count) BY industry, funding_stage '
+     '| SORT count DESC'),
+    PIPELINE_QUERIES[7],
+]
+SCORE_BAND = 10
+
+
+def rollup_score_outcomes(es: Elasticsearch) -> list[dict]:
+    """Score statistics and a banded histogram, merged from the rollup's per-cell histograms."""
+    start = time.perf_counter()
+    hist = score_histogram(rollup_cells(es))
+    stats = histogram_stats(hist)
+    bands = {}
+    for score, n in hist.items():
+        low = min(score // SCORE_BAND * SCORE_BAND, 100 - SCORE_BAND)
+        bands[low] = bands.get(low, 0) + n
+    ms = (time.perf_counter() - start) * 1000
+
+    def outcome(label: str, columns: list[str], values: list[list]) -> dict:
+        return {"label": label, "query": "leads-rollup score_hist", "cached": False, "ms": ms,
+                "result": {"columns": [{"name": c} for c in columns], "values": values}}
+
+    return [
+        outcome("📈 SCORE DISTRIBUTION — Statistical Summary",
+                ["min_score", "max_score", "avg_score", "median_score"],
+                [[stats[c] for c in ("min_score", "max_score", "avg_score", "median_score")]] if stats else []),
+        outcome("📶 SCORE HISTOGRAM — Leads per Score Band", ["band", "count"],
+                [[f"{low}-{low + SCORE_BAND - 1 if low < 100 - SCORE_BAND else 100}", n]
+                 for low, n in sorted(bands.items())]),
+    ]
+
 
 def run_esql(es: Elasticsearch, query: str, label: str):
-    """Run an ES|QL query and display results."""
-    print(f"\n{'─' * 60}")
-    print(f"  {label}")
-    print(f"  Query: {query}")
-    print(f"{'─' * 60}")
-
-    try:
-        result = es.esql.query(body={"query": query})
-        columns = result.get("columns", [])
-        values = result.get("values", [])
-
-        if not values:
-            print("  (no results)")
-            return
-
-        # Print header
-        col_names = [c["name"] for c in columns]
-        widths = [max(len(str(name)), max(len(str(row[i])) for row in values)) for i, name in enumerate(col_names)]
-        header = " | ".join(f"{name:{widths[i]}}" for i, name in enumerate(col_names))
-        print(f"  {header}")
-        print(f"  {'─' * len(header)}")
-
-        # Print rows
-        for row in values:
-            line = " | ".join(f"{str(val):{widths[i]}}" for i, val in enumerate(row))
-            print(f"  {line}")
-
-        print(f"\n  ({len(values)} rows)")
-    except Exception as e:
-        print(f"  Error: {e}")
+    """Run a single ES|QL query and display results."""
+    print_result(run_queries(es, [(label, query)], workers=1)[0])
 
 
 def main():
+    parser = argparse.ArgumentParser(description="SalesForge pipeline analytics")
+    parser.add_argument("--workers", type=int, default=ANALYTICS_WORKERS, help="Queries run at once")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the cluster")
+    parser.add_argument("--rollup", action="store_true",
+                        help="Answer the aggregate queries from the leads-rollup index")
+    parser.add_argument("--snapshot", nargs="?", const="", metavar="DIR",
+                        help="Run the reports locally over a lead_snapshot.py export")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("  SalesForge Agent — Pipeline Analytics")
     print("=" * 60)
 
-    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
-
-    # 1. Pipeline Funnel
-    run_esql(es,
-        'FROM leads-raw | STATS count = COUNT(*) BY score_tier | SORT count DESC',
-        "📊 PIPELINE FUNNEL — Lead Distribution by Tier"
-    )
-
-    # 2. Average Score by Industry
-    run_esql(es,
-        'FROM leads-raw | STATS avg_score = AVG(score), count = COUNT(*) BY industry | SORT avg_score DESC',
-        "🏢 INDUSTRY INTELLIGENCE — Average Score by Industry"
-    )
-
-    # 3. Hot Leads by Funding Stage
-    run_esql(es,
-        'FROM leads-raw | WHERE score_tier == "Hot" | STATS count = COUNT(*) BY funding_stage | SORT count DESC',
-        "🔥 HOT LEADS — Distribution by Funding Stage"
-    )
-
-    # 4. Top 10 Highest Scoring Leads
-    run_esql(es,
-        'FROM leads-raw | SORT score DESC | LIMIT 10 | KEEP company_name, industry, score, score_tier, employee_count, funding_stage',
-        "🏆 TOP 10 — Highest Scoring Leads"
-    )
-
-    # 5. Score Distribution
-    run_esql(es,
-        'FROM leads-raw | STATS min_score = MIN(score), max_score = MAX(score), avg_score = AVG(score), median_score = MEDIAN(score)',
-        "📈 SCORE DISTRIBUTION — Statistical Summary"
-    )
-
-    # 6. Hot Leads Ready for Outreach (no email generated yet)
-    run_esql(es,
-        'FROM leads-raw | WHERE score_tier == "Hot" | SORT score DESC | KEEP company_name, full_name, job_title, email, score, industry',
-        "📧 OUTREACH QUEUE — Hot Leads Ready for Contact"
-    )
-
-    # 7. Industry × Funding Cross-Tab
-    run_esql(es,
-        'FROM leads-raw | WHERE score_tier == "Hot" | STATS count = COUNT(*) BY industry, funding_stage | SORT count DESC',
-        "🔀 CROSS-TAB — Hot Leads by Industry × Funding"
-    )
-
-    # 8. Audit Trail Summary
-    run_esql(es,
-        'FROM agent-actions-log | STATS count = COUNT(*) BY action_type | SORT count DESC',
-        "📋 AUDIT TRAIL — Actions Logged"
-    )
+    if args.snapshot is not None:
+        # pyarrow is only needed for the offline mode
+        from lead_snapshot import SNAPSHOT_DIR, run_reports
+        manifest, outcomes, wall = run_reports(args.snapshot or SNAPSHOT_DIR)
+        print(f"  Snapshot of '{manifest['index']}' from {manifest['exported_at']} ({manifest['rows']} leads)")
+    else:
+        es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+
+        start = time.perf_counter()
+        queries = ROLLUP_QUERIES if args.rollup else PIPELINE_QUERIES
+        outcomes = run_queries(es, queries, None if args.no_cache else ResultCache(), args.workers)
+        if args.rollup:
+            outcomes[4:4] = rollup_score_outcomes(es)
+        wall = time.perf_counter() - start
+
+    for outcome in outcomes:
+        print_result(outcome)
+    print_latency(outcomes, wall)
 
     print(f"\n{'=' * 60}")
     print("  Pipeline analytics complete.")
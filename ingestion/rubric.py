@@ -0,0 +1,415 @@
+"""
+SalesForge Agent — Lead Scoring Rubric
+The deterministic 0-100 rubric shared by every scoring path.
+
+The point tables and reason templates live here as plain data so the per-lead
+scorer below and the columnar scorer in columnar_scoring.py read exactly the
+same rubric.
+
+Leads store a compact score: per-dimension points, reason codes and matched
+keyword IDs. The human-readable reasoning is rendered from those codes on
+demand by render_result / render_reasoning.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+# --- Rubric Tables ---
+
+# Employee bands: a count >= EMPLOYEE_THRESHOLDS[i - 1] and < EMPLOYEE_THRESHOLDS[i]
+# falls in band i. Points and reasons are indexed by band.
+EMPLOYEE_THRESHOLDS = [10, 25, 50, 100, 250, 1000]
+EMPLOYEE_POINTS = [3, 6, 10, 14, 18, 22, 25]
+EMPLOYEE_REASONS = [
+    "Micro ({count} employees) — very early stage",
+    "Startup ({count} employees) — early stage",
+    "Small business ({count} employees) — standard opportunity",
+    "Small-mid ({count} employees) — moderate opportunity",
+    "Growth-stage ({count} employees) — good opportunity",
+    "Mid-market ({count} employees) — strong deal potential",
+    "Enterprise ({count} employees) — large deal potential",
+]
+
+FUNDING_SCORES = {
+    "Series C": (25, "Series C — significant budget, actively scaling"),
+    "Public": (25, "Public company — enterprise budgets available"),
+    "Growth": (22, "Growth stage — investing in tools and automation"),
+    "Series B": (20, "Series B — funded, building go-to-market"),
+    "Series A": (15, "Series A — funded but selective spending"),
+    "Seed": (10, "Seed — limited budget, early decisions"),
+    "Pre-Seed": (5, "Pre-Seed — minimal budget, founder-led"),
+    "Bootstrapped": (8, "Bootstrapped — profitable but cost-conscious"),
+}
+UNKNOWN_FUNDING = (5, "{stage} — unknown funding stage")
+
+# Industry groups are checked in order; the first group containing the industry wins
+INDUSTRY_GROUPS = [
+    ({"SaaS": 25, "FinTech": 25, "Cybersecurity": 23, "MarTech": 22},
+     "{industry} — high alignment with AI/automation services"),
+    ({"HealthTech": 18, "EdTech": 17, "E-Commerce": 17, "HRTech": 16, "InsurTech": 16},
+     "{industry} — moderate alignment, automation opportunities exist"),
+    ({"PropTech": 12, "LegalTech": 12, "LogTech": 11, "FoodTech": 10, "AgriTech": 8, "CleanTech": 8},
+     "{industry} — niche fit, specific use cases only"),
+]
+UNKNOWN_INDUSTRY = (8, "{industry} — unknown industry alignment")
+
+# Description length: longer than DESCRIPTION_LENGTH_THRESHOLDS[i - 1] characters
+# lands in band i
+DESCRIPTION_LENGTH_THRESHOLDS = [40, 80]
+DESCRIPTION_LENGTH_POINTS = [2, 5, 8]
+DESCRIPTION_LENGTH_REASONS = ["minimal positioning", "adequate positioning", "detailed positioning"]
+
+AI_KEYWORDS = ["AI", "automation", "machine learning", "analytics", "data", "platform"]
+ENTERPRISE_SIGNALS = ["enterprise", "B2B", "scale", "compliance", "security"]
+KEYWORD_GROUPS = {"ai": AI_KEYWORDS, "enterprise": ENTERPRISE_SIGNALS}
+
+# Keyword signal bands per group, best first:
+# (minimum matches, points, reason template, matched keywords shown — None for all)
+SIGNAL_BANDS = {
+    "ai": [
+        (3, 10, "strong tech signals ({matches})", 3),
+        (1, 6, "some tech signals ({matches})", None),
+        (0, 2, "no tech signals", 0),
+    ],
+    "enterprise": [
+        (1, 7, "enterprise signals ({matches})", 2),
+        (0, 2, "no enterprise signals", 0),
+    ],
+}
+
+# Every dimension is capped at the same maximum
+DIMENSION_MAX = 25
+
+TIER_THRESHOLDS = [45, 75]
+TIERS = ["Cold", "Warm", "Hot"]
+
+# Reason codes: funding code = index into FUNDING_STAGES + 1 and industry code
+# = index into INDUSTRY_GROUPS + 1, with 0 meaning "unknown". Keyword IDs index
+# KEYWORD_IDS, every (group, keyword) in configured order.
+FUNDING_STAGES = list(FUNDING_SCORES)
+KEYWORD_IDS = [(group, keyword) for group, keywords in KEYWORD_GROUPS.items() for keyword in keywords]
+DIMENSIONS = ["employee", "funding", "industry", "description"]
+# Bump when the stored score layout changes
+SCORE_FORMAT = 2
+
+# Lead fields the rubric reads — a change to any of them needs a rescore
+SCORING_FIELDS = ["employee_count", "funding_stage", "industry", "company_description", "keywords"]
+
+# Changes whenever any table above changes, which forces a full rescore
+RUBRIC_VERSION = hashlib.sha256(json.dumps([
+    EMPLOYEE_THRESHOLDS, EMPLOYEE_POINTS, EMPLOYEE_REASONS,
+    FUNDING_SCORES, UNKNOWN_FUNDING, INDUSTRY_GROUPS, UNKNOWN_INDUSTRY,
+    DESCRIPTION_LENGTH_THRESHOLDS, DESCRIPTION_LENGTH_POINTS, DESCRIPTION_LENGTH_REASONS,
+    KEYWORD_GROUPS, SIGNAL_BANDS, DIMENSION_MAX, TIER_THRESHOLDS, TIERS,
+    FUNDING_STAGES, KEYWORD_IDS, SCORE_FORMAT,
+], sort_keys=True).encode()).hexdigest()[:12]
+
+
+# Joins the scoring inputs before hashing; the same encoding is generated into
+# the Painless scorer so both paths produce identical fingerprints
+FINGERPRINT_SEPARATOR = "\x1f"
+
+
+def scoring_fingerprint(lead: dict) -> str:
+    """Stable hash of the lead fields the rubric reads."""
+    inputs = ["" if lead.get(field) is None else str(lead.get(field)) for field in SCORING_FIELDS]
+    return hashlib.sha1(FINGERPRINT_SEPARATOR.join(inputs).encode()).hexdigest()
+
+
+# --- Keyword Matching ---
+
+class KeywordMatcher:
+    """
+    Finds which keywords of each group appear in a lead's text.
+
+    Matching is plain case-insensitive substring containment over
+    `(description + " " + keywords).lower()`, so "ai" matches inside "maintain".
+    Keywords are lowercased and de-duplicated once when the matcher is built, and
+    each text is normalized once however many keywords there are.
+    """
+
+    # Joins a page of texts into one buffer; no keyword contains it, so a match
+    # can never straddle two leads
+    SEPARATOR = "\x00"
+
+    def __init__(self, groups: dict[str, list[str]]):
+        self.groups = {name: list(keywords) for name, keywords in groups.items()}
+        self.terms = list(dict.fromkeys(kw.lower() for kws in self.groups.values() for kw in kws))
+        term_index = {term: i for i, term in enumerate(self.terms)}
+        # Column of every configured keyword, per group, in configured order
+        self.group_columns = {
+            name: [term_index[kw.lower()] for kw in keywords]
+            for name, keywords in self.groups.items()
+        }
+        # Column of each keyword ID (position across all groups)
+        self.keyword_columns = [column for columns in self.group_columns.values() for column in columns]
+
+    @staticmethod
+    def normalize(description: str, keywords: str) -> str:
+        return (description + " " + keywords).lower()
+
+    def match(self, description: str, keywords: str) -> dict[str, list[str]]:
+        """Matched keywords per group, in configured order, for one lead."""
+        text = self.normalize(description, keywords)
+        present = [term in text for term in self.terms]
+        return self.group_matches(present)
+
+    def match_page(self, descriptions: list[str], keywords: list[str]) -> np.ndarray:
+        """
+        Boolean (leads x terms) match matrix for a page of leads.
+
+        The page is normalized into a single buffer and each term is located with
+        C-level scans over that buffer, so the Python work is proportional to the
+        number of matches rather than leads x keywords.
+        """
+        texts = [self.normalize(d, k) for d, k in zip(descriptions, keywords)]
+        matrix = np.zeros((len(texts), len(self.terms)), dtype=bool)
+        if not texts:
+            return matrix
+
+        buffer = self.SEPARATOR.join(texts)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + len(self.SEPARATOR)
+        starts = np.cumsum(lengths) - lengths
+
+        for column, term in enumerate(self.terms):
+            if not term:
+                matrix[:, column] = True
+                continue
+            positions = []
+            pos = buffer.find(term)
+            while pos != -1:
+                positions.append(pos)
+                pos = buffer.find(term, pos + 1)
+            if positions:
+                matrix[np.searchsorted(starts, positions, side="right") - 1, column] = True
+
+        return matrix
+
+    def group_matches(self, present) -> dict[str, list[str]]:
+        """Turn one row of term flags into matched keywords per group."""
+        return {
+            name: [kw for kw, column in zip(self.groups[name], columns) if present[column]]
+            for name, columns in self.group_columns.items()
+        }
+
+    def keyword_ids(self, present) -> list[int]:
+        """Matched keyword IDs for one row of term flags."""
+        return [i for i, column in enumerate(self.keyword_columns) if present[column]]
+
+    def group_counts(self, matrix: np.ndarray) -> dict[str, np.ndarray]:
+        """Number of matched keywords per group for every row of a match matrix."""
+        return {
+            name: matrix[:, columns].sum(axis=1, dtype=np.int64)
+            for name, columns in self.group_columns.items()
+        }
+
+
+RUBRIC_MATCHER = KeywordMatcher(KEYWORD_GROUPS)
+
+
+# --- Scoring Functions ---
+
+def employee_band(count) -> int:
+    """Index of the employee band a head count falls in (a missing count is band 0)."""
+    if count is None or count != count:
+        return 0
+    band = 0
+    for threshold in EMPLOYEE_THRESHOLDS:
+        if count >= threshold:
+            band += 1
+        else:
+            break
+    return band
+
+
+def score_employee_count(count: int) -> tuple[int, str]:
+    """Score based on employee count (proxy for market reach and deal size)."""
+    band = employee_band(count)
+    return EMPLOYEE_POINTS[band], EMPLOYEE_REASONS[band].format(count=count)
+
+
+def funding_code(stage: str) -> int:
+    """Reason code of a funding stage (0 = unknown)."""
+    return FUNDING_STAGES.index(stage) + 1 if stage in FUNDING_SCORES else 0
+
+
+def industry_code(industry: str) -> int:
+    """Reason code of an industry: its group + 1 (0 = unknown)."""
+    for group, (scores, _) in enumerate(INDUSTRY_GROUPS):
+        if industry in scores:
+            return group + 1
+    return 0
+
+
+def score_funding_stage(stage: str) -> tuple[int, str]:
+    """Score based on funding stage (proxy for budget availability)."""
+    if stage in FUNDING_SCORES:
+        return FUNDING_SCORES[stage]
+    points, reason = UNKNOWN_FUNDING
+    return points, reason.format(stage=stage)
+
+
+def score_industry_fit(industry: str) -> tuple[int, str]:
+    """Score based on industry alignment with AI automation services."""
+    for scores, reason in INDUSTRY_GROUPS:
+        if industry in scores:
+            return scores[industry], reason.format(industry=industry)
+    points, reason = UNKNOWN_INDUSTRY
+    return points, reason.format(industry=industry)
+
+
+def description_length_band(length: int) -> int:
+    """Index of the description length band."""
+    return sum(1 for threshold in DESCRIPTION_LENGTH_THRESHOLDS if length > threshold)
+
+
+def signal_band(group: str, match_count: int) -> int:
+    """Index into SIGNAL_BANDS[group] for a number of matched keywords."""
+    for band, (minimum, _, _, _) in enumerate(SIGNAL_BANDS[group]):
+        if match_count >= minimum:
+            return band
+    return len(SIGNAL_BANDS[group]) - 1
+
+
+def signal_points(group: str, matches: list[str]) -> tuple[int, str]:
+    """Points and reason for one keyword signal group."""
+    _, points, reason, shown = SIGNAL_BANDS[group][signal_band(group, len(matches))]
+    return points, reason.format(matches=", ".join(matches[:shown]))
+
+
+def score_description_quality(description: str, keywords: str) -> tuple[int, str]:
+    """Score based on company description sophistication and keyword signals."""
+    # Length indicates sophistication
+    band = description_length_band(len(description))
+    score = DESCRIPTION_LENGTH_POINTS[band]
+    reasons = [DESCRIPTION_LENGTH_REASONS[band]]
+
+    # AI/automation keywords signal readiness, Enterprise/B2B signals
+    matches = RUBRIC_MATCHER.match(description, keywords)
+    for group in SIGNAL_BANDS:
+        points, reason = signal_points(group, matches[group])
+        score += points
+        reasons.append(reason)
+
+    return min(score, DIMENSION_MAX), "; ".join(reasons)
+
+
+def tier_for(total_score: int) -> str:
+    """Map a 0-100 score to its Hot/Warm/Cold tier."""
+    return TIERS[sum(1 for threshold in TIER_THRESHOLDS if total_score >= threshold)]
+
+
+def build_result(total_score: int, tier: str, emp: tuple, fund: tuple,
+                 ind: tuple, desc: tuple) -> dict:
+    """Assemble the score document from each dimension's (score, reason)."""
+    reasoning = (
+        f"Score: {total_score}/100 → {tier}\n"
+        f"  Employee ({emp[0]}/{DIMENSION_MAX}): {emp[1]}\n"
+        f"  Funding ({fund[0]}/{DIMENSION_MAX}): {fund[1]}\n"
+        f"  Industry ({ind[0]}/{DIMENSION_MAX}): {ind[1]}\n"
+        f"  Description ({desc[0]}/{DIMENSION_MAX}): {desc[1]}"
+    )
+
+    return {
+        "score": total_score,
+        "score_tier": tier,
+        "score_reasoning": reasoning,
+        "score_breakdown": {
+            "employee": {"score": emp[0], "max": DIMENSION_MAX, "reason": emp[1]},
+            "funding": {"score": fund[0], "max": DIMENSION_MAX, "reason": fund[1]},
+            "industry": {"score": ind[0], "max": DIMENSION_MAX, "reason": ind[1]},
+            "description": {"score": desc[0], "max": DIMENSION_MAX, "reason": desc[1]},
+        },
+    }
+
+
+def score_lead(lead: dict) -> dict:
+    """Apply full scoring rubric to a lead. Returns score details."""
+    # The compact form is the one scorer; reasoning is rendered from its codes
+    return render_result({**lead, **score_lead_compact(lead)})
+
+
+# --- Compact Scores ---
+
+def compact_result(total_score: int, tier: str, points: list[int], employee: int,
+                   funding: int, industry: int, length: int, keyword_ids: list[int]) -> dict:
+    """The score fields stored on a lead: points, reason codes and matched keyword IDs."""
+    return {
+        "score": total_score,
+        "score_tier": tier,
+        "score_points": dict(zip(DIMENSIONS, points)),
+        "score_codes": {"employee": employee, "funding": funding, "industry": industry, "length": length},
+        "score_keywords": keyword_ids,
+    }
+
+
+def score_lead_compact(lead: dict) -> dict:
+    """Score a lead into its compact stored form, without rendering any reason text."""
+    count = lead.get("employee_count", 0)
+    stage = lead.get("funding_stage", "Unknown")
+    industry = lead.get("industry", "")
+    description = lead.get("company_description", "")
+    keywords = lead.get("keywords", "")
+
+    employee = employee_band(count)
+    length = description_length_band(len(description))
+    text = RUBRIC_MATCHER.normalize(description, keywords)
+    present = [term in text for term in RUBRIC_MATCHER.terms]
+    matches = RUBRIC_MATCHER.group_matches(present)
+    signal = sum(SIGNAL_BANDS[group][signal_band(group, len(matches[group]))][1] for group in SIGNAL_BANDS)
+
+    points = [
+        EMPLOYEE_POINTS[employee],
+        score_funding_stage(stage)[0],
+        score_industry_fit(industry)[0],
+        min(DESCRIPTION_LENGTH_POINTS[length] + signal, DIMENSION_MAX),
+    ]
+    total_score = sum(points)
+    return compact_result(
+        total_score, tier_for(total_score), points, employee, funding_code(stage),
+        industry_code(industry), length, RUBRIC_MATCHER.keyword_ids(present),
+    )
+
+
+def render_result(lead: dict) -> dict | None:
+    """
+    Rebuild the full reasoning and breakdown of a compactly scored lead.
+    Returns None for leads that have not been scored in the compact form.
+    """
+    codes = lead.get("score_codes")
+    if not codes:
+        return None
+    points = lead["score_points"]
+
+    employee = EMPLOYEE_REASONS[codes["employee"]].format(count=lead.get("employee_count", 0))
+
+    if codes["funding"]:
+        funding = FUNDING_SCORES[FUNDING_STAGES[codes["funding"] - 1]][1]
+    else:
+        funding = UNKNOWN_FUNDING[1].format(stage=lead.get("funding_stage", "Unknown"))
+
+    template = INDUSTRY_GROUPS[codes["industry"] - 1][1] if codes["industry"] else UNKNOWN_INDUSTRY[1]
+    industry = template.format(industry=lead.get("industry", ""))
+
+    matches = {group: [] for group in KEYWORD_GROUPS}
+    for keyword_id in lead.get("score_keywords") or []:
+        group, keyword = KEYWORD_IDS[keyword_id]
+        matches[group].append(keyword)
+    description = "; ".join(
+        [DESCRIPTION_LENGTH_REASONS[codes["length"]]]
+        + [signal_points(group, matches[group])[1] for group in SIGNAL_BANDS]
+    )
+
+    return build_result(
+        lead["score"], lead["score_tier"],
+        (points["employee"], employee), (points["funding"], funding),
+        (points["industry"], industry), (points["description"], description),
+    )
+
+
+def render_reasoning(lead: dict) -> str | None:
+    """Human-readable reasoning for a scored lead (legacy documents carry it inline)."""
+    result = render_result(lead)
+    return result["score_reasoning"] if result else lead.get("score_reasoning")
@@ -9,11 +9,19 @@ import os
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 from faker import Faker
 from openai import OpenAI
 
+from bulk_writer import BulkWriter
+from embeddings import API_STATS, embed_matrix, get_cache
+from lead_identity import plan_upserts, upsert_action
+from lead_rollup import reset_rollup
+from server_scoring import install_reasoning_field, store_scoring_script
+from vector_profile import VECTOR_PROFILE, apply_profile, vector_encoding
+
 load_dotenv()
 
 fake = Faker()
@@ -125,7 +133,6 @@ def generate_lead() -> dict:
         "tech_stack": random.choice(TECH_STACKS),
         "score": None,
         "score_tier": None,
-        "score_reasoning": None,
         "outreach_email": None,
         "agent_actions": [],
         "created_at": datetime.utcnow().isoformat(),
@@ -134,13 +141,9 @@ def generate_lead() -> dict:
     }
 
 
-def generate_embeddings(texts: list[str], client: OpenAI) -> list[list[float]]:
-    """Generate embeddings for company descriptions using OpenAI."""
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts,
-    )
-    return [item.embedding for item in response.data]
+def generate_embeddings(texts: list[str], client: OpenAI) -> np.ndarray:
+    """Generate embeddings for company descriptions, reusing cached vectors."""
+    return embed_matrix(client, texts)
 
 
 def create_index(es: Elasticsearch):
@@ -154,23 +157,25 @@ def create_index(es: Elasticsearch):
 
     es.indices.create(
         index=INDEX_NAME,
-        body=mappings[INDEX_NAME],
+        body=apply_profile(mappings[INDEX_NAME]),
     )
-    print(f"Created index '{INDEX_NAME}'")
+    # Reasoning text is rendered at query time from the stored score codes
+    install_reasoning_field(es, INDEX_NAME)
+    # The score_and_route workflows call the stored scorer by id
+    store_scoring_script(es)
+    print(f"Created index '{INDEX_NAME}' (vector profile {VECTOR_PROFILE['name']})")
+    # A fresh index has no scored leads — the rollup starts empty with it
+    reset_rollup(es)
 
 
-def bulk_index_leads(es: Elasticsearch, leads: list[dict]):
-    """Bulk index leads into Elasticsearch."""
-    actions = [
-        {
-            "_index": INDEX_NAME,
-            "_source": lead,
-        }
-        for lead in leads
-    ]
-    success, errors = helpers.bulk(es, actions)
-    print(f"Indexed {success} leads, {len(errors)} errors")
-    return success, errors
+def bulk_index_leads(es: Elasticsearch, writes: list[tuple]):
+    """Upsert leads under their deterministic IDs."""
+    actions = [upsert_action(INDEX_NAME, *write) for write in writes]
+    with BulkWriter(es, vector_encoding=vector_encoding(es)) as writer:
+        writer.add_many(actions)
+    print(f"Indexed {writer.docs} leads, {writer.failed} errors")
+    print(f"  Bulk: {writer.summary()}")
+    return writer.docs, writer.errors
 
 
 def main():
@@ -190,21 +195,24 @@ def main():
     # Generate leads
     print(f"Generating {NUM_LEADS} synthetic leads...")
     leads = [generate_lead() for _ in range(NUM_LEADS)]
+    plan = plan_upserts(es, INDEX_NAME, leads)
 
     # Generate embeddings for company descriptions
     if OPENAI_API_KEY:
         print("Generating vector embeddings for hybrid search...")
         openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        descriptions = [lead["company_description"] for lead in leads]
-
-        # Batch embeddings (max 2048 per request)
-        batch_size = 100
-        for i in range(0, len(descriptions), batch_size):
-            batch = descriptions[i:i + batch_size]
-            embeddings = generate_embeddings(batch, openai_client)
-            for j, embedding in enumerate(embeddings):
-                leads[i + j]["company_description_vector"] = embedding
-        print(f"Generated {len(leads)} embeddings")
+        to_embed = plan["embed"]
+        descriptions = [lead["company_description"] for lead in to_embed]
+
+        # Batched and deduplicated inside the cache layer; each lead holds a
+        # row view of one float32 matrix until the bulk request is serialized
+        embeddings = generate_embeddings(descriptions, openai_client)
+        for lead, embedding in zip(to_embed, embeddings):
+            lead["company_description_vector"] = embedding
+        cache = get_cache()
+        print(f"Generated {len(to_embed)} embeddings ({cache.hits} cached, {cache.misses} from the API)")
+        if API_STATS.requests:
+            print(f"  Embedding API: {API_STATS.summary()}")
     else:
         print("WARNING: No OPENAI_API_KEY — skipping vector embeddings")
         for lead in leads:
@@ -212,7 +220,7 @@ def main():
 
     # Bulk index
     print("\nIndexing into Elasticsearch...")
-    bulk_index_leads(es, leads)
+    bulk_index_leads(es, plan["write"])
 
     # Save sample data locally
     sample_path = os.path.join(os.path.dirname(__file__), "..", "data", "sample_leads.json")
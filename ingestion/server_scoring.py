@@ -0,0 +1,448 @@
+"""
+SalesForge Agent — Server-Side Scoring
+Generates a Painless version of the lead rubric from the tables in rubric.py,
+stores it in Elasticsearch and scores the whole index with _update_by_query.
+
+No lead documents cross the network: the cluster runs the same rubric as
+rubric.score_lead_compact, sliced, throttled and tracked as a background task.
+The same generator also emits a `painless_test` variant, so the Python and
+Painless paths can be checked for equivalence through the execute API, and
+the `score_reasoning` runtime field that renders reasoning text from the
+stored reason codes at query time.
+"""
+
+import json
+import time
+
+from elasticsearch import Elasticsearch
+
+from columnar_scoring import score_leads
+from lead_rollup import rollup_key
+from rubric import (
+    DESCRIPTION_LENGTH_POINTS,
+    DESCRIPTION_LENGTH_REASONS,
+    DESCRIPTION_LENGTH_THRESHOLDS,
+    DIMENSION_MAX,
+    DIMENSIONS,
+    EMPLOYEE_POINTS,
+    EMPLOYEE_REASONS,
+    EMPLOYEE_THRESHOLDS,
+    FINGERPRINT_SEPARATOR,
+    FUNDING_SCORES,
+    FUNDING_STAGES,
+    INDUSTRY_GROUPS,
+    KEYWORD_IDS,
+    RUBRIC_VERSION,
+    SCORING_FIELDS,
+    SIGNAL_BANDS,
+    TIER_THRESHOLDS,
+    TIERS,
+    UNKNOWN_FUNDING,
+    UNKNOWN_INDUSTRY,
+    render_reasoning,
+    score_lead_compact,
+    scoring_fingerprint,
+)
+
+SCRIPT_ID = "salesforge-score-lead"
+
+
+# --- Painless Generation ---
+
+def painless_literal(value) -> str:
+    """Render a Python constant as a Painless list/map/string literal."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        # Painless only knows the \\ and \' escapes; other characters go in raw
+        escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+        return f"'{escaped}'"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(painless_literal(v) for v in value) + "]"
+    if isinstance(value, dict):
+        if not value:
+            return "[:]"
+        return "[" + ", ".join(f"{painless_literal(k)}: {painless_literal(v)}" for k, v in value.items()) + "]"
+    raise TypeError(f"Cannot render {type(value).__name__} as Painless")
+
+
+# Python's str() of the lead values is reproduced by py(); field() is dict.get
+PAINLESS_HELPERS = """
+String py(def v) { return v == null ? 'None' : v.toString(); }
+
+String nl() { return String.valueOf((char) 10); }
+
+String fpPart(def v) { return v == null ? '' : v.toString(); }
+
+def field(Map src, String name, def fallback) {
+  return src.containsKey(name) ? src.get(name) : fallback;
+}
+"""
+
+# Rubric logic; the RUBRIC map is generated from rubric.py and appended.
+# scoreLead mirrors rubric.score_lead_compact step by step, and description
+# length counts code points like len().
+PAINLESS_BODY = PAINLESS_HELPERS + """
+Map scoreLead(Map src, Map R) {
+  // Employee count
+  def count = field(src, 'employee_count', 0);
+  int empBand = 0;
+  if (count != null) {
+    for (def t : R.employee_thresholds) { if (count >= t) { empBand++; } else { break; } }
+  }
+  int empScore = R.employee_points[empBand];
+
+  // Funding stage
+  def stage = field(src, 'funding_stage', 'Unknown');
+  int fundCode = stage == null ? -1 : R.funding_stages.indexOf(stage);
+  int fundScore = fundCode >= 0 ? R.funding[stage][0] : R.unknown_funding[0];
+
+  // Industry fit
+  def industry = field(src, 'industry', '');
+  int indCode = 0;
+  int indScore = R.unknown_industry[0];
+  for (int g = 0; g < R.industry_groups.size(); g++) {
+    if (industry != null && R.industry_groups[g][0].containsKey(industry)) {
+      indScore = R.industry_groups[g][0][industry];
+      indCode = g + 1;
+      break;
+    }
+  }
+
+  // Description quality
+  def desc = field(src, 'company_description', '');
+  def kws = field(src, 'keywords', '');
+  String descText = desc == null ? '' : desc.toString();
+  String kwText = kws == null ? '' : kws.toString();
+  int length = descText.codePointCount(0, descText.length());
+  int lenBand = 0;
+  for (def t : R.length_thresholds) { if (length > t) { lenBand++; } }
+  int descScore = R.length_points[lenBand];
+
+  String text = (descText + ' ' + kwText).toLowerCase(Locale.ROOT);
+  List keywordIds = new ArrayList();
+  Map counts = new HashMap();
+  for (def group : R.signal_order) { counts[group] = 0; }
+  for (int id = 0; id < R.keyword_ids.size(); id++) {
+    def entry = R.keyword_ids[id];
+    if (text.contains(entry[1].toLowerCase(Locale.ROOT))) {
+      keywordIds.add(id);
+      counts[entry[0]] = counts[entry[0]] + 1;
+    }
+  }
+  for (def group : R.signal_order) {
+    for (def band : R.signal_bands[group]) {
+      if (counts[group] >= band[0]) { descScore += band[1]; break; }
+    }
+  }
+  descScore = (int) Math.min(descScore, R.dimension_max);
+
+  // Total and tier
+  int total = empScore + fundScore + indScore + descScore;
+  int tierBand = 0;
+  for (def t : R.tier_thresholds) { if (total >= t) { tierBand++; } }
+
+  List parts = new ArrayList();
+  for (def name : R.scoring_fields) { parts.add(fpPart(src.get(name))); }
+
+  Map result = new HashMap();
+  result.score = total;
+  result.score_tier = R.tiers[tierBand];
+  result.score_points = ['employee': empScore, 'funding': fundScore, 'industry': indScore, 'description': descScore];
+  result.score_codes = ['employee': empBand, 'funding': fundCode + 1, 'industry': indCode, 'length': lenBand];
+  result.score_keywords = keywordIds;
+  result.score_fingerprint = String.join(R.fingerprint_separator, parts).sha1();
+  result.score_rubric_version = R.version;
+  // Rollup cell, keyed like lead_rollup.rollup_key
+  def rollupIndustry = industry == null || industry == '' ? 'Unknown' : industry;
+  def rollupStage = stage == null || stage == '' ? 'Unknown' : stage;
+  result.score_rollup = ['industry': rollupIndustry, 'funding_stage': rollupStage,
+                         'score_tier': result.score_tier, 'score': total];
+  return result;
+}
+"""
+
+# renderReasoning mirrors rubric.render_reasoning. It only reads the stored
+# score codes and the REASONS table (reason templates indexed by code), so the
+# runtime field carries neither the scorer nor the scoring tables.
+PAINLESS_REASONING = """
+String renderReasoning(Map src, Map T) {
+  Map codes = src.score_codes;
+  Map points = src.score_points;
+  int max = T.dimension_max;
+
+  String empReason = T.employee_reasons[codes.employee].replace('{count}', py(field(src, 'employee_count', 0)));
+  String fundReason = codes.funding > 0
+      ? T.funding_reasons[codes.funding]
+      : T.funding_reasons[0].replace('{stage}', py(field(src, 'funding_stage', 'Unknown')));
+  String indReason = T.industry_reasons[codes.industry].replace('{industry}', py(field(src, 'industry', '')));
+
+  Map matches = new HashMap();
+  for (def group : T.signal_order) { matches[group] = new ArrayList(); }
+  if (src.score_keywords != null) {
+    for (def id : src.score_keywords) { matches[T.keyword_ids[id][0]].add(T.keyword_ids[id][1]); }
+  }
+  List reasons = new ArrayList();
+  reasons.add(T.length_reasons[codes.length]);
+  for (def group : T.signal_order) {
+    List m = matches[group];
+    for (def band : T.signal_bands[group]) {
+      if (m.size() >= band[0]) {
+        List shown = band[2] == null ? m : m.subList(0, (int) Math.min(band[2], m.size()));
+        reasons.add(band[1].replace('{matches}', String.join(', ', shown)));
+        break;
+      }
+    }
+  }
+
+  return 'Score: ' + src.score + '/100 → ' + src.score_tier + nl()
+      + '  Employee (' + points.employee + '/' + max + '): ' + empReason + nl()
+      + '  Funding (' + points.funding + '/' + max + '): ' + fundReason + nl()
+      + '  Industry (' + points.industry + '/' + max + '): ' + indReason + nl()
+      + '  Description (' + points.description + '/' + max + '): ' + String.join('; ', reasons);
+}
+"""
+
+# Update context: write the compact score into the document, or skip it when an
+# incremental run finds the stored fingerprint still current or the stored
+# score fields already equal the new ones. score_rollup (the leads-rollup cell
+# the lead is counted in) only moves when the caller also maintains the rollup;
+# other callers leave it behind for the next batch_score.py run to reconcile.
+PAINLESS_UPDATE = """
+Map src = ctx._source;
+Map result = scoreLead(src, RUBRIC);
+if (params.rollup != true) { result.remove('score_rollup'); }
+boolean same = src.score_reasoning == null && src.score_breakdown == null;
+for (def key : result.keySet()) {
+  if (!same) { break; }
+  if (!result[key].equals(src[key])) { same = false; }
+}
+if (same || (params.incremental == true
+    && result.score_fingerprint == src.score_fingerprint
+    && result.score_rubric_version == src.score_rubric_version)) {
+  ctx.op = 'noop';
+} else {
+  src.putAll(result);
+  src.remove('score_reasoning');
+  src.remove('score_breakdown');
+  src.scored_at = params.now;
+}
+"""
+
+# painless_test context: score params.lead, render its reasoning and flatten
+# the fields named in params.paths into one string, since that context can
+# only return text
+PAINLESS_TEST = """
+Map result = scoreLead(params.lead, RUBRIC);
+Map scored = new HashMap(params.lead);
+scored.putAll(result);
+result.score_reasoning = renderReasoning(scored, REASONS);
+List out = new ArrayList();
+for (def path : params.paths) {
+  def value = result;
+  for (def key : path) { value = value[key]; }
+  out.add(String.valueOf(value));
+}
+return String.join(String.valueOf((char) 30), out);
+"""
+
+# Runtime field context: score_reasoning rendered from the stored codes
+PAINLESS_RUNTIME = """
+Map src = params._source;
+if (src.score_codes != null) {
+  emit(renderReasoning(src, REASONS));
+} else if (src.score_reasoning != null) {
+  emit(src.score_reasoning.toString());
+}
+"""
+
+# Fields compared by the equivalence check
+RESULT_PATHS = [
+    ["score"], ["score_tier"], ["score_keywords"], ["score_fingerprint"], ["score_rubric_version"],
+    ["score_reasoning"],
+] + [["score_rollup", key] for key in ("industry", "funding_stage", "score_tier", "score")] + [
+    ["score_points", dimension] for dimension in DIMENSIONS
+] + [
+    ["score_codes", code] for code in ("employee", "funding", "industry", "length")
+]
+
+
+def rubric_data() -> dict:
+    """The scoring tables in the shape the Painless scorer reads them."""
+    return {
+        "employee_thresholds": EMPLOYEE_THRESHOLDS,
+        "employee_points": EMPLOYEE_POINTS,
+        "funding": {stage: list(entry) for stage, entry in FUNDING_SCORES.items()},
+        "unknown_funding": list(UNKNOWN_FUNDING),
+        "industry_groups": [[scores, reason] for scores, reason in INDUSTRY_GROUPS],
+        "unknown_industry": list(UNKNOWN_INDUSTRY),
+        "length_thresholds": DESCRIPTION_LENGTH_THRESHOLDS,
+        "length_points": DESCRIPTION_LENGTH_POINTS,
+        "keyword_ids": [list(entry) for entry in KEYWORD_IDS],
+        "funding_stages": FUNDING_STAGES,
+        "signal_order": list(SIGNAL_BANDS),
+        "signal_bands": {group: [list(band) for band in bands] for group, bands in SIGNAL_BANDS.items()},
+        "dimension_max": DIMENSION_MAX,
+        "tier_thresholds": TIER_THRESHOLDS,
+        "tiers": TIERS,
+        "scoring_fields": SCORING_FIELDS,
+        "fingerprint_separator": FINGERPRINT_SEPARATOR,
+        "version": RUBRIC_VERSION,
+    }
+
+
+def reasoning_data() -> dict:
+    """The reason templates renderReasoning reads, indexed by the stored score codes."""
+    return {
+        "employee_reasons": EMPLOYEE_REASONS,
+        "funding_reasons": [UNKNOWN_FUNDING[1]] + [FUNDING_SCORES[stage][1] for stage in FUNDING_STAGES],
+        "industry_reasons": [UNKNOWN_INDUSTRY[1]] + [reason for _, reason in INDUSTRY_GROUPS],
+        "length_reasons": DESCRIPTION_LENGTH_REASONS,
+        "keyword_ids": [list(entry) for entry in KEYWORD_IDS],
+        "signal_order": list(SIGNAL_BANDS),
+        "signal_bands": {
+            group: [[minimum, reason, shown] for minimum, _, reason, shown in bands]
+            for group, bands in SIGNAL_BANDS.items()
+        },
+        "dimension_max": DIMENSION_MAX,
+    }
+
+
+def painless_source(context: str = "update") -> str:
+    """
+    Generate the Painless script for the update, painless_test or runtime field
+    context. The runtime field gets only the renderer and its reason table.
+    """
+    rubric = f"\nMap RUBRIC = {painless_literal(rubric_data())};\n"
+    reasons = f"\nMap REASONS = {painless_literal(reasoning_data())};\n"
+    if context == "update":
+        return PAINLESS_BODY + rubric + PAINLESS_UPDATE
+    if context == "test":
+        return PAINLESS_BODY + PAINLESS_REASONING + rubric + reasons + PAINLESS_TEST
+    if context == "runtime":
+        return PAINLESS_HELPERS + PAINLESS_REASONING + reasons + PAINLESS_RUNTIME
+    raise ValueError(f"Unknown Painless context: {context}")
+
+
+# --- Cluster Operations ---
+
+def store_scoring_script(es: Elasticsearch, script_id: str = SCRIPT_ID):
+    """Store (or replace) the generated scorer as a stored script."""
+    es.put_script(id=script_id, body={"script": {"lang": "painless", "source": painless_source()}})
+    print(f"Stored Painless scorer '{script_id}' (rubric {RUBRIC_VERSION})")
+
+
+def install_reasoning_field(es: Elasticsearch, index: str):
+    """Map score_reasoning as a runtime field rendered from the compact score codes."""
+    es.indices.put_mapping(index=index, body={
+        "runtime": {
+            "score_reasoning": {
+                "type": "keyword",
+                "script": {"lang": "painless", "source": painless_source(context="runtime")},
+            }
+        }
+    })
+
+
+def start_server_side_scoring(es: Elasticsearch, index: str, query: dict = None,
+                              incremental: bool = False, requests_per_second: float = -1,
+                              script_id: str = SCRIPT_ID, rollup: bool = True, now: str = None) -> str:
+    """
+    Kick off a sliced, throttled _update_by_query running as a task. Returns the
+    task id. With `rollup` the leads' score_rollup keys move too, and the caller
+    rebuilds leads-rollup afterwards. Every lead the task rewrites is stamped
+    with scored_at = `now`.
+    """
+    response = es.update_by_query(
+        index=index,
+        body={
+            "query": query or {"match_all": {}},
+            "script": {
+                "id": script_id,
+                "params": {
+                    "incremental": incremental,
+                    "rollup": rollup,
+                    "now": now or time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+                },
+            },
+        },
+        slices="auto",
+        requests_per_second=requests_per_second,
+        conflicts="proceed",
+        wait_for_completion=False,
+    )
+    return response["task"]
+
+
+def wait_for_task(es: Elasticsearch, task_id: str, poll_interval: float = 2.0) -> dict:
+    """Poll a background task until it finishes, printing progress along the way."""
+    while True:
+        task = es.tasks.get(task_id=task_id)
+        status = task["task"]["status"]
+        done = status.get("updated", 0) + status.get("noops", 0) + status.get("version_conflicts", 0)
+        print(f"  ... {done}/{status.get('total', 0)} leads processed")
+        if task.get("completed"):
+            return task
+        time.sleep(poll_interval)
+
+
+# --- Equivalence Check ---
+
+def flatten_result(result: dict) -> list[str]:
+    """The RESULT_PATHS values of a score document as strings."""
+    values = []
+    for path in RESULT_PATHS:
+        value = result
+        for key in path:
+            value = value[key]
+        values.append(str(value))
+    return values
+
+
+def check_equivalence(es: Elasticsearch, leads: list[dict]) -> int:
+    """
+    Score each lead in Python (scalar and columnar) and through the Painless
+    execute API and report any field where they disagree. A copy of the first
+    lead without a head count is added, since null is the easiest case for the
+    three paths to band differently. Returns the number of mismatching leads.
+    """
+    source = painless_source(context="test")
+    mismatches = 0
+    if leads:
+        leads = leads + [{**leads[0], "employee_count": None}]
+    columnar = score_leads(leads)
+
+    for i, lead in enumerate(leads):
+        expected = score_lead_compact(lead)
+        if columnar.compact(i) != expected:
+            mismatches += 1
+            print(f"  Mismatch for {lead.get('company_name', 'Unknown')}:")
+            print(f"    columnar={json.dumps(columnar.compact(i))} python={json.dumps(expected)}")
+            continue
+        expected["score_fingerprint"] = scoring_fingerprint(lead)
+        expected["score_rubric_version"] = RUBRIC_VERSION
+        expected["score_rollup"] = rollup_key(lead, expected)
+        expected["score_reasoning"] = render_reasoning({**lead, **expected})
+
+        response = es.scripts_painless_execute(body={
+            "script": {"source": source, "params": {"lead": lead, "paths": RESULT_PATHS}},
+            "context": "painless_test",
+        })
+        actual = response["result"].split(chr(30))
+
+        diffs = [
+            (".".join(path), want, got)
+            for path, want, got in zip(RESULT_PATHS, flatten_result(expected), actual)
+            if want != got
+        ]
+        if diffs:
+            mismatches += 1
+            print(f"  Mismatch for {lead.get('company_name', 'Unknown')}:")
+            for path, want, got in diffs:
+                print(f"    {path}: python={json.dumps(want)} painless={json.dumps(got)}")
+
+    return mismatches
@@ -0,0 +1,309 @@
+"""
+SalesForge Agent — Find Similar Server
+Long-running local HTTP server for interactive lookalike lookups.
+
+The Elasticsearch and OpenAI clients are built once and their connection
+pools stay warm. Query embeddings are kept in an in-memory LRU keyed by
+normalized text, in front of the shared embedding layer (on-disk cache, then
+the API with its rate-limit retries). Recent result sets
+are kept for a short TTL, so repeating a lookup costs no round-trip at all.
+
+Endpoints (GET, JSON responses):
+  /similar/name?name=Wang-Bass&k=5          Leads like an indexed company
+  /similar/description?q=AI+SaaS&k=5        Leads like a free-text description
+  /metrics                                  Per-endpoint count and p50/p99 latency, cache hit rates,
+                                            embedding API calls
+  /health
+
+Both /similar endpoints accept tier=Hot,Warm, industry=FinTech, min_employees,
+max_employees and hybrid=1 (kNN fused with BM25; results carry rrf_score
+instead of similarity), as in find_similar.py.
+
+Usage:
+  python similar_server.py --port 8088
+  python find_similar.py --serve
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+from openai import OpenAI
+
+from embeddings import API_STATS, embed_text, normalize_text
+from find_similar import INDEX_NAME, find_by_company_name, find_similar_by_vector, hit_summary, lead_filters
+from vector_profile import check_index_profile, unpack_vector
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+DEFAULT_PORT = 8088
+EMBEDDING_LRU_SIZE = 2048
+RESULT_TTL = 30.0
+RESULT_CACHE_SIZE = 1024
+# Latency samples kept per endpoint for the percentiles
+LATENCY_WINDOW = 2000
+MAX_TOP_K = 100
+
+
+# --- Caches ---
+
+class LRUCache:
+    """Thread-safe least-recently-used map with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._items), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None}
+
+
+class TTLCache(LRUCache):
+    """LRU whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        super().__init__(max_entries)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            with self._lock:
+                self._items.pop(key, None)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+
+class LatencyStats:
+    """Rolling request latencies per endpoint."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.window = window
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {endpoint: list(values) for endpoint, values in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            endpoint: {
+                "count": counts[endpoint],
+                "p50_ms": round(float(np.percentile(values, 50)) * 1000, 2),
+                "p99_ms": round(float(np.percentile(values, 99)) * 1000, 2),
+            }
+            for endpoint, values in samples.items()
+        }
+
+
+# --- Service ---
+
+class SimilarService:
+    """Warm clients plus the caches, shared by every request thread."""
+
+    def __init__(self, es: Elasticsearch, openai_client: OpenAI,
+                 embedding_lru: int = EMBEDDING_LRU_SIZE, result_ttl: float = RESULT_TTL):
+        self.es = es
+        self.openai = openai_client
+        self.embeddings = LRUCache(embedding_lru)
+        self.results = TTLCache(RESULT_CACHE_SIZE, result_ttl)
+        self.latency = LatencyStats()
+
+    def embed(self, text: str) -> list[float]:
+        """Query embedding: in-memory LRU, then embeddings.py (disk cache, then the API)."""
+        text = normalize_text(text)
+        vector = self.embeddings.get(text)
+        if vector is not None:
+            return vector
+
+        vector = embed_text(self.openai, text)
+        self.embeddings.put(text, vector)
+        return vector
+
+    def similar_by_name(self, name: str, top_k: int, filters: list[dict] = None, hybrid: bool = False) -> dict:
+        cache = ("name", normalize_text(name).lower(), top_k, json.dumps(filters, sort_keys=True), hybrid)
+        result = self.results.get(cache)
+        if result is not None:
+            return result
+
+        source = find_by_company_name(self.es, name)
+        if not source:
+            return {"error": f"Company '{name}' not found"}
+        lead = source["_source"]
+        vector = unpack_vector(lead.get("company_description_vector"))
+        if not vector:
+            vector = self.embed(lead.get("company_description", ""))
+        text = lead.get("company_description") if hybrid else None
+        # Filter match counts stay cached in this process, so the count search is rare
+        hits = find_similar_by_vector(self.es, vector, exclude_id=source["_id"], top_k=top_k,
+                                      filters=filters, text=text, adaptive=True)
+        result = {
+            "source": {"id": source["_id"], "company_name": lead.get("company_name")},
+            "results": [hit_summary(hit, hybrid) for hit in hits],
+        }
+        self.results.put(cache, result)
+        return result
+
+    def similar_by_description(self, query: str, top_k: int, filters: list[dict] = None,
+                               hybrid: bool = False) -> dict:
+        cache = ("description", normalize_text(query), top_k, json.dumps(filters, sort_keys=True), hybrid)
+        result = self.results.get(cache)
+        if result is not None:
+            return result
+
+        hits = find_similar_by_vector(self.es, self.embed(query), top_k=top_k,
+                                      filters=filters, text=query if hybrid else None, adaptive=True)
+        result = {"query": query, "results": [hit_summary(hit, hybrid) for hit in hits]}
+        self.results.put(cache, result)
+        return result
+
+    def metrics(self) -> dict:
+        return {
+            "latency": self.latency.summary(),
+            "embedding_lru": self.embeddings.stats(),
+            "result_cache": self.results.stats(),
+            "embedding_api": {"requests": API_STATS.requests, "retries": API_STATS.retries,
+                              "texts": API_STATS.texts},
+        }
+
+
+# --- HTTP ---
+
+def request_filters(params: dict) -> list[dict]:
+    """Lead filters from query-string parameters (comma-separated lists)."""
+    def values(name: str) -> list[str] | None:
+        return [v.strip() for v in params[name].split(",") if v.strip()] if params.get(name) else None
+
+    def number(name: str) -> int | None:
+        return int(params[name]) if params.get(name) else None
+
+    return lead_filters(values("tier"), values("industry"), number("min_employees"), number("max_employees"))
+
+
+def make_handler(service: SimilarService):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            start = time.perf_counter()
+            try:
+                status, body = 200, self.route(url.path, params)
+            except ValueError as e:
+                status, body = 400, {"error": str(e)}
+            except Exception as e:
+                status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+            if body is None:
+                status, body = 404, {"error": f"Unknown endpoint {url.path}"}
+            elif "error" in body and status == 200:
+                status = 404
+
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            if url.path.startswith("/similar/"):
+                service.latency.record(url.path, time.perf_counter() - start)
+
+        def route(self, path: str, params: dict) -> dict | None:
+            if path == "/health":
+                return {"status": "ok"}
+            if path == "/metrics":
+                return service.metrics()
+
+            top_k = int(params.get("k", 5))
+            if not 1 <= top_k <= MAX_TOP_K:
+                raise ValueError(f"k must be between 1 and {MAX_TOP_K}")
+            filters = request_filters(params)
+            hybrid = params.get("hybrid", "").lower() in ("1", "true", "yes")
+            if path == "/similar/name":
+                if not params.get("name"):
+                    raise ValueError("Missing 'name'")
+                return service.similar_by_name(params["name"], top_k, filters, hybrid)
+            if path == "/similar/description":
+                if not params.get("q"):
+                    raise ValueError("Missing 'q'")
+                return service.similar_by_description(params["q"], top_k, filters, hybrid)
+            return None
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT, result_ttl: float = RESULT_TTL):
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY, connections_per_node=32)
+    check_index_profile(es, INDEX_NAME)
+    service = SimilarService(es, OpenAI(api_key=OPENAI_API_KEY), result_ttl=result_ttl)
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Find Similar server on http://{host}:{port} (result TTL {result_ttl:.0f}s) — Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(service.metrics(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent Find Similar server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ttl", type=float, default=RESULT_TTL, help="Seconds a result set stays cached")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.ttl)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+SalesForge Agent — Vector Profile Benchmark
+Compares vector profiles (embedding dims x quantization) on the real lead vectors.
+
+For every profile the description vectors in leads-raw are shortened to the
+profile's dims (the same truncate-and-renormalize the embeddings API applies),
+indexed into a scratch index with the profile's mapping and force-merged. The
+benchmark then reports:
+
+  memory   estimated off-heap RAM kNN needs (vectors + HNSW graph) and the
+           vector field's on-disk size from the disk usage API
+  latency  p50/p99 of kNN searches with lead vectors as queries
+  recall   recall@k against exact full-precision search over the original
+           vectors, excluding the query lead itself
+
+Usage:
+  python vector_benchmark.py
+  python vector_benchmark.py --profiles none-1536 int8-1536 bbq-1536 int8-512 --queries 200 --k 10
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from elasticsearch import Elasticsearch
+
+from bulk_writer import BulkWriter
+from lead_reader import close_pit, projection, stream_leads
+from vector_profile import (
+    VECTOR_FIELD, knn_clause, make_profile, shorten, unpack_vector, vector_encoding, vector_mapping,
+)
+
+load_dotenv()
+
+ES_URL = os.getenv("ELASTICSEARCH_URL")
+ES_API_KEY = os.getenv("ELASTICSEARCH_API_KEY")
+INDEX_NAME = "leads-raw"
+BENCH_INDEX_PREFIX = "leads-vector-bench-"
+
+DEFAULT_PROFILES = ["none-1536", "int8-1536", "int4-1536", "bbq-1536", "int8-512", "bbq-512", "int8-256"]
+HNSW_M = 16
+NUM_CANDIDATES = 100
+
+
+# --- Data ---
+
+def load_vectors(es: Elasticsearch, max_docs: int) -> tuple[list[str], np.ndarray]:
+    """Ids and full-precision vectors of up to max_docs leads."""
+    ids, vectors = [], []
+    reader = {}
+    for hits in stream_leads(es, INDEX_NAME, query={"exists": {"field": VECTOR_FIELD}},
+                             source=projection("lookalike"), checkpoint=reader):
+        for hit in hits:
+            ids.append(hit["_id"])
+            vectors.append(unpack_vector(hit["_source"][VECTOR_FIELD]))
+        if len(ids) >= max_docs:
+            # Stopping early: only a stream read to the end closes its PIT
+            close_pit(es, reader["pit_id"])
+            break
+    return ids[:max_docs], np.asarray(vectors[:max_docs], dtype=np.float32)
+
+
+def exact_neighbors(vectors: np.ndarray, query_rows: np.ndarray, k: int) -> np.ndarray:
+    """Full-precision top-k rows by cosine similarity, excluding the query row."""
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    scores = unit[query_rows] @ unit.T
+    scores[np.arange(len(query_rows)), query_rows] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+# --- Memory ---
+
+def estimated_memory(profile: dict, count: int) -> int:
+    """Off-heap bytes kNN needs resident: quantized vectors plus the HNSW graph."""
+    dims = profile["dims"]
+    index_type = profile["index_type"]
+    if index_type is None:
+        # Recent clusters default dense_vector to int8_hnsw from 384 dims up
+        index_type = "int8_hnsw" if dims >= 384 else "hnsw"
+    per_vector = {
+        "hnsw": 4 * dims,
+        "int8_hnsw": dims + 4,
+        "int4_hnsw": math.ceil(dims / 2) + 4,
+        "bbq_hnsw": math.ceil(dims / 8) + 14,
+    }[index_type]
+    return count * (per_vector + 4 * HNSW_M)
+
+
+def disk_bytes(es: Elasticsearch, index: str) -> int | None:
+    """On-disk size of the vector field, or None where the disk usage API is unavailable."""
+    try:
+        usage = es.indices.disk_usage(index=index, run_expensive_tasks=True)
+    except Exception:
+        return None
+    return usage[index]["fields"].get(VECTOR_FIELD, {}).get("total_in_bytes")
+
+
+# --- Benchmark ---
+
+def bench_profile(es: Elasticsearch, profile: dict, ids: list[str], vectors: np.ndarray,
+                  query_rows: np.ndarray, truth: np.ndarray, k: int, keep: bool) -> dict:
+    index = BENCH_INDEX_PREFIX + profile["name"]
+    if es.indices.exists(index=index):
+        es.indices.delete(index=index)
+    es.indices.create(index=index, body={"mappings": {"properties": {VECTOR_FIELD: vector_mapping(profile)}}})
+
+    short = [shorten(vector, profile["dims"]) for vector in vectors.tolist()]
+    start = time.time()
+    with BulkWriter(es, vector_encoding=vector_encoding(es)) as writer:
+        writer.add_many({"_index": index, "_id": doc_id, "_source": {VECTOR_FIELD: vector}}
+                        for doc_id, vector in zip(ids, short))
+    es.indices.refresh(index=index)
+    es.indices.forcemerge(index=index, max_num_segments=1)
+    index_time = time.time() - start
+
+    row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+    latencies, found = [], 0
+    for query_row, expected in zip(query_rows, truth):
+        body = {"knn": knn_clause(short[query_row], k + 1, NUM_CANDIDATES, profile),
+                "size": k + 1, "_source": False}
+        start = time.perf_counter()
+        hits = es.search(index=index, body=body)["hits"]["hits"]
+        latencies.append(time.perf_counter() - start)
+        got = [row_of[hit["_id"]] for hit in hits if row_of[hit["_id"]] != query_row][:k]
+        found += len(set(got) & set(expected.tolist()))
+
+    result = {
+        "profile": profile["name"],
+        "memory": estimated_memory(profile, len(ids)),
+        "disk": disk_bytes(es, index),
+        "index_time": index_time,
+        "p50": float(np.percentile(latencies, 50)) * 1000,
+        "p99": float(np.percentile(latencies, 99)) * 1000,
+        "recall": found / truth.size,
+    }
+    if not keep:
+        es.indices.delete(index=index)
+    return result
+
+
+def parse_profile(spec: str) -> dict:
+    """'int8-512' -> make_profile(512, 'int8')."""
+    quantization, _, dims = spec.rpartition("-")
+    return make_profile(int(dims), quantization)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector profiles: memory, latency, recall@k")
+    parser.add_argument("--profiles", nargs="+", default=DEFAULT_PROFILES,
+                        help="Profiles as QUANTIZATION-DIMS, e.g. int8-512 (quantization: default|none|int8|int4|bbq)")
+    parser.add_argument("--max-docs", type=int, default=10000, help="Leads to benchmark on")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch indices")
+    args = parser.parse_args()
+
+    profiles = [parse_profile(spec) for spec in args.profiles]
+
+    es = Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    print(f"Connected to Elasticsearch: {es.info()['version']['number']}")
+
+    ids, vectors = load_vectors(es, args.max_docs)
+    if len(ids) <= args.k:
+        print(f"Need more than {args.k} leads with vectors, found {len(ids)}")
+        return
+    too_wide = [p["name"] for p in profiles if p["dims"] > vectors.shape[1]]
+    if too_wide:
+        print(f"Stored vectors have {vectors.shape[1]} dims — cannot benchmark {', '.join(too_wide)}")
+        return
+
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(len(ids), min(args.queries, len(ids)), replace=False)
+    truth = exact_neighbors(vectors, query_rows, args.k)
+    print(f"{len(ids)} leads, {len(query_rows)} queries, k={args.k}, "
+          f"baseline: exact float32 search at {vectors.shape[1]} dims\n")
+
+    print(f"  {'Profile':14s} {'Est. RAM':>10s} {'Disk':>10s} {'Index':>8s} {'p50':>8s} {'p99':>8s} {'Recall@k':>9s}")
+    for profile in profiles:
+        r = bench_profile(es, profile, ids, vectors, query_rows, truth, args.k, args.keep)
+        disk = f"{r['disk'] / 1024 / 1024:.1f} MB" if r["disk"] is not None else "n/a"
+        print(f"  {r['profile']:14s} {r['memory'] / 1024 / 1024:7.1f} MB {disk:>10s} {r['index_time']:7.1f}s "
+              f"{r['p50']:6.1f}ms {r['p99']:6.1f}ms {r['recall']:9.3f}")
+
+    print("\nSet VECTOR_DIMS and VECTOR_QUANTIZATION to the chosen profile, then re-run seed_data.py "
+          "(or recreate leads-raw and re-import) so stored and query vectors agree.")
+
+
+if __name__ == "__main__":
+    main()
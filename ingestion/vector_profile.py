@@ -0,0 +1,149 @@
+"""
+SalesForge Agent — Vector Profile
+One setting for how description vectors are produced, stored and searched.
+
+A profile is the embedding size (text-embedding-3 models can shorten their
+output through the `dimensions` parameter) plus the dense_vector quantization
+the index uses. Seeding, ingest and similarity search all read it from here:
+
+  VECTOR_DIMS          Embedding dimensions, 1-1536 (default 1536)
+  VECTOR_QUANTIZATION  default | none | int8 | int4 | bbq (default: default,
+                       i.e. whatever the cluster picks for dense_vector)
+
+Quantized profiles oversample kNN candidates and rescore them against the
+full-precision vectors, which recovers most of the recall quantization costs.
+
+Vectors are written as base64 big-endian float32 where the cluster accepts it
+(VECTOR_ENCODING=auto|base64|json), about a third of the bytes of a JSON
+decimal array. Readers go through unpack_vector, which takes either form.
+"""
+
+import base64
+import os
+
+import numpy as np
+from elasticsearch import Elasticsearch, NotFoundError
+
+VECTOR_FIELD = "company_description_vector"
+MAX_DIMS = 1536
+
+# quantization -> (index_options type, kNN rescore oversample)
+QUANTIZATIONS = {
+    "default": (None, None),
+    "none": ("hnsw", None),
+    "int8": ("int8_hnsw", None),
+    "int4": ("int4_hnsw", 1.5),
+    "bbq": ("bbq_hnsw", 3.0),
+}
+
+
+def make_profile(dims: int = MAX_DIMS, quantization: str = "default") -> dict:
+    """Validate a dims/quantization pair against what the cluster accepts."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION '{quantization}' (expected one of {', '.join(QUANTIZATIONS)})")
+    if not 1 <= dims <= MAX_DIMS:
+        raise ValueError(f"VECTOR_DIMS must be between 1 and {MAX_DIMS}, got {dims}")
+    if quantization == "int4" and dims % 2:
+        raise ValueError("int4 quantization needs an even number of dimensions")
+    if quantization == "bbq" and dims < 64:
+        raise ValueError("bbq quantization needs at least 64 dimensions")
+    index_type, oversample = QUANTIZATIONS[quantization]
+    return {
+        "name": f"{quantization}-{dims}",
+        "dims": dims,
+        "quantization": quantization,
+        "index_type": index_type,
+        "oversample": oversample,
+    }
+
+
+VECTOR_PROFILE = make_profile(
+    int(os.getenv("VECTOR_DIMS", str(MAX_DIMS))),
+    os.getenv("VECTOR_QUANTIZATION", "default"),
+)
+VECTOR_DIMS = VECTOR_PROFILE["dims"]
+VECTOR_ENCODING = os.getenv("VECTOR_ENCODING", "auto")
+# First releases that index base64-encoded dense vectors
+BASE64_VECTOR_VERSIONS = ((8, 19), (9, 1))
+
+
+# --- Mapping ---
+
+def vector_mapping(profile: dict = VECTOR_PROFILE) -> dict:
+    """dense_vector mapping for the description vector under a profile."""
+    mapping = {"type": "dense_vector", "dims": profile["dims"], "index": True, "similarity": "cosine"}
+    if profile["index_type"]:
+        mapping["index_options"] = {"type": profile["index_type"]}
+    return mapping
+
+
+def apply_profile(index_body: dict, profile: dict = VECTOR_PROFILE) -> dict:
+    """Set the vector field of an index body (from index_mappings.json) to the profile."""
+    index_body["mappings"]["properties"][VECTOR_FIELD] = vector_mapping(profile)
+    return index_body
+
+
+def check_index_profile(es: Elasticsearch, index: str, profile: dict = VECTOR_PROFILE):
+    """Fail fast when an existing index stores vectors of a different size than the profile produces."""
+    try:
+        response = es.indices.get_mapping(index=index)
+    except NotFoundError:
+        return
+    for body in response.values():
+        mapping = body["mappings"].get("properties", {}).get(VECTOR_FIELD)
+        if mapping and mapping.get("dims") not in (None, profile["dims"]):
+            raise ValueError(
+                f"Index '{index}' stores {mapping['dims']}-dim vectors but the vector profile is "
+                f"{profile['dims']} dims — set VECTOR_DIMS={mapping['dims']} or recreate the index"
+            )
+
+
+# --- Search ---
+
+def knn_clause(vector: list[float], k: int, num_candidates: int, profile: dict = VECTOR_PROFILE) -> dict:
+    """kNN search clause for the description vector, rescoring quantized profiles."""
+    clause = {
+        "field": VECTOR_FIELD,
+        "query_vector": vector,
+        "k": k,
+        "num_candidates": num_candidates,
+    }
+    if profile["oversample"]:
+        clause["rescore_vector"] = {"oversample": profile["oversample"]}
+    return clause
+
+
+def shorten(vector, dims: int):
+    """
+    Shorten a text-embedding-3 vector the way the API's `dimensions` parameter
+    does: keep the leading dims and re-normalize to unit length.
+    """
+    head = list(vector[:dims])
+    norm = sum(x * x for x in head) ** 0.5
+    return [x / norm for x in head] if norm else head
+
+
+# --- Encoding ---
+
+def supports_base64_vectors(es: Elasticsearch) -> bool:
+    major, minor = (int(part) for part in es.info()["version"]["number"].split(".")[:2])
+    return any(major == m and minor >= n for m, n in BASE64_VECTOR_VERSIONS) or major > BASE64_VECTOR_VERSIONS[-1][0]
+
+
+def vector_encoding(es: Elasticsearch) -> str:
+    """'base64' or 'json' for bulk requests, per VECTOR_ENCODING and the cluster version."""
+    if VECTOR_ENCODING != "auto":
+        return VECTOR_ENCODING
+    return "base64" if supports_base64_vectors(es) else "json"
+
+
+def pack_vector(vector) -> str:
+    """base64 of the vector as big-endian float32, the dense_vector wire format."""
+    return base64.b64encode(np.asarray(vector, dtype=">f4").tobytes()).decode()
+
+
+def unpack_vector(value) -> list[float] | None:
+    """A stored vector as a list of floats, whether it was indexed as JSON or base64."""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype=">f4").astype(np.float32).tolist()
+    return value